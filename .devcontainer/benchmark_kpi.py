@@ -0,0 +1,456 @@
+"""Benchmarks de escritura en kpi_data.db (sin Streamlit).
+
+Uso: python .devcontainer/benchmark_kpi.py [guardado|concurrencia|grupo|planes|historico]
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from datos_kpi import (INDICES, ConexionesKPI, EscritorKPI, consultas_frecuentes, crear_backup_db,
+                       crear_esquema, escaneos_completos, guardar_kpis, leer_historico,
+                       nombres_historico, rango_fechas, validar_fecha, validar_numero_positivo)
+
+EQUIPOS = ["Transferencias", "Arreglo", "Distribución", "Guías", "Ventas"]
+
+
+def generar_dias(trabajadores: int, dias: int, seed: int = 7) -> List[tuple]:
+    """(fecha, datos) como los arma el formulario de ingreso, un día por elemento"""
+    rng = np.random.default_rng(seed)
+    inicio = date(2024, 1, 1)
+    nombres = [f"Trabajador {i:04d}" for i in range(trabajadores)]
+    resultado = []
+    for d in range(dias):
+        cantidades = rng.integers(0, 2_000, trabajadores)
+        horas = rng.uniform(6, 10, trabajadores).round(1)
+        datos = {}
+        for i, nombre in enumerate(nombres):
+            meta = 1_750.0
+            datos[nombre] = {
+                "actividad": "Transferencias", "cantidad": float(cantidades[i]), "meta": meta,
+                "eficiencia": cantidades[i] / meta * 100, "productividad": cantidades[i] / horas[i],
+                "comentario": "", "meta_mensual": meta * 22, "horas_trabajo": float(horas[i]),
+                "equipo": EQUIPOS[i % len(EQUIPOS)],
+            }
+        resultado.append(((inicio + timedelta(days=d)).strftime("%Y-%m-%d"), datos))
+    return resultado
+
+
+def guardar_fila_a_fila(conn: sqlite3.Connection, fecha: str, datos: Dict[str, Dict]) -> None:
+    """Guardado anterior de guardar_datos_db (SELECT y luego UPDATE o INSERT por trabajador), como referencia"""
+    c = conn.cursor()
+    for nombre, info in datos.items():
+        if not all([
+            validar_fecha(fecha),
+            validar_numero_positivo(info.get("cantidad", 0)),
+            validar_numero_positivo(info.get("meta", 0)),
+            validar_numero_positivo(info.get("horas_trabajo", 0))
+        ]):
+            continue
+        c.execute('SELECT id FROM daily_kpis WHERE fecha = ? AND nombre = ?', (fecha, nombre))
+        if c.fetchone():
+            c.execute('''
+            UPDATE daily_kpis
+            SET actividad=?, cantidad=?, meta=?, eficiencia=?,
+                productividad=?, comentario=?, meta_mensual=?, horas_trabajo=?, equipo=?
+            WHERE fecha=? AND nombre=?
+            ''', (info.get("actividad", ""), info.get("cantidad", 0), info.get("meta", 0),
+                  info.get("eficiencia", 0), info.get("productividad", 0), info.get("comentario", ""),
+                  info.get("meta_mensual", 0), info.get("horas_trabajo", 0), info.get("equipo", ""),
+                  fecha, nombre))
+        else:
+            c.execute('''
+            INSERT INTO daily_kpis
+            (fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, comentario, meta_mensual, horas_trabajo, equipo)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (fecha, nombre, info.get("actividad", ""), info.get("cantidad", 0), info.get("meta", 0),
+                  info.get("eficiencia", 0), info.get("productividad", 0), info.get("comentario", ""),
+                  info.get("meta_mensual", 0), info.get("horas_trabajo", 0), info.get("equipo", "")))
+    conn.commit()
+
+
+def _guardar_anio(ruta: str, dias: List[tuple], funcion) -> float:
+    """Segundos en guardar todos los días (una llamada por día, como el botón de confirmar)"""
+    conn = sqlite3.connect(ruta)
+    crear_esquema(conn)
+    conn.commit()
+    inicio = time.perf_counter()
+    for fecha, datos in dias:
+        with conn:
+            funcion(conn, fecha, datos)
+    segundos = time.perf_counter() - inicio
+    conn.close()
+    return segundos
+
+
+def benchmark_guardado(trabajadores: int = 500, dias: int = 365) -> Dict[str, float]:
+    """
+    Guardar trabajadores × dias registros, día por día: el bucle anterior (2 sentencias
+    por trabajador) frente al UPSERT en lote. Luego se vuelve a guardar cada día
+    (todo actualizaciones) y se mide un backup de la base resultante.
+    Que ambos dejen el mismo contenido se comprueba en tests/test_datos_kpi.py.
+    """
+    datos = generar_dias(trabajadores, dias)
+    filas = trabajadores * dias
+    tiempos = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_bucle = os.path.join(carpeta, 'bucle.db')
+        ruta_lote = os.path.join(carpeta, 'lote.db')
+        tiempos['bucle'] = _guardar_anio(ruta_bucle, datos, guardar_fila_a_fila)
+        tiempos['lote'] = _guardar_anio(ruta_lote, datos, guardar_kpis)
+
+        tiempos['bucle_actualizar'] = _guardar_anio(ruta_bucle, datos, guardar_fila_a_fila)
+        tiempos['lote_actualizar'] = _guardar_anio(ruta_lote, datos, guardar_kpis)
+
+        conn = sqlite3.connect(ruta_lote)
+        inicio = time.perf_counter()
+        crear_backup_db(conn, os.path.join(carpeta, 'backup.db'))
+        tiempos['backup'] = time.perf_counter() - inicio
+        conn.close()
+        megas = os.path.getsize(ruta_lote) / 1e6
+
+    print(f"{trabajadores:,} trabajadores × {dias} días = {filas:,} registros ({megas:.1f} MB)")
+    print(f"{'':>12} | {'bucle':>9} | {'lote':>9} | {'aceleración':>11}")
+    for etiqueta, clave in (('insertar', ''), ('actualizar', '_actualizar')):
+        bucle, lote = tiempos[f'bucle{clave}'], tiempos[f'lote{clave}']
+        print(f"{etiqueta:>12} | {bucle:>8.2f}s | {lote:>8.2f}s | {bucle / lote:>10.1f}x")
+    print(f"backup de la base final: {tiempos['backup']:.3f}s")
+    return tiempos
+
+
+# Consulta del histórico de los últimos 30 días (como cargar_historico_db con fecha de inicio)
+CONSULTA_HISTORICO = (
+    "SELECT fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, comentario, "
+    "meta_mensual, horas_trabajo, equipo FROM daily_kpis WHERE fecha >= ? ORDER BY fecha DESC, nombre"
+)
+
+
+class _sin_cierre:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, *excepcion):
+        return False
+
+
+class _ConexionCompartida:
+    """Capa anterior del dashboard: una sola conexión para todos los hilos, journal por defecto"""
+
+    def __init__(self, ruta: str):
+        self.conn = sqlite3.connect(ruta, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+    def lectura(self):
+        return _sin_cierre(self.conn)
+
+    def escritura(self):
+        return _sin_cierre(self.conn)
+
+
+class _ConexionesPorHilo:
+    """Una conexión por hilo lector y otra de escritura, con el journal por defecto (sin WAL)"""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.escritor = sqlite3.connect(ruta, timeout=30, check_same_thread=False)
+        self.locales = threading.local()
+
+    def lectura(self):
+        if not hasattr(self.locales, 'conn'):
+            self.locales.conn = sqlite3.connect(self.ruta, timeout=30)
+            self.locales.conn.row_factory = sqlite3.Row
+        return _sin_cierre(self.locales.conn)
+
+    def escritura(self):
+        return _sin_cierre(self.escritor)
+
+
+def _medir_concurrencia(conexiones, dias: List[str], desde: str, retencion: float) -> Dict[str, float]:
+    """
+    Un hilo escribe cada día en su propia transacción (marca las filas, las retiene
+    abiertas retencion segundos como un disco lento, y las restablece) mientras este
+    hilo repite la consulta del histórico y cuenta las lecturas que vieron la marca.
+    """
+    escribiendo = threading.Event()
+    escribiendo.set()
+    tiempos = {}
+
+    def escribir():
+        inicio = time.perf_counter()
+        for fecha in dias:
+            with conexiones.escritura() as conn:
+                conn.execute("UPDATE daily_kpis SET comentario = 'SIN CONFIRMAR' WHERE fecha = ?", (fecha,))
+                time.sleep(retencion)
+                conn.execute("UPDATE daily_kpis SET comentario = '' WHERE fecha = ?", (fecha,))
+                conn.commit()
+        tiempos['escritura'] = time.perf_counter() - inicio
+        escribiendo.clear()
+
+    escritor = threading.Thread(target=escribir)
+    escritor.start()
+    latencias, sin_confirmar = [], 0
+    while escribiendo.is_set():
+        inicio = time.perf_counter()
+        with conexiones.lectura() as conn:
+            filas = conn.execute(CONSULTA_HISTORICO, (desde,)).fetchall()
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        sin_confirmar += any(fila['comentario'] == 'SIN CONFIRMAR' for fila in filas)
+    escritor.join()
+    return {
+        'p50': float(np.percentile(latencias, 50)),
+        'p95': float(np.percentile(latencias, 95)),
+        'max': float(np.max(latencias)),
+        'lecturas': len(latencias),
+        'sin_confirmar': sin_confirmar,
+        'escritura': tiempos['escritura'],
+    }
+
+
+def benchmark_concurrencia(trabajadores: int = 500, dias: int = 365, dias_escritura: int = 60,
+                           retencion: float = 0.02) -> Dict[str, Dict[str, float]]:
+    """
+    Consulta del histórico (últimos 30 días) repetida mientras otro hilo guarda
+    dias_escritura días recientes: conexión única compartida (capa anterior),
+    conexiones por hilo sin WAL y ConexionesKPI (WAL, lectores propios, un escritor).
+    """
+    datos = generar_dias(trabajadores, dias)
+    desde = datos[-30][0]
+    fechas = [fecha for fecha, _ in datos[-dias_escritura:]]
+    capas = (('compartida', _ConexionCompartida), ('por hilo', _ConexionesPorHilo), ('wal', ConexionesKPI))
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        for nombre, crear in capas:
+            ruta = os.path.join(carpeta, f'{len(resultados)}.db')
+            _guardar_anio(ruta, datos, guardar_kpis)
+            conexiones = crear(ruta)
+            with conexiones.lectura() as conn:
+                inicio = time.perf_counter()
+                conn.execute(CONSULTA_HISTORICO, (desde,)).fetchall()
+                sola = (time.perf_counter() - inicio) * 1000
+            resultados[nombre] = dict(_medir_concurrencia(conexiones, fechas, desde, retencion), sola=sola)
+
+    print(f"{trabajadores:,} trabajadores × {dias} días; consulta de 30 días ({trabajadores * 30:,} filas) "
+          f"mientras se guardan {dias_escritura} días ({retencion * 1000:.0f} ms por transacción)")
+    print(f"{'capa':>11} | {'sola':>7} | {'p50':>7} | {'p95':>7} | {'máx':>7} | {'lecturas':>8} | "
+          f"{'sin confirmar':>13} | {'escritura':>9}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:>11} | {r['sola']:>5.0f}ms | {r['p50']:>5.0f}ms | {r['p95']:>5.0f}ms | {r['max']:>5.0f}ms | "
+              f"{r['lecturas']:>8} | {r['sin_confirmar']:>13} | {r['escritura']:>8.2f}s")
+    return resultados
+
+
+def _guardar_sesiones(guardar, equipos: List[tuple], sesiones: int) -> List[Exception]:
+    """Cada sesión (hilo) guarda sus equipos, todas a la vez; devuelve los errores"""
+    errores = []
+    barrera = threading.Barrier(sesiones)
+
+    def sesion(propios):
+        barrera.wait()
+        for fecha, datos in propios:
+            try:
+                guardar(fecha, datos)
+            except Exception as e:
+                errores.append(e)
+
+    hilos = [threading.Thread(target=sesion, args=(equipos[i::sesiones],)) for i in range(sesiones)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return errores
+
+
+def benchmark_grupo(sesiones: int = 40, por_equipo: int = 25, dias: int = 30) -> Dict[str, Dict[str, float]]:
+    """
+    Fin de turno: sesiones supervisores guardan a la vez su equipo (por_equipo
+    trabajadores) de cada uno de dias días. Conexión por sesión sin coordinación
+    (timeout por defecto de 5 s), un escritor con bloqueo y un commit por guardado
+    (ConexionesKPI) y la cola con commits en grupo (EscritorKPI).
+    """
+    datos = generar_dias(sesiones * por_equipo, dias)
+    equipos = []
+    for fecha, dia in datos:
+        nombres = list(dia)
+        for i in range(sesiones):
+            equipos.append((fecha, {n: dia[n] for n in nombres[i * por_equipo:(i + 1) * por_equipo]}))
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        def preparar(nombre):
+            ruta = os.path.join(carpeta, f'{nombre}.db')
+            conexiones = ConexionesKPI(ruta)
+            with conexiones.escritura() as conn:
+                crear_esquema(conn)
+            return ruta, conexiones
+
+        ruta, _ = preparar('por_sesion')
+        locales = threading.local()
+
+        def guardar_por_sesion(fecha, dia):
+            if not hasattr(locales, 'conn'):
+                locales.conn = sqlite3.connect(ruta)
+            with locales.conn:
+                guardar_kpis(locales.conn, fecha, dia)
+
+        _, conexiones = preparar('bloqueo')
+
+        def guardar_con_bloqueo(fecha, dia):
+            with conexiones.escritura() as conn:
+                guardar_kpis(conn, fecha, dia)
+
+        _, conexiones_grupo = preparar('grupo')
+        escritor = EscritorKPI(conexiones_grupo)
+
+        def guardar_en_grupo(fecha, dia):
+            escritor.escribir(lambda conn: guardar_kpis(conn, fecha, dia))
+
+        for nombre, guardar in (('por sesión', guardar_por_sesion), ('bloqueo', guardar_con_bloqueo),
+                                ('grupo', guardar_en_grupo)):
+            inicio = time.perf_counter()
+            errores = _guardar_sesiones(guardar, equipos, sesiones)
+            segundos = time.perf_counter() - inicio
+            resultados[nombre] = {'segundos': segundos, 'guardados_s': (len(equipos) - len(errores)) / segundos,
+                                  'errores': len(errores)}
+        resultados['grupo']['commits'] = escritor.grupos
+
+    print(f"{sesiones} sesiones × {dias} días, {por_equipo} trabajadores por guardado ({len(equipos):,} guardados)")
+    print(f"{'modo':>11} | {'total':>7} | {'guardados/s':>11} | {'errores':>7} | {'commits':>7}")
+    for nombre, r in resultados.items():
+        commits = r.get('commits', len(equipos) - r['errores'])
+        print(f"{nombre:>11} | {r['segundos']:>6.2f}s | {r['guardados_s']:>11.0f} | {r['errores']:>7} | {commits:>7}")
+    return resultados
+
+
+def _medir_consulta(conn: sqlite3.Connection, query: str, params: tuple, repeticiones: int = 20) -> float:
+    """Mediana en ms de ejecutar la consulta y leer todas sus filas"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return float(np.median(tiempos))
+
+
+def benchmark_planes(trabajadores: int = 500, dias: int = 365, usuarios: int = 200) -> Dict[str, Dict[str, float]]:
+    """
+    Mide las consultas frecuentes con y sin los índices del esquema e informa cuántas
+    recorren una tabla completa (tests/test_datos_kpi.py exige que ninguna lo haga).
+    """
+    datos = generar_dias(trabajadores, dias)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'planes.db')
+        _guardar_anio(ruta, datos, guardar_kpis)
+        conn = sqlite3.connect(ruta)
+        with conn:
+            conn.executemany('INSERT INTO users (username, password_hash) VALUES (?, ?)',
+                             ((f'usuario{i}', f'{i:064x}') for i in range(usuarios)))
+            conn.executemany('INSERT INTO trabajadores (nombre, equipo) VALUES (?, ?)',
+                             ((nombre, info['equipo']) for nombre, info in datos[0][1].items()))
+
+        escaneos = escaneos_completos(conn)
+
+        # Nombre y mes con datos: se miden consultas que devuelven filas
+        consultas = {}
+        for nombre, (query, params) in consultas_frecuentes().items():
+            params = tuple('Trabajador 0001' if p == 'Trabajador' else p for p in params)
+            consultas[nombre] = (query, params)
+        for nombre, (query, params) in consultas.items():
+            resultados[nombre] = {'con': _medir_consulta(conn, query, params)}
+        with conn:
+            for indice in INDICES:
+                conn.execute(f"DROP INDEX {indice}")
+        for nombre, (query, params) in consultas.items():
+            resultados[nombre]['sin'] = _medir_consulta(conn, query, params)
+        conn.close()
+
+    print(f"{trabajadores:,} trabajadores × {dias} días, {usuarios} usuarios: {len(escaneos)} consultas "
+          f"frecuentes recorren una tabla completa")
+    print(f"{'consulta':>27} | {'sin índices':>11} | {'con índices':>11} | {'aceleración':>11}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:>27} | {r['sin']:>9.2f}ms | {r['con']:>9.2f}ms | {r['sin'] / r['con']:>10.1f}x")
+    return resultados
+
+
+def benchmark_historico(trabajadores: int = 300, dias: int = 3 * 365, ventana: int = 90) -> Dict[str, Dict[str, float]]:
+    """
+    Carga del análisis histórico con varios años de datos: todo el histórico filtrado
+    en pandas (antes) frente a límites con MIN/MAX y los filtros en la consulta.
+    Casos: últimos ventana días, un trabajador en todo el rango y ambos filtros.
+    Que ambos caminos den las mismas filas se comprueba en tests/test_datos_kpi.py.
+    """
+    datos = generar_dias(trabajadores, dias)
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'historico.db')
+        _guardar_anio(ruta, datos, guardar_kpis)
+        conn = sqlite3.connect(ruta)
+        fecha_max = datos[-1][0]
+        desde = datos[-ventana][0]
+        trabajador = 'Trabajador 0042'
+        casos = {'ventana': (desde, fecha_max, None), 'trabajador': (None, None, trabajador),
+                 'ambos': (desde, fecha_max, trabajador)}
+
+        for caso, (inicio, fin, nombre) in casos.items():
+            t0 = time.perf_counter()
+            df = leer_historico(conn)
+            df['dia'] = df['fecha'].dt.date
+            (df['dia'].min(), df['dia'].max(), list(df['nombre'].unique()))
+            filtro = pd.Series(True, index=df.index)
+            if inicio:
+                filtro &= (df['fecha'] >= inicio) & (df['fecha'] <= fin)
+            if nombre:
+                filtro &= df['nombre'] == nombre
+            antes = df[filtro]
+            seg_antes = time.perf_counter() - t0
+            mb_antes = df.memory_usage(deep=True).sum() / 1e6
+
+            t0 = time.perf_counter()
+            rango_fechas(conn), nombres_historico(conn)
+            despues = leer_historico(conn, inicio, fin, nombre)
+            despues['dia'] = despues['fecha'].dt.date
+            seg_despues = time.perf_counter() - t0
+            mb_despues = despues.memory_usage(deep=True).sum() / 1e6
+
+            resultados[caso] = {'filas': len(despues), 'seg_antes': seg_antes, 'seg_despues': seg_despues,
+                                'mb_antes': mb_antes, 'mb_despues': mb_despues}
+        conn.close()
+
+    print(f"{trabajadores:,} trabajadores × {dias} días = {trabajadores * dias:,} registros")
+    print(f"{'filtro':>11} | {'filas':>7} | {'antes':>8} | {'después':>8} | {'aceleración':>11} | "
+          f"{'MB antes':>8} | {'MB después':>10}")
+    for caso, r in resultados.items():
+        print(f"{caso:>11} | {r['filas']:>7,} | {r['seg_antes']:>7.3f}s | {r['seg_despues']:>7.3f}s | "
+              f"{r['seg_antes'] / r['seg_despues']:>10.0f}x | {r['mb_antes']:>8.1f} | {r['mb_despues']:>10.2f}")
+    return resultados
+
+
+BENCHMARKS = {
+    'guardado': benchmark_guardado,
+    'concurrencia': benchmark_concurrencia,
+    'grupo': benchmark_grupo,
+    'planes': benchmark_planes,
+    'historico': benchmark_historico,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de la base de KPIs")
+    parser.add_argument('nombres', nargs='*', help=f"Benchmarks a ejecutar: {', '.join(BENCHMARKS)} (todos por defecto)")
+    nombres = parser.parse_args().nombres or list(BENCHMARKS)
+    desconocidos = set(nombres) - set(BENCHMARKS)
+    if desconocidos:
+        parser.error(f"Benchmark desconocido: {', '.join(sorted(desconocidos))}")
+    for nombre in nombres:
+        print(f"\n== {nombre} ==")
+        BENCHMARKS[nombre]()
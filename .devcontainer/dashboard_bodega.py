@@ -25,6 +25,12 @@ from sklearn.impute import SimpleImputer
 from contextlib import contextmanager
 import logging
 from typing import Dict, List, Optional, Tuple, Any, Union
+
+from datos_kpi import (CONSULTA_EQUIPOS_ACTIVOS, CONSULTA_TRABAJADORES_ACTIVOS,
+                       CONSULTA_USUARIO_POR_HASH, INVALIDO, ConexionesKPI, EscritorKPI,
+                       cantidades_mes, crear_backup_db, crear_esquema,
+                       guardar_kpis, leer_historico, nombres_historico, rango_fechas,
+                       restaurar_backup_db, validar_fecha, validar_numero_positivo)
 warnings.filterwarnings('ignore')
 
 # Configuración de logging
@@ -242,85 +248,47 @@ class DatabaseManager:
         return cls._instance
     
     def _initialize(self):
-        self.conn = None
+        # WAL: lectores con conexión propia por hilo, un solo escritor serializado
+        self.conexiones = ConexionesKPI('kpi_data.db')
+        # Las escrituras de todas las sesiones pasan por un hilo que las confirma en grupo
+        self.escritor = EscritorKPI(self.conexiones)
         self.setup_database()
     
     @contextmanager
     def get_connection(self):
-        """Context manager para manejar conexiones a la base de datos"""
+        """Conexión de solo lectura del hilo actual (no espera a las escrituras en curso)"""
+        try:
+            with self.conexiones.lectura() as conn:
+                yield conn
+        except sqlite3.Error as e:
+            logger.error(f"Error de base de datos: {e}")
+            raise
+    
+    def escribir(self, operacion, timeout: float = 60):
+        """
+        Ejecuta operacion(conn) en el hilo escritor y devuelve su resultado; la
+        excepción de la operación (p. ej. IntegrityError) se relanza aquí
+        """
+        return self.escritor.escribir(operacion, timeout)
+    
+    @contextmanager
+    def get_write_connection(self):
+        """Conexión de escritura exclusiva (configuración inicial y restauración de backups)"""
         try:
-            if self.conn is None:
-                self.conn = sqlite3.connect('kpi_data.db', check_same_thread=False)
-                self.conn.row_factory = sqlite3.Row
-            yield self.conn
+            with self.conexiones.escritura() as conn:
+                yield conn
         except sqlite3.Error as e:
             logger.error(f"Error de base de datos: {e}")
             raise
-        finally:
-            # No cerramos la conexión para mantenerla en el estado de la sesión
-            pass
     
     def setup_database(self):
         """Configura la base de datos SQLite"""
         try:
-            with self.get_connection() as conn:
+            with self.get_write_connection() as conn:
                 c = conn.cursor()
                 
-                # Crear tabla de datos diarios
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS daily_kpis (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    fecha TEXT NOT NULL,
-                    nombre TEXT NOT NULL,
-                    actividad TEXT NOT NULL,
-                    cantidad REAL NOT NULL,
-                    meta REAL NOT NULL,
-                    eficiencia REAL NOT NULL,
-                    productividad REAL NOT NULL,
-                    comentario TEXT,
-                    meta_mensual REAL,
-                    horas_trabajo REAL,
-                    equipo TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(fecha, nombre)
-                )
-                ''')
-                
-                # Verificar si la columna 'equipo' existe y agregarla si no existe
-                try:
-                    c.execute("SELECT equipo FROM daily_kpis LIMIT 1")
-                except sqlite3.OperationalError:
-                    c.execute('ALTER TABLE daily_kpis ADD COLUMN equipo TEXT')
-                
-                # Crear tabla de configuración
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS config (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-                ''')
-                
-                # Crear tabla de usuarios
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password_hash TEXT NOT NULL,
-                    role TEXT DEFAULT 'user',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                ''')
-                
-                # Crear tabla de trabajadores
-                c.execute('''
-                CREATE TABLE IF NOT EXISTS trabajadores (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nombre TEXT UNIQUE NOT NULL,
-                    equipo TEXT NOT NULL,
-                    activo BOOLEAN DEFAULT 1,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-                ''')
+                # Crear tablas e índices
+                crear_esquema(conn)
                 
                 # Insertar usuario admin por defecto si no existe
                 password_hash = hashlib.sha256("Wilo3161".encode()).hexdigest()
@@ -347,7 +315,6 @@ class DatabaseManager:
                     VALUES (?, ?)
                     ''', (nombre, equipo))
                 
-                conn.commit()
                 logger.info("Base de datos configurada correctamente")
                 
         except sqlite3.Error as e:
@@ -358,23 +325,6 @@ class DatabaseManager:
 if 'db_manager' not in st.session_state:
     st.session_state.db_manager = DatabaseManager()
 
-# Funciones de utilidad
-def validar_fecha(fecha: str) -> bool:
-    """Valida que una fecha tenga el formato correcto"""
-    try:
-        datetime.strptime(fecha, "%Y-%m-%d")
-        return True
-    except ValueError:
-        return False
-
-def validar_numero_positivo(valor: Any) -> bool:
-    """Valida que un valor sea un número positivo"""
-    try:
-        num = float(valor)
-        return num >= 0
-    except (ValueError, TypeError):
-        return False
-
 # Funciones de cálculo de KPIs
 def calcular_kpi(cantidad: float, meta: float) -> float:
     """Calcula el porcentaje de KPI general"""
@@ -405,7 +355,7 @@ def obtener_trabajadores() -> pd.DataFrame:
     """Obtiene la lista de trabajadores desde la base de datos"""
     try:
         with st.session_state.db_manager.get_connection() as conn:
-            df = pd.read_sql_query('SELECT nombre, equipo FROM trabajadores WHERE activo = 1 ORDER BY equipo, nombre', conn)
+            df = pd.read_sql_query(CONSULTA_TRABAJADORES_ACTIVOS, conn)
             return df
     except Exception as e:
         logger.error(f"Error al obtener trabajadores: {e}")
@@ -421,88 +371,32 @@ def obtener_equipos() -> List[str]:
     """Obtiene la lista de equipos desde la base de datos"""
     try:
         with st.session_state.db_manager.get_connection() as conn:
-            df = pd.read_sql_query('SELECT DISTINCT equipo FROM trabajadores WHERE activo = 1 ORDER BY equipo', conn)
+            df = pd.read_sql_query(CONSULTA_EQUIPOS_ACTIVOS, conn)
             return df['equipo'].tolist()
     except Exception as e:
         logger.error(f"Error al obtener equipos: {e}")
         return ["Transferencias", "Arreglo", "Distribución", "Guías", "Ventas"]
 
-def guardar_datos_db(fecha: str, datos: Dict[str, Dict]) -> bool:
-    """Guarda los datos en la base de datos SQLite"""
+def guardar_datos_db(fecha: str, datos: Dict[str, Dict]) -> Optional[Dict[str, Dict[str, str]]]:
+    """Guarda los datos del día en una transacción; devuelve el resultado por trabajador (None si falla)"""
     try:
-        with st.session_state.db_manager.get_connection() as conn:
-            c = conn.cursor()
-            
-            for nombre, info in datos.items():
-                # Validar datos antes de guardar
-                if not all([
-                    validar_fecha(fecha),
-                    validar_numero_positivo(info.get("cantidad", 0)),
-                    validar_numero_positivo(info.get("meta", 0)),
-                    validar_numero_positivo(info.get("horas_trabajo", 0))
-                ]):
-                    logger.warning(f"Datos inválidos para {nombre}, omitiendo guardado")
-                    continue
-                
-                # Verificar si ya existe un registro para esta fecha y trabajador
-                c.execute('SELECT id FROM daily_kpis WHERE fecha = ? AND nombre = ?', (fecha, nombre))
-                existing = c.fetchone()
-                
-                if existing:
-                    # Actualizar registro existente
-                    c.execute('''
-                    UPDATE daily_kpis 
-                    SET actividad=?, cantidad=?, meta=?, eficiencia=?, 
-                        productividad=?, comentario=?, meta_mensual=?, horas_trabajo=?, equipo=?
-                    WHERE fecha=? AND nombre=?
-                    ''', (
-                        info.get("actividad", ""),
-                        info.get("cantidad", 0),
-                        info.get("meta", 0),
-                        info.get("eficiencia", 0),
-                        info.get("productividad", 0),
-                        info.get("comentario", ""),
-                        info.get("meta_mensual", 0),
-                        info.get("horas_trabajo", 0),
-                        info.get("equipo", ""),
-                        fecha,
-                        nombre
-                    ))
-                else:
-                    # Insertar nuevo registro
-                    c.execute('''
-                    INSERT INTO daily_kpis 
-                    (fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, comentario, meta_mensual, horas_trabajo, equipo)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        fecha,
-                        nombre,
-                        info.get("actividad", ""),
-                        info.get("cantidad", 0),
-                        info.get("meta", 0),
-                        info.get("eficiencia", 0),
-                        info.get("productividad", 0),
-                        info.get("comentario", ""),
-                        info.get("meta_mensual", 0),
-                        info.get("horas_trabajo", 0),
-                        info.get("equipo", "")
-                    ))
-            
-            conn.commit()
-            
-            # Crear backup después de guardar
+        resultados = st.session_state.db_manager.escribir(lambda conn: guardar_kpis(conn, fecha, datos))
+
+        # Backup después de guardar, como mucho uno cada INTERVALO_BACKUP_MIN minutos
+        if backup_vencido():
             crear_backup()
-            
-            # Limpiar caché de datos históricos
-            if 'historico_data' in st.session_state:
-                del st.session_state['historico_data']
-                
-            logger.info(f"Datos guardados correctamente para la fecha {fecha}")
-            return True
-            
+
+        # Limpiar caché de datos históricos
+        if 'historico_data' in st.session_state:
+            del st.session_state['historico_data']
+
+        guardados = sum(r['resultado'] != INVALIDO for r in resultados.values())
+        logger.info(f"Datos guardados correctamente para la fecha {fecha}: {guardados} de {len(resultados)} trabajadores")
+        return resultados
+
     except Exception as e:
         logger.error(f"Error al guardar datos: {e}")
-        return False
+        return None
 
 def cargar_historico_db(fecha_inicio: Optional[str] = None, 
                        fecha_fin: Optional[str] = None, 
@@ -510,44 +404,39 @@ def cargar_historico_db(fecha_inicio: Optional[str] = None,
     """Carga datos históricos desde la base de datos"""
     try:
         with st.session_state.db_manager.get_connection() as conn:
-            query = '''
-            SELECT fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, 
-                   comentario, meta_mensual, horas_trabajo, equipo
-            FROM daily_kpis
-            WHERE 1=1
-            '''
-            params = []
-            
-            if fecha_inicio:
-                query += ' AND fecha >= ?'
-                params.append(fecha_inicio)
-            
-            if fecha_fin:
-                query += ' AND fecha <= ?'
-                params.append(fecha_fin)
-            
-            if trabajador:
-                query += ' AND nombre = ?'
-                params.append(trabajador)
-            
-            query += ' ORDER BY fecha DESC, nombre'
-            
-            df = pd.read_sql_query(query, conn, params=params)
-            
-            if not df.empty:
-                # Convertir fecha a datetime
-                df['fecha'] = pd.to_datetime(df['fecha'])
-                
-                # Calcular columnas adicionales
-                df['cumplimiento_meta'] = np.where(df['cantidad'] >= df['meta'], 'Sí', 'No')
-                df['diferencia_meta'] = df['cantidad'] - df['meta']
-                
-            return df
+            return leer_historico(conn, fecha_inicio, fecha_fin, trabajador)
             
     except Exception as e:
         logger.error(f"Error al cargar datos históricos: {e}")
         return pd.DataFrame()
 
+# Días que muestra el análisis histórico al abrirlo (el usuario puede ampliar el rango)
+DIAS_HISTORICO_INICIAL = 90
+
+def obtener_filtros_historico() -> Tuple[Optional[date], Optional[date], List[str]]:
+    """Primera y última fecha del histórico y los trabajadores con registros, sin cargar los datos"""
+    try:
+        with st.session_state.db_manager.get_connection() as conn:
+            fecha_min, fecha_max = rango_fechas(conn)
+            nombres = nombres_historico(conn)
+        if fecha_min is None:
+            return None, None, []
+        return (datetime.strptime(fecha_min, "%Y-%m-%d").date(),
+                datetime.strptime(fecha_max, "%Y-%m-%d").date(), nombres)
+    except Exception as e:
+        logger.error(f"Error al obtener el rango del histórico: {e}")
+        return None, None, []
+
+# Minutos mínimos entre backups automáticos al guardar
+INTERVALO_BACKUP_MIN = 30
+
+def backup_vencido() -> bool:
+    """True si el último backup tiene más de INTERVALO_BACKUP_MIN minutos (o no hay ninguno)"""
+    backups = list(Path("backups").glob("kpi_backup_*.db"))
+    if not backups:
+        return True
+    return time.time() - max(os.path.getmtime(b) for b in backups) > INTERVALO_BACKUP_MIN * 60
+
 def crear_backup() -> bool:
     """Crea una copia de seguridad de la base de datos"""
     try:
@@ -557,10 +446,9 @@ def crear_backup() -> bool:
         # Nombre del archivo de backup con fecha y hora
         backup_name = f"backups/kpi_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         
-        # Copiar la base de datos
-        with open('kpi_data.db', 'rb') as original:
-            with open(backup_name, 'wb') as backup:
-                backup.write(original.read())
+        # Copiar la base de datos (copia consistente aunque haya una escritura en curso)
+        with st.session_state.db_manager.get_connection() as conn:
+            crear_backup_db(conn, backup_name)
                 
         # Mantener solo los últimos 7 backups
         backups = sorted(Path("backups").glob("kpi_backup_*.db"), key=os.path.getmtime)
@@ -580,18 +468,9 @@ def crear_backup() -> bool:
 def restaurar_backup(backup_path: str) -> bool:
     """Restaura la base de datos desde un backup"""
     try:
-        # Cerrar conexión actual si existe
-        if hasattr(st.session_state.db_manager, 'conn') and st.session_state.db_manager.conn:
-            st.session_state.db_manager.conn.close()
-            st.session_state.db_manager.conn = None
-        
-        # Copiar el backup sobre la base de datos actual
-        with open(backup_path, 'rb') as backup:
-            with open('kpi_data.db', 'wb') as original:
-                original.write(backup.read())
-        
-        # Reestablecer conexión
-        st.session_state.db_manager = DatabaseManager()
+        # Copiar el backup sobre la base de datos actual (los lectores ven la base restaurada al terminar)
+        with st.session_state.db_manager.get_write_connection() as conn:
+            restaurar_backup_db(conn, backup_path)
         
         # Limpiar datos en caché
         if 'historico_data' in st.session_state:
@@ -621,7 +500,7 @@ def verificar_password() -> bool:
             try:
                 with st.session_state.db_manager.get_connection() as conn:
                     c = conn.cursor()
-                    c.execute('SELECT username, role FROM users WHERE password_hash = ?', (password_hash,))
+                    c.execute(CONSULTA_USUARIO_POR_HASH, (password_hash,))
                     user = c.fetchone()
                     
                     if user:
@@ -849,9 +728,9 @@ def mostrar_gestion_trabajadores():
                 if submitted:
                     if nuevo_nombre:
                         try:
-                            c.execute('INSERT INTO trabajadores (nombre, equipo) VALUES (?, ?)', 
-                                     (nuevo_nombre, nuevo_equipo))
-                            conn.commit()
+                            st.session_state.db_manager.escribir(
+                                lambda conn: conn.execute('INSERT INTO trabajadores (nombre, equipo) VALUES (?, ?)', 
+                                                          (nuevo_nombre, nuevo_equipo)))
                             st.markdown("<div class='success-box'>✅ Trabajador agregado correctamente.</div>", unsafe_allow_html=True)
                             st.rerun()
                         except sqlite3.IntegrityError:
@@ -872,8 +751,8 @@ def mostrar_gestion_trabajadores():
                     
                     if st.button("Eliminar Trabajador"):
                         try:
-                            c.execute('UPDATE trabajadores SET activo = 0 WHERE nombre = ?', (trabajador_eliminar,))
-                            conn.commit()
+                            st.session_state.db_manager.escribir(
+                                lambda conn: conn.execute('UPDATE trabajadores SET activo = 0 WHERE nombre = ?', (trabajador_eliminar,)))
                             st.markdown("<div class='success-box'>✅ Trabajador eliminado correctamente.</div>", unsafe_allow_html=True)
                             st.rerun()
                         except Exception as e:
@@ -1027,8 +906,12 @@ def ingresar_datos():
     # Botón de confirmación fuera del formulario
     if st.session_state.datos_calculados is not None and st.session_state.fecha_guardar is not None:
         if st.button("✅ Confirmar y Guardar Datos", key="confirmar_guardar"):
-            if guardar_datos_db(st.session_state.fecha_guardar, st.session_state.datos_calculados):
+            resultados = guardar_datos_db(st.session_state.fecha_guardar, st.session_state.datos_calculados)
+            if resultados is not None:
                 st.markdown("<div class='success-box'>✅ Datos guardados correctamente!</div>", unsafe_allow_html=True)
+                invalidos = {n: r['motivo'] for n, r in resultados.items() if r['resultado'] == INVALIDO}
+                for nombre, motivo in invalidos.items():
+                    st.warning(f"⚠️ {nombre} no se guardó: {motivo}")
                 # Limpiar datos de confirmación
                 st.session_state.datos_calculados = None
                 st.session_state.fecha_guardar = None
@@ -1140,20 +1023,17 @@ def mostrar_dashboard():
     current_month = fecha_seleccionada.month
     current_year = fecha_seleccionada.year
     
-    # Filtrar datos del mes actual para transferencias
-    df_month = df[(df['fecha'].dt.month == current_month) & 
-                  (df['fecha'].dt.year == current_year)]
-    
-    df_transferencias_month = df_month[df_month['equipo'] == 'Transferencias']
+    # Cantidades diarias del mes para transferencias (consulta sobre el índice de fecha y equipo)
+    with st.session_state.db_manager.get_connection() as conn:
+        transferencias_diarias, meta_mensual_transferencias = cantidades_mes(
+            conn, 'Transferencias', current_year, current_month)
     
     # Obtener meta mensual de transferencias (usamos el último valor registrado)
-    if not df_transferencias_month.empty:
-        meta_mensual_transferencias = df_transferencias_month['meta_mensual'].iloc[0]
-    else:
+    if meta_mensual_transferencias is None:
         # Si no hay datos, usar un valor por defecto
         meta_mensual_transferencias = 150000
     
-    cum_transferencias = df_transferencias_month['cantidad'].sum()
+    cum_transferencias = sum(cantidad for _, cantidad in transferencias_diarias)
     cumplimiento_transferencias = (cum_transferencias / meta_mensual_transferencias * 100) if meta_mensual_transferencias > 0 else 0
     
     col1, col2 = st.columns(2)
@@ -1173,10 +1053,9 @@ def mostrar_dashboard():
         st.plotly_chart(fig, use_container_width=True)
     
     # Gráfico de evolución mensual
-    if not df_transferencias_month.empty:
-        df_transferencias_daily = df_transferencias_month.groupby(df_transferencias_month['fecha'].dt.date)['cantidad'].sum().reset_index(name='cantidad')
+    if transferencias_diarias:
+        df_transferencias_daily = pd.DataFrame(transferencias_diarias, columns=['fecha', 'cantidad'])
         df_transferencias_daily['fecha'] = pd.to_datetime(df_transferencias_daily['fecha'])
-        df_transferencias_daily = df_transferencias_daily.sort_values('fecha')
         df_transferencias_daily['cumulative'] = df_transferencias_daily['cantidad'].cumsum()
         
         fig = crear_grafico_interactivo(
@@ -1284,42 +1163,39 @@ def mostrar_analisis_historico():
     """Muestra el análisis histórico de KPIs"""
     st.markdown("<h1 class='header-title'>📈 Análisis Histórico de KPIs</h1>", unsafe_allow_html=True)
     
-    df = cargar_historico_db()
+    # Solo los límites y los nombres: los registros se cargan ya filtrados
+    fecha_min, fecha_max, nombres = obtener_filtros_historico()
     
-    if df.empty:
+    if fecha_min is None:
         st.markdown("<div class='warning-box'>⚠️ No hay datos históricos. Por favor, ingresa datos primero.</div>", unsafe_allow_html=True)
         return
     
-    df['dia'] = df['fecha'].dt.date
-    
-    fecha_min = df['dia'].min()
-    fecha_max = df['dia'].max()
-    
     col1, col2, col3 = st.columns([1, 1, 2])
     
     with col1:
-        fecha_inicio = st.date_input("Fecha de inicio:", value=fecha_min, min_value=fecha_min, max_value=fecha_max)
+        inicio_defecto = max(fecha_min, fecha_max - timedelta(days=DIAS_HISTORICO_INICIAL - 1))
+        fecha_inicio = st.date_input("Fecha de inicio:", value=inicio_defecto, min_value=fecha_min, max_value=fecha_max)
     
     with col2:
         fecha_fin = st.date_input("Fecha de fin:", value=fecha_max, min_value=fecha_min, max_value=fecha_max)
     
     with col3:
-        trabajador = st.selectbox("Filtrar por trabajador:", options=["Todos"] + list(df['nombre'].unique()))
+        trabajador = st.selectbox("Filtrar por trabajador:", options=["Todos"] + nombres)
     
     if fecha_inicio > fecha_fin:
         st.markdown("<div class='error-box'>❌ La fecha de inicio no puede ser mayor que la fecha de fin.</div>", unsafe_allow_html=True)
         return
     
-    # Aplicar filtros
-    df_filtrado = df[(df['dia'] >= fecha_inicio) & (df['dia'] <= fecha_fin)]
-    
-    if trabajador != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['nombre'] == trabajador]
+    # Aplicar filtros en la consulta
+    df_filtrado = cargar_historico_db(fecha_inicio.strftime("%Y-%m-%d"), fecha_fin.strftime("%Y-%m-%d"),
+                                      None if trabajador == "Todos" else trabajador)
     
     if df_filtrado.empty:
         st.markdown("<div class='warning-box'>⚠️ No hay datos en el rango de fechas seleccionado.</div>", unsafe_allow_html=True)
         return
     
+    df_filtrado['dia'] = df_filtrado['fecha'].dt.date
+    
     st.markdown("<h2 class='section-title'>📋 Resumen Estadístico</h2>", unsafe_allow_html=True)
     
     # Mostrar resumen estadístico
@@ -1582,9 +1458,9 @@ def mostrar_administracion():
                             else:
                                 # Hashear contraseña y guardar usuario
                                 password_hash = hashlib.sha256(nueva_contrasena.encode()).hexdigest()
-                                c.execute('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)', 
-                                         (nuevo_usuario, password_hash, rol_usuario))
-                                conn.commit()
+                                st.session_state.db_manager.escribir(
+                                    lambda conn: conn.execute('INSERT INTO users (username, password_hash, role) VALUES (?, ?, ?)', 
+                                                              (nuevo_usuario, password_hash, rol_usuario)))
                                 st.markdown("<div class='success-box'>✅ Usuario agregado correctamente.</div>", unsafe_allow_html=True)
                                 st.rerun()
                         else:
@@ -1602,14 +1478,12 @@ def mostrar_administracion():
         
         if st.button("💾 Guardar Configuración"):
             try:
-                with st.session_state.db_manager.get_connection() as conn:
-                    c = conn.cursor()
-                    c.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', 
-                             ('mostrar_graficos', str(mostrar_graficos)))
-                    c.execute('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', 
-                             ('actualizacion_automatica', str(actualizacion_automatica)))
-                    conn.commit()
-                    st.markdown("<div class='success-box'>✅ Configuración guardada correctamente.</div>", unsafe_allow_html=True)
+                st.session_state.db_manager.escribir(
+                    lambda conn: conn.executemany('INSERT OR REPLACE INTO config (key, value) VALUES (?, ?)', [
+                        ('mostrar_graficos', str(mostrar_graficos)),
+                        ('actualizacion_automatica', str(actualizacion_automatica)),
+                    ]))
+                st.markdown("<div class='success-box'>✅ Configuración guardada correctamente.</div>", unsafe_allow_html=True)
             except Exception as e:
                 logger.error(f"Error al guardar configuración: {e}")
                 st.markdown("<div class='error-box'>❌ Error al guardar configuración.</div>", unsafe_allow_html=True)
@@ -0,0 +1,481 @@
+"""Acceso a kpi_data.db sin depender de Streamlit: esquema, conexiones, escritura y consultas de KPIs diarios."""
+import logging
+import queue
+import re
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RUTA_DB = 'kpi_data.db'
+
+# Caché de páginas por conexión (KiB, negativo en el PRAGMA) y lectura mapeada en memoria
+CACHE_KB = 16_384
+MMAP_BYTES = 256 * 1024 * 1024
+# Milisegundos que una conexión espera un bloqueo antes de fallar con "database is locked"
+ESPERA_BLOQUEO_MS = 30_000
+# Conexiones de lectura libres que se conservan para reutilizar
+MAX_LECTORES_LIBRES = 8
+# Operaciones pendientes que el escritor confirma juntas como máximo
+MAX_OPERACIONES_GRUPO = 64
+
+# Columnas de daily_kpis que vienen del formulario, con su valor por defecto
+CAMPOS_KPI = {
+    'actividad': "",
+    'cantidad': 0,
+    'meta': 0,
+    'eficiencia': 0,
+    'productividad': 0,
+    'comentario': "",
+    'meta_mensual': 0,
+    'horas_trabajo': 0,
+    'equipo': "",
+}
+
+# Índices que mantiene el esquema. Sin INCLUDE en SQLite, un índice "cubre" una consulta
+# si trae todas sus columnas: las cantidades del mes por equipo no leen la tabla
+INDICES = {
+    'idx_daily_kpis_fecha_equipo': 'daily_kpis (fecha, equipo, cantidad, meta_mensual)',
+    'idx_daily_kpis_nombre_fecha': 'daily_kpis (nombre, fecha)',
+    'idx_users_password_hash': 'users (password_hash)',
+    'idx_trabajadores_activo': 'trabajadores (activo, equipo, nombre)',
+}
+
+_COLUMNAS_HISTORICO = ('fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, '
+                       'comentario, meta_mensual, horas_trabajo, equipo')
+
+CONSULTA_CANTIDAD_DIARIA_MES = (
+    "SELECT fecha, SUM(cantidad) FROM daily_kpis WHERE fecha BETWEEN ? AND ? AND equipo = ? "
+    "GROUP BY fecha ORDER BY fecha"
+)
+# La meta mensual vigente es la del último día registrado del mes
+CONSULTA_META_MENSUAL = (
+    "SELECT meta_mensual FROM daily_kpis WHERE fecha BETWEEN ? AND ? AND equipo = ? "
+    "ORDER BY fecha DESC LIMIT 1"
+)
+# Primera y última fecha registradas: cada subconsulta lee un extremo del índice
+CONSULTA_RANGO_FECHAS = "SELECT (SELECT MIN(fecha) FROM daily_kpis), (SELECT MAX(fecha) FROM daily_kpis)"
+# Trabajadores con registros, saltando de nombre en nombre por el índice (nombre, fecha)
+# en vez de recorrerlo completo como haría SELECT DISTINCT
+CONSULTA_NOMBRES_HISTORICO = """
+WITH RECURSIVE nombres(nombre) AS (
+    SELECT MIN(nombre) FROM daily_kpis
+    UNION ALL
+    SELECT (SELECT MIN(nombre) FROM daily_kpis WHERE nombre > nombres.nombre)
+    FROM nombres WHERE nombre IS NOT NULL
+)
+SELECT nombre FROM nombres WHERE nombre IS NOT NULL
+"""
+CONSULTA_USUARIO_POR_HASH = 'SELECT username, role FROM users WHERE password_hash = ?'
+CONSULTA_TRABAJADORES_ACTIVOS = 'SELECT nombre, equipo FROM trabajadores WHERE activo = 1 ORDER BY equipo, nombre'
+CONSULTA_EQUIPOS_ACTIVOS = 'SELECT DISTINCT equipo FROM trabajadores WHERE activo = 1 ORDER BY equipo'
+
+# Paso del plan que recorre una tabla completa (o un índice completo) en vez de buscar
+_ESCANEO_COMPLETO = re.compile(r'^SCAN (daily_kpis|users|trabajadores)\b')
+
+# Resultado de cada trabajador al guardar un día
+INSERTADO = 'insertado'
+ACTUALIZADO = 'actualizado'
+INVALIDO = 'invalido'
+
+_UPSERT_KPI = (
+    f"INSERT INTO daily_kpis (fecha, nombre, {', '.join(CAMPOS_KPI)}) "
+    f"VALUES (?, ?, {', '.join('?' for _ in CAMPOS_KPI)}) "
+    f"ON CONFLICT(fecha, nombre) DO UPDATE SET "
+    f"{', '.join(f'{campo}=excluded.{campo}' for campo in CAMPOS_KPI)}"
+)
+
+
+class ConexionesKPI:
+    """
+    Conexiones a kpi_data.db en modo WAL: los lectores leen la última versión confirmada
+    sin esperar al escritor, y el escritor no espera a los lectores.
+    - Lectura: cada hilo usa una conexión propia (query_only) mientras dura el bloque;
+      al salir vuelve a un pool para el siguiente hilo (Streamlit crea hilos por sesión).
+    - Escritura: una sola conexión, usada por un hilo a la vez (bloqueo); el bloque es
+      una transacción que se confirma al salir o se revierte si hay una excepción.
+    """
+
+    def __init__(self, ruta: str = RUTA_DB, cache_kb: int = CACHE_KB, mmap_bytes: int = MMAP_BYTES):
+        self.ruta = ruta
+        self.cache_kb = cache_kb
+        self.mmap_bytes = mmap_bytes
+        self._lectores = queue.LifoQueue(maxsize=MAX_LECTORES_LIBRES)
+        self._bloqueo_escritura = threading.Lock()
+        self._escritor: Optional[sqlite3.Connection] = None
+
+    def _abrir(self, solo_lectura: bool) -> sqlite3.Connection:
+        # check_same_thread=False: la conexión pasa de un hilo a otro, pero nunca la usan dos a la vez
+        conn = sqlite3.connect(self.ruta, timeout=ESPERA_BLOQUEO_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        if not solo_lectura:
+            # Queda guardado en el archivo: basta con activarlo desde el escritor
+            conn.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no pierde integridad ante un corte (solo las últimas transacciones)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{self.cache_kb}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA busy_timeout={ESPERA_BLOQUEO_MS}")
+        if solo_lectura:
+            conn.execute("PRAGMA query_only=1")
+        return conn
+
+    @contextmanager
+    def lectura(self):
+        """Conexión de solo lectura para el hilo actual"""
+        try:
+            conn = self._lectores.get_nowait()
+        except queue.Empty:
+            conn = self._abrir(solo_lectura=True)
+        try:
+            yield conn
+        finally:
+            # Una transacción de lectura abierta retendría una versión vieja y frenaría el checkpoint
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._lectores.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def escritura(self):
+        """La conexión de escritura, en exclusiva, dentro de una transacción"""
+        with self._bloqueo_escritura:
+            if self._escritor is None:
+                self._escritor = self._abrir(solo_lectura=False)
+            with self._escritor:
+                yield self._escritor
+
+    def cerrar(self) -> None:
+        """Cierra todas las conexiones (se vuelven a abrir al usarlas)"""
+        with self._bloqueo_escritura:
+            if self._escritor is not None:
+                self._escritor.close()
+                self._escritor = None
+        while True:
+            try:
+                self._lectores.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class EscritorKPI:
+    """
+    Hilo único que hace todas las escrituras. Cada sesión encola una operación
+    (función que recibe la conexión de escritura y no confirma) y recibe un Future
+    con su resultado. El hilo toma todas las operaciones pendientes (hasta
+    MAX_OPERACIONES_GRUPO) y las confirma en una sola transacción: cuando varios
+    supervisores guardan a la vez, un commit cubre a todos. Cada operación corre en
+    su propio SAVEPOINT, así una que falla se revierte sola y su Future recibe la
+    excepción sin afectar al resto del grupo.
+    """
+
+    def __init__(self, conexiones: ConexionesKPI, max_grupo: int = MAX_OPERACIONES_GRUPO):
+        self.conexiones = conexiones
+        self.max_grupo = max_grupo
+        self._cola: queue.SimpleQueue = queue.SimpleQueue()
+        self._hilo: Optional[threading.Thread] = None
+        self._bloqueo_inicio = threading.Lock()
+        self.grupos = 0
+        self.operaciones = 0
+
+    def enviar(self, operacion: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Encola la operación; el Future se resuelve después del commit que la incluye"""
+        futuro = Future()
+        self._iniciar()
+        self._cola.put((operacion, futuro))
+        return futuro
+
+    def escribir(self, operacion: Callable[[sqlite3.Connection], Any], timeout: Optional[float] = None) -> Any:
+        """enviar y esperar el resultado (o la excepción de la operación)"""
+        return self.enviar(operacion).result(timeout)
+
+    def _iniciar(self) -> None:
+        with self._bloqueo_inicio:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='escritor-kpi', daemon=True)
+                self._hilo.start()
+
+    def _bucle(self) -> None:
+        while True:
+            grupo = [self._cola.get()]
+            while len(grupo) < self.max_grupo:
+                try:
+                    grupo.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+            self._confirmar_grupo(grupo)
+
+    def _confirmar_grupo(self, grupo: List[Tuple[Callable, Future]]) -> None:
+        grupo = [(operacion, futuro) for operacion, futuro in grupo if futuro.set_running_or_notify_cancel()]
+        listos = []
+        try:
+            with self.conexiones.escritura() as conn:
+                conn.execute("BEGIN IMMEDIATE")
+                for operacion, futuro in grupo:
+                    conn.execute("SAVEPOINT operacion")
+                    try:
+                        resultado = operacion(conn)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO operacion")
+                        futuro.set_exception(e)
+                    else:
+                        listos.append((futuro, resultado))
+                    conn.execute("RELEASE operacion")
+        except Exception as e:
+            # Falló el commit (o la transacción): nada del grupo quedó guardado
+            logger.error(f"Error al confirmar un grupo de {len(grupo)} escrituras: {e}")
+            for _, futuro in grupo:
+                if not futuro.done():
+                    futuro.set_exception(e)
+            return
+        self.grupos += 1
+        self.operaciones += len(grupo)
+        for futuro, resultado in listos:
+            futuro.set_result(resultado)
+
+
+def crear_tabla_kpis(conn: sqlite3.Connection) -> None:
+    """Crea daily_kpis si no existe (y agrega la columna equipo a bases anteriores)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS daily_kpis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha TEXT NOT NULL,
+        nombre TEXT NOT NULL,
+        actividad TEXT NOT NULL,
+        cantidad REAL NOT NULL,
+        meta REAL NOT NULL,
+        eficiencia REAL NOT NULL,
+        productividad REAL NOT NULL,
+        comentario TEXT,
+        meta_mensual REAL,
+        horas_trabajo REAL,
+        equipo TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(fecha, nombre)
+    )
+    ''')
+
+    # Verificar si la columna 'equipo' existe y agregarla si no existe
+    try:
+        conn.execute("SELECT equipo FROM daily_kpis LIMIT 1")
+    except sqlite3.OperationalError:
+        conn.execute('ALTER TABLE daily_kpis ADD COLUMN equipo TEXT')
+
+
+def crear_esquema(conn: sqlite3.Connection) -> None:
+    """Tablas e índices de kpi_data.db (idempotente: se ejecuta al iniciar)"""
+    crear_tabla_kpis(conn)
+
+    # Crear tabla de configuración
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS config (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+    # Crear tabla de usuarios
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        role TEXT DEFAULT 'user',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    # Crear tabla de trabajadores
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS trabajadores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT UNIQUE NOT NULL,
+        equipo TEXT NOT NULL,
+        activo BOOLEAN DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+    for nombre, definicion in INDICES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nombre} ON {definicion}")
+
+
+def consulta_historico(fecha_inicio: Optional[str] = None, fecha_fin: Optional[str] = None,
+                       trabajador: Optional[str] = None) -> Tuple[str, List[str]]:
+    """SQL y parámetros del histórico con los filtros dados (los ausentes no filtran)"""
+    query = f"SELECT {_COLUMNAS_HISTORICO} FROM daily_kpis WHERE 1=1"
+    params = []
+    if fecha_inicio:
+        query += ' AND fecha >= ?'
+        params.append(fecha_inicio)
+    if fecha_fin:
+        query += ' AND fecha <= ?'
+        params.append(fecha_fin)
+    if trabajador:
+        query += ' AND nombre = ?'
+        params.append(trabajador)
+    return query + ' ORDER BY fecha DESC, nombre', params
+
+
+def _limites_mes(anio: int, mes: int) -> Tuple[str, str]:
+    # Las fechas son texto YYYY-MM-DD: el día 31 cubre cualquier mes al comparar
+    return f"{anio:04d}-{mes:02d}-01", f"{anio:04d}-{mes:02d}-31"
+
+
+def cantidades_mes(conn: sqlite3.Connection, equipo: str, anio: int,
+                   mes: int) -> Tuple[List[Tuple[str, float]], Optional[float]]:
+    """(fecha, cantidad del equipo) de cada día del mes y la meta mensual vigente (None si no hay registros)"""
+    desde, hasta = _limites_mes(anio, mes)
+    diarias = [tuple(fila) for fila in conn.execute(CONSULTA_CANTIDAD_DIARIA_MES, (desde, hasta, equipo))]
+    meta = conn.execute(CONSULTA_META_MENSUAL, (desde, hasta, equipo)).fetchone()
+    return diarias, (meta[0] if meta else None)
+
+
+def leer_historico(conn: sqlite3.Connection, fecha_inicio: Optional[str] = None,
+                   fecha_fin: Optional[str] = None, trabajador: Optional[str] = None) -> pd.DataFrame:
+    """Registros filtrados en la consulta, con fecha como datetime y las columnas de cumplimiento"""
+    query, params = consulta_historico(fecha_inicio, fecha_fin, trabajador)
+    df = pd.read_sql_query(query, conn, params=params)
+    if not df.empty:
+        df['fecha'] = pd.to_datetime(df['fecha'])
+        df['cumplimiento_meta'] = np.where(df['cantidad'] >= df['meta'], 'Sí', 'No')
+        df['diferencia_meta'] = df['cantidad'] - df['meta']
+    return df
+
+
+def rango_fechas(conn: sqlite3.Connection) -> Tuple[Optional[str], Optional[str]]:
+    """Primera y última fecha con registros (None, None si la tabla está vacía)"""
+    return tuple(conn.execute(CONSULTA_RANGO_FECHAS).fetchone())
+
+
+def nombres_historico(conn: sqlite3.Connection) -> List[str]:
+    """Trabajadores que tienen al menos un registro, en orden alfabético"""
+    return [fila[0] for fila in conn.execute(CONSULTA_NOMBRES_HISTORICO)]
+
+
+def consultas_frecuentes() -> Dict[str, Tuple[str, tuple]]:
+    """Consultas de cada página con parámetros de ejemplo, para revisar sus planes"""
+    desde, hasta = _limites_mes(2024, 1)
+    consultas = {
+        'cantidad_diaria_mes': (CONSULTA_CANTIDAD_DIARIA_MES, (desde, hasta, 'Transferencias')),
+        'meta_mensual': (CONSULTA_META_MENSUAL, (desde, hasta, 'Transferencias')),
+        'rango_fechas': (CONSULTA_RANGO_FECHAS, ()),
+        'nombres_historico': (CONSULTA_NOMBRES_HISTORICO, ()),
+        'usuario_por_hash': (CONSULTA_USUARIO_POR_HASH, ('0' * 64,)),
+        'trabajadores_activos': (CONSULTA_TRABAJADORES_ACTIVOS, ()),
+        'equipos_activos': (CONSULTA_EQUIPOS_ACTIVOS, ()),
+    }
+    # Histórico con cada combinación de filtros (sin filtros lee todo a propósito)
+    for nombre, filtros in (('historico_desde', (desde, None, None)), ('historico_rango', (desde, hasta, None)),
+                            ('historico_trabajador', (None, None, 'Trabajador')),
+                            ('historico_trabajador_rango', (desde, hasta, 'Trabajador'))):
+        query, params = consulta_historico(*filtros)
+        consultas[nombre] = (query, tuple(params))
+    return consultas
+
+
+def escaneos_completos(conn: sqlite3.Connection) -> Dict[str, List[str]]:
+    """Consultas frecuentes cuyo EXPLAIN QUERY PLAN recorre una tabla completa, con su plan"""
+    escaneos = {}
+    for nombre, (query, params) in consultas_frecuentes().items():
+        plan = [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        if any(_ESCANEO_COMPLETO.match(paso) for paso in plan):
+            escaneos[nombre] = plan
+    return escaneos
+
+
+def validar_fecha(fecha: str) -> bool:
+    """Valida que una fecha tenga el formato correcto"""
+    try:
+        datetime.strptime(fecha, "%Y-%m-%d")
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def validar_numero_positivo(valor: Any) -> bool:
+    """Valida que un valor sea un número positivo"""
+    try:
+        num = float(valor)
+        return num >= 0
+    except (ValueError, TypeError):
+        return False
+
+
+def validar_registro(info: Dict[str, Any]) -> Optional[str]:
+    """Motivo por el que el registro de un trabajador no se puede guardar (None si es válido)"""
+    for campo in ('cantidad', 'meta', 'horas_trabajo'):
+        if not validar_numero_positivo(info.get(campo, 0)):
+            return f"{campo} debe ser un número mayor o igual a 0"
+    return None
+
+
+def validar_dia(fecha: str, datos: Dict[str, Dict]) -> Tuple[List[tuple], Dict[str, str]]:
+    """
+    Valida el día completo antes de escribir: filas listas para el UPSERT y los
+    trabajadores rechazados con su motivo (con fecha inválida se rechazan todos).
+    """
+    if not validar_fecha(fecha):
+        return [], {nombre: f"fecha inválida: {fecha}" for nombre in datos}
+    filas, rechazados = [], {}
+    for nombre, info in datos.items():
+        motivo = validar_registro(info)
+        if motivo:
+            rechazados[nombre] = motivo
+        else:
+            filas.append((fecha, nombre, *(info.get(campo, defecto) for campo, defecto in CAMPOS_KPI.items())))
+    return filas, rechazados
+
+
+def guardar_kpis(conn: sqlite3.Connection, fecha: str, datos: Dict[str, Dict]) -> Dict[str, Dict[str, str]]:
+    """
+    Guarda los KPIs de un día dentro de la transacción del llamador (no confirma):
+    una consulta para saber qué trabajadores ya tenían registro y un executemany de
+    INSERT ... ON CONFLICT DO UPDATE. Devuelve por trabajador {'resultado':
+    insertado|actualizado|invalido, 'motivo': ...}.
+    """
+    filas, rechazados = validar_dia(fecha, datos)
+    resultados = {nombre: {'resultado': INVALIDO, 'motivo': motivo} for nombre, motivo in rechazados.items()}
+    for nombre, motivo in rechazados.items():
+        logger.warning(f"Datos inválidos para {nombre}, omitiendo guardado: {motivo}")
+    if not filas:
+        return resultados
+
+    existentes = {fila[0] for fila in conn.execute('SELECT nombre FROM daily_kpis WHERE fecha = ?', (fecha,))}
+    conn.executemany(_UPSERT_KPI, filas)
+    for fila in filas:
+        resultados[fila[1]] = {'resultado': ACTUALIZADO if fila[1] in existentes else INSERTADO, 'motivo': ''}
+    return resultados
+
+
+def crear_backup_db(conn: sqlite3.Connection, destino: str) -> None:
+    """Copia consistente de la base con la API de backup de SQLite (página por página, sin leerla entera en memoria)"""
+    copia = sqlite3.connect(destino)
+    try:
+        conn.backup(copia, pages=4096)
+    finally:
+        copia.close()
+
+
+def restaurar_backup_db(conn: sqlite3.Connection, origen: str) -> None:
+    """
+    Reemplaza el contenido de la base con el de un backup desde la conexión de escritura
+    (copiar el archivo encima dañaría una base en WAL con el -wal y -shm existentes).
+    """
+    copia = sqlite3.connect(origen)
+    try:
+        # La API de backup no puede correr dentro de una transacción abierta en el destino
+        conn.commit()
+        copia.backup(conn)
+    finally:
+        copia.close()
@@ -6,6 +6,7 @@ import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import time
 import hashlib
+import functools
 import logging
 import re
 import json
@@ -500,40 +501,23 @@ def show_sidebar():
 # 3. FUNCIONES AUXILIARES GLOBALES
 # ==============================================================================
 
-import unicodedata
 from typing import Dict, List, Optional, Any, Union
 
-def normalizar_texto_wilo(texto):
-    """Normaliza texto para comparación"""
-    if pd.isna(texto) or texto == '': 
-        return ''
-    texto = str(texto)
-    try:
-        texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
-    except: 
-        pass
-    texto = re.sub(r'[^A-Za-z0-9\s]', ' ', texto.upper())
-    return re.sub(r'\s+', ' ', texto).strip()
-
-def procesar_subtotal_wilo(valor):
-    """Procesa valores monetarios"""
-    if pd.isna(valor): 
-        return 0.0
-    try:
-        if isinstance(valor, (int, float)): 
-            return float(valor)
-        valor_str = str(valor).strip()
-        valor_str = re.sub(r'[^\d.,-]', '', valor_str)
-        if ',' in valor_str and '.' in valor_str:
-            if valor_str.rfind(',') > valor_str.rfind('.'): 
-                valor_str = valor_str.replace('.', '').replace(',', '.')
-            else: 
-                valor_str = valor_str.replace(',', '')
-        elif ',' in valor_str: 
-            valor_str = valor_str.replace(',', '.')
-        return float(valor_str) if valor_str else 0.0
-    except: 
-        return 0.0
+from reconciliacion import (normalizar_texto_wilo, procesar_subtotal_wilo,
+                            identificar_tipo_tienda_v8, reconciliar,
+                            resumir_reconciliacion, reconciliar_por_particiones,
+                            leer_encabezados, leer_tabla, firma_lectura, FORMATOS_MONTO,
+                            CACHE_NORMALIZACION, CACHE_RESULTADOS, calcular_llave,
+                            HISTORIAL_RECONCILIACION, MEMORIA_MAPEOS, ROLES_MANIFIESTO,
+                            ROLES_FACTURAS, sugerir_mapeo, emparejar_archivos,
+                            listar_directorio, reconciliar_lote, TARIFARIO,
+                            auditar_tarifas, resumir_sobrecobros, proponer_coincidencias,
+                            cruzar_sin_guia, reporte_memoria, excel_temporal,
+                            GENERADOR_INFORMES, VERSION_INFORME, CACHE_TABLAS_PDF,
+                            DimensionTiendas, RUTA_TIENDAS, TIPOS_TIENDA, BIBLIOTECA_PATRONES)
+
+# Dimensión de tiendas: solo este proceso la escribe; el motor clasifica con las reglas si no la recibe
+TIENDAS = DimensionTiendas(RUTA_TIENDAS)
 
 def hash_password(pw: str) -> str:
     """Genera hash SHA256 de contraseña"""
@@ -547,6 +531,52 @@ def validar_fecha(fecha: str) -> bool:
     except ValueError: 
         return False
 
+MAX_LECTURAS_SESION = 4
+
+def leer_archivo_sesion(archivo, columnas: Optional[List[str]] = None, columnas_texto: List[str] = ()) -> pd.DataFrame:
+    """Lee un archivo subido una sola vez por sesión (mismo archivo y mismas columnas)"""
+    lecturas = st.session_state.setdefault('lecturas_archivos', {})
+    firma = firma_lectura(archivo, columnas, columnas_texto)
+    if firma not in lecturas:
+        while len(lecturas) >= MAX_LECTURAS_SESION:
+            lecturas.pop(next(iter(lecturas)))
+        lecturas[firma] = leer_tabla(archivo, columnas_texto=columnas_texto, columnas=columnas)
+    return lecturas[firma]
+
+def sugerir_columnas_sesion(origen, roles) -> tuple:
+    """Mapeo de columnas sugerido para un archivo, calculado una vez por sesión"""
+    sugerencias = st.session_state.setdefault('mapeos_sugeridos', {})
+    if isinstance(origen, pd.DataFrame):
+        firma = ('demo', tuple(origen.columns), roles)
+    else:
+        firma = (firma_lectura(origen), roles)
+    if firma not in sugerencias:
+        sugerencias[firma] = sugerir_mapeo(origen, roles)
+    return sugerencias[firma]
+
+@st.fragment(run_every=2)
+def mostrar_informe_pdf(llave: str) -> None:
+    """Avance del informe PDF que se genera en segundo plano y su descarga cuando está listo"""
+    estado = GENERADOR_INFORMES.estado(llave)
+    if estado['estado'] == 'listo':
+        st.download_button(
+            "📄 Descargar informe PDF",
+            functools.partial(open, estado['ruta'], 'rb'),
+            file_name=f"informe_reconciliacion_{datetime.now():%Y%m%d_%H%M}.pdf",
+            mime="application/pdf",
+            on_click="ignore"
+        )
+    elif estado['estado'] == 'error':
+        st.error(f"❌ No se pudo generar el informe PDF: {estado['error']}")
+    else:
+        st.progress(estado['progreso'], text=f"📄 Generando informe PDF... {estado['progreso']:.0%}")
+
+def indice_sugerido(columnas: List[str], sugerida: Optional[str], por_defecto: int) -> int:
+    """Posición de la columna sugerida en un selectbox (o la posición por defecto)"""
+    if sugerida in columnas:
+        return columnas.index(sugerida)
+    return min(por_defecto, len(columnas) - 1)
+
 # ==============================================================================
 # 4. SIMULACIÓN DE BASE DE DATOS LOCAL
 # ==============================================================================
@@ -764,34 +794,6 @@ def mostrar_dashboard_kpis():
 # 6. MÓDULO RECONCILIACIÓN V8
 # ==============================================================================
 
-def identificar_tipo_tienda_v8(nombre):
-    """
-    Lógica V8.0 para clasificación de tiendas.
-    Incluye regla específica para JOFRE SANTANA y manejo de Piezas.
-    """
-    if pd.isna(nombre) or nombre == '': 
-        return "DESCONOCIDO"
-    nombre_norm = normalizar_texto_wilo(nombre)
-    
-    # 1. Regla Específica Solicitada
-    if 'JOFRE' in nombre_norm and 'SANTANA' in nombre_norm:
-        return "VENTAS AL POR MAYOR"
-    
-    # 2. Tiendas Físicas (Patrones)
-    patrones_fisicas = ['LOCAL', 'MALL', 'PLAZA', 'SHOPPING', 'CENTRO', 'COMERCIAL', 'CC', 
-                       'TIENDA', 'PASEO', 'PORTAL', 'DORADO', 'CITY', 'CEIBOS', 'QUITO', 
-                       'GUAYAQUIL', 'AMBATO', 'MANTA', 'MACHALA', 'RIOCENTRO', 'AEROPOSTALE']
-    
-    if any(p in nombre_norm for p in patrones_fisicas):
-        return "TIENDA FÍSICA"
-        
-    # 3. Nombres Propios (Venta Web)
-    palabras = nombre_norm.split()
-    if len(palabras) > 0 and len(palabras) <= 3:
-        return "VENTA WEB"
-        
-    return "TIENDA FÍSICA" # Default
-
 def mostrar_reconciliacion_v8():
     """Módulo de reconciliación financiera"""
     st.markdown("""
@@ -801,7 +803,7 @@ def mostrar_reconciliacion_v8():
     </div>
     """, unsafe_allow_html=True)
     
-    tab1, tab2, tab3 = st.tabs(["📤 Cargar Archivos", "⚙️ Configurar", "📊 Resultados"])
+    tab1, tab2, tab3, tab4 = st.tabs(["📤 Cargar Archivos", "⚙️ Configurar", "📊 Resultados", "📦 Lotes"])
     
     with tab1:
         st.subheader("Subir Archivos para Reconciliación")
@@ -820,10 +822,10 @@ def mostrar_reconciliacion_v8():
         with col_archivo2:
             st.markdown("### 🧾 Facturas")
             f_facturas = st.file_uploader(
-                "Subir archivo Excel/CSV",
-                type=['xlsx', 'xls', 'csv'],
+                "Subir archivo Excel/CSV/PDF",
+                type=['xlsx', 'xls', 'csv', 'pdf'],
                 key="facturas_file",
-                help="Archivo con columnas: Guía, Valor Facturado"
+                help="Archivo con columnas: Guía, Valor Facturado (en PDF se lee la tabla de detalle de todas las páginas)"
             )
         
         st.divider()
@@ -839,6 +841,33 @@ def mostrar_reconciliacion_v8():
         
         with col_op3:
             generar_informes = st.checkbox("Generar informes PDF", value=True)
+        
+        # Modo streaming para auditorías con archivos muy grandes
+        col_op4, col_op5 = st.columns(2)
+        
+        with col_op4:
+            modo_particionado = st.checkbox(
+                "Procesar por particiones (archivos grandes)", value=False,
+                help="Lee los archivos por bloques y cruza una partición a la vez en disco"
+            )
+        
+        with col_op5:
+            memoria_max_mb = st.number_input(
+                "Memoria máxima por partición (MB)", min_value=32, max_value=8192, value=256, step=32,
+                disabled=not modo_particionado
+            )
+        
+        modo_incremental = st.checkbox(
+            "Reconciliación incremental (manifiestos acumulados)", value=False,
+            disabled=modo_particionado,
+            help="Solo cruza las guías con filas nuevas o distintas a las de la carga anterior; "
+                 "las métricas muestran los totales acumulados del historial"
+        )
+        
+        buscar_similares = st.checkbox(
+            "Proponer coincidencias aproximadas para guías sin factura", value=True,
+            help="Busca facturas sin manifiesto cuya guía difiere en uno o dos caracteres (errores de tipeo)"
+        )
     
     with tab2:
         st.subheader("Configuración de Columnas")
@@ -872,64 +901,269 @@ def mostrar_reconciliacion_v8():
                 'VALOR_COBRADO': np.random.uniform(45, 550, int(num_rows * 0.8)).round(2)
             })
             
+            columnas_m = df_m.columns.tolist()
+            columnas_f = df_f.columns.tolist()
+        
+        elif f_manifiesto is not None and f_facturas is not None:
+            st.info("📂 **Usando archivos cargados** - Configure las columnas para su estructura")
+            columnas_m = leer_encabezados(f_manifiesto)
+            columnas_f = leer_encabezados(f_facturas)
+        
+        else:
+            st.warning("⚠️ Suba el manifiesto y las facturas, o active los datos de demostración")
+            columnas_m, columnas_f = [], []
+        
+        if columnas_m and columnas_f:
+            # Columnas sugeridas a partir de las primeras filas (o del mapeo ya confirmado)
+            mapeo_m, recordado_m = sugerir_columnas_sesion(df_m if usar_demo else f_manifiesto, ROLES_MANIFIESTO)
+            mapeo_f, recordado_f = sugerir_columnas_sesion(df_f if usar_demo else f_facturas, ROLES_FACTURAS)
+            
+            if recordado_m and recordado_f:
+                st.caption("📌 Mapeo recordado para este formato de archivos")
+            else:
+                st.caption("🧠 Columnas sugeridas automáticamente, revise y confirme el mapeo")
+            
             col_conf1, col_conf2 = st.columns(2)
             
             with col_conf1:
                 st.markdown("**Manifiesto**")
-                col_guia_m = st.selectbox("Columna Guía", df_m.columns.tolist(), index=0)
-                col_dest_m = st.selectbox("Columna Destinatario", df_m.columns.tolist(), index=1)
-                col_valor_m = st.selectbox("Columna Valor", df_m.columns.tolist(), index=3)
-                col_piezas_m = st.selectbox("Columna Piezas", df_m.columns.tolist(), index=2)
+                col_guia_m = st.selectbox("Columna Guía", columnas_m, index=indice_sugerido(columnas_m, mapeo_m['guia'], 0))
+                col_dest_m = st.selectbox("Columna Destinatario", columnas_m, index=indice_sugerido(columnas_m, mapeo_m['destinatario'], 1))
+                col_valor_m = st.selectbox("Columna Valor", columnas_m, index=indice_sugerido(columnas_m, mapeo_m['valor'], 3))
+                col_piezas_m = st.selectbox("Columna Piezas", columnas_m, index=indice_sugerido(columnas_m, mapeo_m['piezas'], 2))
             
             with col_conf2:
                 st.markdown("**Facturas**")
-                col_guia_f = st.selectbox("Columna Guía Factura", df_f.columns.tolist(), index=0)
-                col_valor_f = st.selectbox("Columna Valor Facturado", df_f.columns.tolist(), index=1)
+                col_guia_f = st.selectbox("Columna Guía Factura", columnas_f, index=indice_sugerido(columnas_f, mapeo_f['guia'], 0))
+                col_valor_f = st.selectbox("Columna Valor Facturado", columnas_f, index=indice_sugerido(columnas_f, mapeo_f['valor'], 1))
+            
+            if st.button("📌 Recordar este mapeo"):
+                MEMORIA_MAPEOS.confirmar(columnas_m, {'guia': col_guia_m, 'destinatario': col_dest_m,
+                                                      'valor': col_valor_m, 'piezas': col_piezas_m})
+                MEMORIA_MAPEOS.confirmar(columnas_f, {'guia': col_guia_f, 'valor': col_valor_f})
+                st.session_state.pop('mapeos_sugeridos', None)
+                st.success("✅ Mapeo guardado: se usará con los próximos archivos de este formato")
+            
+            formato_monto = st.selectbox(
+                "Formato de montos", list(FORMATOS_MONTO.keys()), index=0,
+                help="Automático deduce el separador decimal en cada valor"
+            )
+            
+            # Auditoría de tarifas: costo esperado por guía frente a lo facturado
+            st.markdown("**Auditoría de Tarifas**")
+            col_tar1, col_tar2, col_tar3 = st.columns(3)
+            
+            with col_tar1:
+                transportista = st.selectbox("Transportista", ["(sin auditoría)"] + TARIFARIO.transportistas())
+            
+            with col_tar2:
+                col_zona = st.selectbox("Columna Zona/Ciudad", ["(sin zona)"] + columnas_m,
+                                        disabled=transportista == "(sin auditoría)")
+            
+            with col_tar3:
+                tolerancia_pct = st.number_input("Tolerancia de sobrecobro (%)", min_value=0.0, max_value=100.0,
+                                                 value=2.0, step=0.5, disabled=transportista == "(sin auditoría)")
+            
+            if transportista == "(sin auditoría)":
+                transportista = None
+            if col_zona == "(sin zona)":
+                col_zona = None
+            
+            # Líneas de factura sin número de guía: cruce por destinatario, fecha y monto
+            st.markdown("**Facturas sin Guía**")
+            col_sg1, col_sg2, col_sg3, col_sg4 = st.columns(4)
+            
+            with col_sg1:
+                col_dest_f = st.selectbox("Columna Destinatario (Facturas)", ["(no cruzar por monto)"] + columnas_f)
+            
+            with col_sg2:
+                col_fecha_m = st.selectbox("Columna Fecha (Manifiesto)", ["(sin fecha)"] + columnas_m,
+                                           disabled=col_dest_f == "(no cruzar por monto)")
+            
+            with col_sg3:
+                col_fecha_f = st.selectbox("Columna Fecha (Facturas)", ["(sin fecha)"] + columnas_f,
+                                           disabled=col_dest_f == "(no cruzar por monto)")
+            
+            with col_sg4:
+                tolerancia_monto = st.number_input("Tolerancia de monto ($)", min_value=0.0, value=0.50, step=0.10,
+                                                   disabled=col_dest_f == "(no cruzar por monto)")
+            
+            if col_dest_f == "(no cruzar por monto)":
+                col_dest_f = None
+            if col_fecha_m == "(sin fecha)":
+                col_fecha_m = None
+            if col_fecha_f == "(sin fecha)":
+                col_fecha_f = None
     
     with tab3:
         st.subheader("Resultados de la Reconciliación")
         
-        if st.button("🚀 Ejecutar Reconciliación", type="primary", use_container_width=True):
+        if not (columnas_m and columnas_f):
+            st.info("Configure los archivos y columnas antes de ejecutar la reconciliación")
+        
+        elif st.button("🚀 Ejecutar Reconciliación", type="primary", use_container_width=True):
             with st.spinner("🔄 Procesando datos..."):
-                time.sleep(2)
-                
-                # Procesamiento
-                df_m['GUIA_CLEAN'] = df_m[col_guia_m].astype(str).str.strip().str.upper()
-                df_f['GUIA_CLEAN'] = df_f[col_guia_f].astype(str).str.strip().str.upper()
+                columnas = dict(
+                    col_guia_m=col_guia_m, col_dest_m=col_dest_m,
+                    col_valor_m=col_valor_m, col_piezas_m=col_piezas_m,
+                    col_guia_f=col_guia_f, col_valor_f=col_valor_f,
+                    separador_decimal=FORMATOS_MONTO[formato_monto],
+                    # Los patrones de guía propios del transportista (si tiene) definen la llave de cruce
+                    transportista=transportista
+                )
+                # Solo se leen del archivo las columnas elegidas en Configurar
+                columnas_proyeccion_m = [col_guia_m, col_dest_m, col_valor_m, col_piezas_m]
+                if col_zona is not None and col_zona not in columnas_proyeccion_m:
+                    columnas_proyeccion_m.append(col_zona)
+                columnas_proyeccion_f = [col_guia_f, col_valor_f]
+                if col_dest_f is not None:
+                    columnas_proyeccion_m += [c for c in [col_fecha_m] if c and c not in columnas_proyeccion_m]
+                    columnas_proyeccion_f += [c for c in [col_dest_f, col_fecha_f] if c and c not in columnas_proyeccion_f]
+                particionado = modo_particionado and not usar_demo
+                incremental = modo_incremental and not particionado
                 
-                # Merge
-                df_final = pd.merge(df_m, df_f, on='GUIA_CLEAN', how='left', suffixes=('_MAN', '_FAC'))
+                if incremental:
+                    if not usar_demo:
+                        df_m = leer_archivo_sesion(f_manifiesto, columnas_proyeccion_m, [col_guia_m])
+                        df_f = leer_archivo_sesion(f_facturas, columnas_proyeccion_f, [col_guia_f])
+                    
+                    # Solo el delta se cruza; resumen = totales acumulados del historial
+                    df_final, resumen, delta = HISTORIAL_RECONCILIACION.reconciliar(df_m, df_f, tiendas=TIENDAS,
+                                                                                    **columnas)
+                    st.caption(
+                        f"🔁 Incremental: {delta['nuevas']:,} nuevas • {delta['modificadas']:,} modificadas • "
+                        f"{delta['sin_cambios']:,} sin cambios de {delta['recibidas']:,} guías recibidas"
+                    )
+                else:
+                    # Caché por contenido de archivos + configuración de columnas
+                    origenes = [df_m, df_f] if usar_demo else [f_manifiesto, f_facturas]
+                    # Un cambio manual en la dimensión de tiendas invalida los resultados guardados; las columnas
+                    # del cruce sin guía también, porque cambian lo que se proyecta del manifiesto
+                    llave_cache = calcular_llave(origenes, dict(columnas, particionado=particionado, col_zona=col_zona,
+                                                                col_dest_f=col_dest_f, col_fecha_m=col_fecha_m,
+                                                                col_fecha_f=col_fecha_f, tiendas=TIENDAS.version(),
+                                                                patrones=BIBLIOTECA_PATRONES.definicion(transportista)))
+                    en_cache = CACHE_RESULTADOS.obtener(llave_cache)
+                    
+                    if en_cache is not None:
+                        df_final, resumen = en_cache
+                        st.caption("⚡ Resultado recuperado de la caché (archivos y columnas sin cambios)")
+                    elif particionado:
+                        # Streaming: particiones en disco, memoria acotada
+                        df_final = None
+                        resumen = reconciliar_por_particiones(
+                            f_manifiesto, f_facturas, memoria_max_mb=int(memoria_max_mb), tiendas=TIENDAS,
+                            **columnas
+                        )
+                        CACHE_RESULTADOS.guardar(llave_cache, df_final, resumen)
+                    else:
+                        if not usar_demo:
+                            df_m = leer_archivo_sesion(f_manifiesto, columnas_proyeccion_m, [col_guia_m])
+                            df_f = leer_archivo_sesion(f_facturas, columnas_proyeccion_f, [col_guia_f])
+                        
+                        # Procesamiento vectorizado (motor V8)
+                        df_final = reconciliar(df_m, df_f, tiendas=TIENDAS, **columnas)
+                        resumen = resumir_reconciliacion(df_final)
+                        CACHE_RESULTADOS.guardar(llave_cache, df_final, resumen)
                 
-                # Lógica V8
-                df_final['DESTINATARIO_NORM'] = df_final[col_dest_m].fillna('DESCONOCIDO')
-                df_final['TIPO_TIENDA'] = df_final['DESTINATARIO_NORM'].apply(identificar_tipo_tienda_v8)
+                # Memoria del resultado del motor (antes de agregar las columnas del cruce por monto)
+                memoria = reporte_memoria(df_final) if df_final is not None else None
                 
-                # Manejo de Piezas y Valores
-                df_final['PIEZAS_CALC'] = pd.to_numeric(df_final[col_piezas_m], errors='coerce').fillna(1)
-                df_final['VALOR_REAL'] = df_final[col_valor_f].apply(procesar_subtotal_wilo).fillna(0)
-                df_final['VALOR_MANIFIESTO'] = df_final[col_valor_m].apply(procesar_subtotal_wilo).fillna(0)
+                # Facturas sin guía: se asignan por monto a guías sin factura (no se guarda en la caché)
+                if col_dest_f is not None and df_final is not None and not incremental:
+                    if not usar_demo:
+                        df_f = leer_archivo_sesion(f_facturas, columnas_proyeccion_f, [col_guia_f])
+                    df_final, cruce_monto = cruzar_sin_guia(
+                        df_final, df_f, col_guia_f, col_dest_f, col_valor_f, col_dest_m,
+                        col_fecha_m, col_fecha_f, tolerancia_monto,
+                        FORMATOS_MONTO[formato_monto], transportista
+                    )
+                    resumen = resumir_reconciliacion(df_final)
+                    if cruce_monto['lineas_sin_guia'] > 0:
+                        st.caption(
+                            f"💲 Cruce por monto: {cruce_monto['cruzadas']:,} de {cruce_monto['lineas_sin_guia']:,} "
+                            f"líneas sin guía asignadas (${cruce_monto['monto_cruzado']:,.2f}); "
+                            f"revise la columna CONFIANZA_CRUCE"
+                        )
                 
-                total_facturado = df_final['VALOR_REAL'].sum()
-                total_piezas = df_final['PIEZAS_CALC'].sum()
-                con_factura = df_final[df_final['VALOR_REAL'] > 0].shape[0]
-                sin_factura = df_final[df_final['VALOR_REAL'] == 0].shape[0]
+                total_facturado = resumen['total_facturado']
+                total_piezas = resumen['total_piezas']
+                con_factura = resumen['con_factura']
+                sin_factura = resumen['sin_factura']
                 
                 # Métricas
                 col_res1, col_res2, col_res3, col_res4 = st.columns(4)
                 
                 with col_res1:
-                    st.metric("Guías Procesadas", len(df_final))
+                    st.metric("Guías Procesadas", resumen['guias'])
                 
                 with col_res2:
-                    porcentaje = (con_factura/len(df_final))*100 if len(df_final) > 0 else 0
-                    st.metric("Conciliadas", con_factura, f"{porcentaje:.1f}%")
+                    st.metric("Conciliadas", con_factura, f"{resumen['porcentaje']:.1f}%")
                 
                 with col_res3:
                     st.metric("Valor Total", f"${total_facturado:,.2f}")
                 
                 with col_res4:
-                    diferencia = total_facturado - df_final['VALOR_MANIFIESTO'].sum()
-                    st.metric("Diferencia", f"${diferencia:,.2f}", delta_color="inverse")
+                    st.metric("Diferencia", f"${resumen['diferencia']:,.2f}", delta_color="inverse")
+                
+                if resumen['montos_invalidos'] > 0:
+                    st.warning(f"⚠️ {resumen['montos_invalidos']:,} guías tienen montos que no se pudieron interpretar (se contaron como $0.00)")
+                
+                # Cobros repetidos de una misma guía en el archivo de facturas
+                duplicados = resumen['duplicados_exactos'] + resumen['duplicados_cercanos']
+                if duplicados > 0:
+                    st.warning(
+                        f"🧾 Facturación duplicada: {resumen['duplicados_exactos']:,} cobros exactos y "
+                        f"{resumen['duplicados_cercanos']:,} cercanos • ${resumen['total_en_riesgo']:,.2f} en riesgo"
+                    )
+                    if df_final is not None:
+                        with st.expander("🔎 Guías facturadas más de una vez"):
+                            st.dataframe(
+                                df_final.loc[(df_final['DUPLICADOS_EXACTOS'] > 0) | (df_final['DUPLICADOS_CERCANOS'] > 0),
+                                             [col_guia_m, 'LINEAS_FACTURA', 'DUPLICADOS_EXACTOS',
+                                              'DUPLICADOS_CERCANOS', 'VALOR_REAL', 'MONTO_EN_RIESGO']]
+                                .nlargest(500, 'MONTO_EN_RIESGO'),
+                                use_container_width=True, hide_index=True
+                            )
+                
+                # Segunda pasada: guías sin factura que podrían ser un error de tipeo
+                if buscar_similares and df_final is not None and (df_final['LINEAS_FACTURA'] == 0).any():
+                    if not usar_demo:
+                        df_f = leer_archivo_sesion(f_facturas, columnas_proyeccion_f, [col_guia_f])
+                    coincidencias = proponer_coincidencias(df_final, df_f, col_guia_m, col_guia_f, transportista)
+                    if not coincidencias.empty:
+                        with st.expander(f"🔤 {len(coincidencias):,} guías sin factura tienen una factura parecida (posible error de tipeo)"):
+                            st.dataframe(coincidencias.drop(columns='GUIA_CLEAN').head(1000),
+                                         use_container_width=True, hide_index=True)
+                
+                # Las tarifas pueden cambiar: la auditoría no se guarda en la caché
+                if transportista is not None and df_final is not None:
+                    df_final = auditar_tarifas(df_final, transportista, col_zona, tolerancia_pct / 100)
+                    sobrecobros = resumir_sobrecobros(df_final)
+                    
+                    col_sob1, col_sob2, col_sob3 = st.columns(3)
+                    
+                    with col_sob1:
+                        st.metric("Guías con Tarifa", sobrecobros['con_tarifa'])
+                    
+                    with col_sob2:
+                        st.metric("Sobrecobros", sobrecobros['sobrecobros'])
+                    
+                    with col_sob3:
+                        st.metric("Monto Sobrecobrado", f"${sobrecobros['monto_sobrecobrado']:,.2f}")
+                    
+                    if sobrecobros['sin_tarifa'] > 0:
+                        st.warning(f"⚠️ {sobrecobros['sin_tarifa']:,} guías no tienen una tarifa aplicable en el tarifario de {transportista}")
+                    
+                    if sobrecobros['sobrecobros'] > 0:
+                        with st.expander("🔎 Guías con sobrecobro"):
+                            st.dataframe(
+                                df_final.loc[df_final['ALERTA_SOBRECOBRO'],
+                                             [col_guia_m, 'TIPO_TIENDA', 'PIEZAS_CALC', 'VALOR_REAL',
+                                              'COSTO_ESPERADO', 'SOBRECOBRO']]
+                                .nlargest(500, 'SOBRECOBRO'),
+                                use_container_width=True, hide_index=True
+                            )
                 
                 st.divider()
                 
@@ -949,6 +1183,139 @@ def mostrar_reconciliacion_v8():
                 )
                 
                 st.plotly_chart(fig, use_container_width=True)
+                
+                # Tipos compactos: categorías para textos repetidos y enteros mínimos
+                if df_final is not None and len(df_final):
+                    if memoria['reduccion'] is not None:
+                        st.caption(
+                            f"🧮 Memoria del resultado: {memoria['bytes_fila_despues']:,.0f} bytes/fila "
+                            f"({memoria['bytes_fila_antes']:,.0f} antes de compactar, "
+                            f"{memoria['reduccion']:.1f}x menos) • {memoria['filas']:,} filas"
+                        )
+                    else:
+                        st.caption(
+                            f"🧮 Memoria del resultado: {memoria['bytes_fila_despues']:,.0f} bytes/fila "
+                            f"• {memoria['filas']:,} filas"
+                        )
+                    # El libro se genera al hacer clic (memoria constante, vía archivo temporal)
+                    st.download_button(
+                        "📥 Descargar resultado (Excel)",
+                        functools.partial(excel_temporal, df_final, resumen),
+                        file_name=f"reconciliacion_{datetime.now():%Y%m%d_%H%M}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                        on_click="ignore"
+                    )
+                    
+                    # El PDF se arma en un hilo de fondo; el mismo resultado reusa el archivo ya generado
+                    if generar_informes:
+                        llave_informe = calcular_llave([df_final], {'informe': VERSION_INFORME, 'col_guia': col_guia_m})
+                        GENERADOR_INFORMES.solicitar(llave_informe, df_final, resumen, col_guia=col_guia_m)
+                        mostrar_informe_pdf(llave_informe)
+                
+                # Efecto de la caché de normalización (compartida entre sesiones)
+                cache = CACHE_NORMALIZACION.estadisticas()
+                st.caption(
+                    f"⚡ Caché de normalización: {cache['aciertos']:,} aciertos / {cache['fallos']:,} fallos "
+                    f"({cache['tasa_aciertos']:.1f}%) • {cache['tamano']:,} de {cache['capacidad']:,} nombres"
+                )
+    
+    with tab4:
+        st.subheader("Reconciliación por Lotes")
+        st.caption("Los archivos se emparejan por nombre: el manifiesto y las facturas de un mismo transportista "
+                   "y período deben compartir el resto del nombre (ej. SERVIENTREGA_2024-03_MANIFIESTO.xlsx "
+                   "y SERVIENTREGA_2024-03_FACTURAS.csv)")
+        
+        origen_lote = st.radio("Origen de los archivos", ["Subir archivos", "Carpeta del servidor"], horizontal=True)
+        
+        if origen_lote == "Subir archivos":
+            archivos_lote = st.file_uploader(
+                "Manifiestos y facturas", type=['xlsx', 'xls', 'csv', 'pdf'],
+                accept_multiple_files=True, key="archivos_lote"
+            ) or []
+        else:
+            carpeta_lote = st.text_input("Ruta de la carpeta", placeholder="/datos/transportistas/2024-03")
+            archivos_lote = []
+            if carpeta_lote:
+                if os.path.isdir(carpeta_lote):
+                    archivos_lote = listar_directorio(carpeta_lote)
+                else:
+                    st.error("❌ La carpeta no existe")
+        
+        pares_lote, sin_pareja = emparejar_archivos(archivos_lote)
+        
+        if sin_pareja:
+            st.warning(f"⚠️ Sin pareja (se omiten): {', '.join(sin_pareja)}")
+        
+        if not pares_lote:
+            st.info("Cargue al menos un manifiesto con sus facturas para ejecutar el lote")
+        else:
+            st.dataframe(pd.DataFrame(
+                [{'Par': llave, 'Manifiesto': getattr(m, 'name', m), 'Facturas': getattr(f, 'name', f)}
+                 for llave, m, f in pares_lote]
+            ), use_container_width=True, hide_index=True)
+            
+            col_lote1, col_lote2 = st.columns(2)
+            
+            with col_lote1:
+                procesos_lote = st.number_input(
+                    "Procesos en paralelo", min_value=1, max_value=64, value=os.cpu_count() or 1,
+                    help="Cada par se reconcilia en un proceso; por defecto, uno por núcleo"
+                )
+            
+            with col_lote2:
+                formato_lote = st.selectbox("Formato de montos", list(FORMATOS_MONTO.keys()), index=0,
+                                            key="formato_monto_lote")
+            
+            st.caption("🧠 Las columnas de cada archivo se toman del mapeo recordado o se infieren automáticamente")
+            
+            if st.button("🚀 Ejecutar Lote", type="primary", use_container_width=True):
+                progreso = st.progress(0.0, text="Reconciliando pares...")
+                terminados = []
+                
+                def avanzar(fila):
+                    terminados.append(fila)
+                    progreso.progress(len(terminados) / len(pares_lote),
+                                      text=f"{len(terminados)} de {len(pares_lote)} pares")
+                
+                inicio = time.perf_counter()
+                df_consolidado, resumen_lote, resumen_pares = reconciliar_lote(
+                    pares_lote, separador_decimal=FORMATOS_MONTO[formato_lote],
+                    procesos=int(procesos_lote), ruta_tiendas=TIENDAS.ruta, al_terminar=avanzar
+                )
+                progreso.empty()
+                
+                col_lr1, col_lr2, col_lr3, col_lr4 = st.columns(4)
+                
+                with col_lr1:
+                    st.metric("Guías Procesadas", resumen_lote['guias'])
+                
+                with col_lr2:
+                    st.metric("Conciliadas", resumen_lote['con_factura'], f"{resumen_lote['porcentaje']:.1f}%")
+                
+                with col_lr3:
+                    st.metric("Valor Total", f"${resumen_lote['total_facturado']:,.2f}")
+                
+                with col_lr4:
+                    st.metric("Diferencia", f"${resumen_lote['diferencia']:,.2f}", delta_color="inverse")
+                
+                st.caption(f"⏱️ {len(pares_lote)} pares en {time.perf_counter() - inicio:.1f} s")
+                
+                errores = resumen_pares['error'].notna()
+                if errores.any():
+                    st.error(f"❌ {int(errores.sum())} pares no se pudieron reconciliar (ver columna error)")
+                
+                st.markdown("**Resumen por par**")
+                st.dataframe(resumen_pares, use_container_width=True, hide_index=True)
+                
+                if df_consolidado is not None:
+                    st.markdown("**Resultado consolidado**")
+                    st.dataframe(df_consolidado.head(1000), use_container_width=True, hide_index=True)
+                    st.download_button(
+                        "📥 Descargar consolidado (CSV)",
+                        df_consolidado.to_csv(index=False).encode('utf-8'),
+                        file_name=f"reconciliacion_lote_{datetime.now():%Y%m%d_%H%M}.csv",
+                        mime="text/csv"
+                    )
 
 # ==============================================================================
 # 7. MÓDULO AUDITORÍA DE CORREOS
@@ -1121,11 +1488,16 @@ def mostrar_dashboard_transferencias():
             'Destino': ['Mall del Sol', 'Price Club', 'Ventas Mayor', 'Tienda Web'] * 5,
             'Categoría': ['Tiendas', 'Price Club', 'Ventas Mayor', 'Tienda Web'] * 5,
             'Unidades': np.random.randint(10, 500, 20),
-            'Estado': ['Completada', 'En tránsito', 'Pendiente'] * 7,
+            'Estado': (['Completada', 'En tránsito', 'Pendiente'] * 7)[:20],
             'Fecha': [(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(20)]
         }
         
-        df_detalle = pd.DataFrame(data_detalle)
+        if archivo_transferencias:
+            # Solo se leen del archivo las columnas del detalle; el resultado queda en la sesión
+            columnas_detalle = [c for c in leer_encabezados(archivo_transferencias) if c in data_detalle]
+            df_detalle = leer_archivo_sesion(archivo_transferencias, columnas_detalle or None)
+        else:
+            df_detalle = pd.DataFrame(data_detalle)
         st.dataframe(df_detalle, use_container_width=True)
 
 # ==============================================================================
@@ -1278,7 +1650,8 @@ def mostrar_configuracion():
     </div>
     """, unsafe_allow_html=True)
     
-    tab_conf1, tab_conf2, tab_conf3 = st.tabs(["General", "Usuarios", "Seguridad"])
+    tab_conf1, tab_conf2, tab_conf3, tab_conf4, tab_conf5, tab_conf6 = st.tabs(
+        ["General", "Usuarios", "Seguridad", "Caché", "Tarifas", "Tiendas"])
     
     with tab_conf1:
         st.subheader("Configuración General")
@@ -1296,6 +1669,144 @@ def mostrar_configuracion():
     with tab_conf3:
         st.subheader("Seguridad del Sistema")
         st.info("Funcionalidad en desarrollo...")
+    
+    with tab_conf4:
+        st.subheader("Caché de Reconciliación")
+        
+        stats_resultados = CACHE_RESULTADOS.estadisticas()
+        stats_normalizacion = CACHE_NORMALIZACION.estadisticas()
+        
+        col_cache1, col_cache2, col_cache3 = st.columns(3)
+        
+        with col_cache1:
+            st.metric("Resultados en caché", stats_resultados['entradas'])
+        
+        with col_cache2:
+            st.metric("Espacio usado", f"{stats_resultados['tamano_mb']:.1f} MB", f"máx. {stats_resultados['max_mb']:.0f} MB", delta_color="off")
+        
+        with col_cache3:
+            st.metric("Aciertos normalización", f"{stats_normalizacion['tasa_aciertos']:.1f}%")
+        
+        if st.button("🗑️ Limpiar Caché", type="primary"):
+            eliminadas = CACHE_RESULTADOS.limpiar()
+            informes = GENERADOR_INFORMES.limpiar()
+            CACHE_TABLAS_PDF.limpiar()
+            CACHE_NORMALIZACION.limpiar()
+            st.success(f"✅ Caché limpiada ({eliminadas} resultados y {informes} informes PDF eliminados)")
+        
+        st.divider()
+        st.subheader("Historial de Reconciliación Incremental")
+        
+        stats_historial = HISTORIAL_RECONCILIACION.estadisticas()
+        st.metric("Guías en historial", f"{stats_historial['guias']:,}")
+        if stats_historial['ultima_actualizacion']:
+            st.caption(f"Última actualización: {stats_historial['ultima_actualizacion']}")
+        
+        if st.button("♻️ Reiniciar Historial"):
+            eliminadas = HISTORIAL_RECONCILIACION.limpiar()
+            st.success(f"✅ Historial reiniciado ({eliminadas:,} guías eliminadas)")
+        
+        st.divider()
+        st.subheader("Mapeos de Columnas Recordados")
+        st.metric("Formatos de archivo recordados", len(MEMORIA_MAPEOS))
+        
+        if st.button("🧹 Olvidar Mapeos"):
+            olvidados = MEMORIA_MAPEOS.olvidar()
+            st.session_state.pop('mapeos_sugeridos', None)
+            st.success(f"✅ {olvidados} mapeos eliminados")
+    
+    with tab_conf5:
+        st.subheader("Tarifario de Transportistas")
+        st.caption("Costo esperado = TARIFA_BASE + TARIFA_PIEZA × (piezas − PIEZAS_DESDE) de la banda correspondiente. "
+                   "Use * en ZONA o TIPO_TIENDA para la tarifa general.")
+        
+        tabla_tarifas = st.data_editor(
+            TARIFARIO.tabla(), num_rows="dynamic", use_container_width=True, hide_index=True,
+            column_config={
+                'TIPO_TIENDA': st.column_config.TextColumn(
+                    help="VENTA WEB, TIENDA FÍSICA, VENTAS AL POR MAYOR o *"),
+                'PIEZAS_DESDE': st.column_config.NumberColumn(min_value=0, step=1),
+                'TARIFA_BASE': st.column_config.NumberColumn(format="$%.2f"),
+                'TARIFA_PIEZA': st.column_config.NumberColumn(format="$%.2f"),
+            },
+            key="editor_tarifas"
+        )
+        
+        if st.button("💾 Guardar Tarifario", type="primary"):
+            try:
+                TARIFARIO.guardar(tabla_tarifas)
+                st.success("✅ Tarifario guardado")
+            except ValueError as e:
+                st.error(f"❌ {e}")
+        
+        st.divider()
+        st.subheader("Patrones de Guía por Transportista")
+        st.caption("SERIE es la serie que toman las guías escritas sin ella (con GUA, 0001 y 1001.0 cruzan con "
+                   "GUA-0001 y GUA-1001). PATRON es una expresión regular opcional con el grupo (?P<numero>...) "
+                   "y, si la guía la trae, (?P<serie>...); lo que no reconoce sigue con las reglas generales.")
+        
+        tabla_patrones = st.data_editor(
+            BIBLIOTECA_PATRONES.tabla(), num_rows="dynamic", use_container_width=True, hide_index=True,
+            key="editor_patrones"
+        )
+        
+        if st.button("💾 Guardar Patrones", type="primary"):
+            try:
+                BIBLIOTECA_PATRONES.guardar(tabla_patrones)
+                st.success("✅ Patrones guardados")
+            except ValueError as e:
+                st.error(f"❌ {e}")
+    
+    with tab_conf6:
+        st.subheader("Clasificación de Tiendas")
+        st.caption("Cada destinatario se clasifica con las reglas V8 la primera vez que aparece y conserva "
+                   "ese tipo en las siguientes reconciliaciones. Aquí se puede corregir manualmente.")
+        
+        stats_tiendas = TIENDAS.estadisticas()
+        col_tie1, col_tie2, col_tie3 = st.columns(3)
+        
+        with col_tie1:
+            st.metric("Destinatarios", f"{stats_tiendas['destinatarios']:,}")
+        
+        with col_tie2:
+            st.metric("Corregidos a mano", f"{stats_tiendas['manuales']:,}")
+        
+        with col_tie3:
+            st.metric("Clasificados por reglas", f"{stats_tiendas['reglas']:,}")
+        
+        filtro_tiendas = st.text_input("Buscar destinatario", key="filtro_tiendas")
+        tabla_tiendas = TIENDAS.tabla(filtro_tiendas)
+        tabla_editada = st.data_editor(
+            tabla_tiendas, use_container_width=True, hide_index=True,
+            disabled=['DESTINATARIO', 'ORIGEN', 'ACTUALIZADO'],
+            column_config={'TIPO_TIENDA': st.column_config.SelectboxColumn(options=TIPOS_TIENDA, required=True)},
+            key="editor_tiendas"
+        )
+        
+        if st.button("💾 Guardar Cambios", type="primary", key="guardar_tiendas"):
+            cambios = tabla_editada[tabla_editada['TIPO_TIENDA'] != tabla_tiendas['TIPO_TIENDA']]
+            for destinatario, tipo in zip(cambios['DESTINATARIO'], cambios['TIPO_TIENDA']):
+                TIENDAS.sobrescribir(destinatario, tipo)
+            st.success(f"✅ {len(cambios)} destinatarios actualizados")
+        
+        with st.form("nueva_tienda", clear_on_submit=True):
+            st.markdown("**Asignar tipo a un destinatario**")
+            col_nt1, col_nt2 = st.columns([2, 1])
+            with col_nt1:
+                nuevo_destinatario = st.text_input("Destinatario")
+            with col_nt2:
+                nuevo_tipo = st.selectbox("Tipo de tienda", TIPOS_TIENDA)
+            if st.form_submit_button("➕ Asignar"):
+                try:
+                    nombre = TIENDAS.sobrescribir(nuevo_destinatario, nuevo_tipo)
+                    st.success(f"✅ {nombre}: {nuevo_tipo}")
+                except ValueError as e:
+                    st.error(f"❌ {e}")
+        
+        if st.button("♻️ Reclasificar con las reglas actuales", key="reclasificar_tiendas",
+                     help="Olvida los tipos asignados por reglas; los corregidos a mano se conservan"):
+            borrados = TIENDAS.reclasificar()
+            st.success(f"✅ {borrados:,} destinatarios se volverán a clasificar en la próxima reconciliación")
 
 # ==============================================================================
 # 12. NAVEGACIÓN PRINCIPAL
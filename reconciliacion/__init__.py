@@ -0,0 +1,28 @@
+"""Motor de reconciliación financiera V8 (manifiestos vs. facturas de transportistas)."""
+from .reglas import (PATRONES_FISICAS, identificar_tipo_tienda_v8,
+                     normalizar_texto_wilo, procesar_subtotal_wilo)
+from .normalizacion import (CACHE_NORMALIZACION, CacheNormalizacion,
+                            normalizar_serie, normalizar_textos)
+from .clasificador import CLASIFICADOR_V8, ClasificadorTiendas
+from .tiendas import RUTA_TIENDAS, TIPOS_TIENDA, DimensionTiendas
+from .montos import FORMATOS_MONTO, parsear_montos, parsear_montos_con_errores
+from .guias import (BIBLIOTECA_PATRONES, PATRON_GENERAL, PATRONES_DEMO, BibliotecaPatrones,
+                    canonizar_guias, patrones_guia)
+from .duplicados import TOLERANCIA_CERCANO, agrupar_facturas, marcar_duplicados
+from .memoria import compactar_tipos, reporte_memoria
+from .motor import (COLUMNAS_RESULTADO, clasificar_tiendas, combinar_resumenes,
+                    limpiar_guias, reconciliar, resumir_reconciliacion)
+from .facturas_pdf import CACHE_TABLAS_PDF, extraer_tabla_pdf, leer_tabla_pdf
+from .ingesta import (detectar_csv, detectar_formato, firma_lectura, leer_bloques,
+                      leer_encabezados, leer_muestra, leer_tabla)
+from .particiones import reconciliar_por_particiones
+from .cache_resultados import CACHE_RESULTADOS, CacheResultados, calcular_llave
+from .incremental import HISTORIAL_RECONCILIACION, HistorialReconciliacion, huellas_por_guia
+from .mapeo_columnas import (MEMORIA_MAPEOS, ROLES_FACTURAS, ROLES_MANIFIESTO, MemoriaMapeos,
+                             inferir_mapeo, puntuar_columnas, sugerir_mapeo)
+from .lotes import emparejar_archivos, listar_directorio, reconciliar_lote
+from .sin_guia import TOLERANCIA_MONTO, cruzar_sin_guia
+from .similitud import IndiceSimilitud, proponer_coincidencias
+from .tarifas import TARIFARIO, Tarifario, auditar_tarifas, resumir_sobrecobros, validar_tarifas
+from .exportacion import FILAS_POR_HOJA, excel_temporal, exportar_excel
+from .informes import GENERADOR_INFORMES, VERSION_INFORME, GeneradorInformes, generar_informe
@@ -0,0 +1,702 @@
+"""Benchmarks del motor de reconciliación.
+
+Uso: python -m reconciliacion.benchmark [motor|clasificador|montos|incremental|ingesta|mapeo|lotes|tarifas|duplicados|guias|similitud|sin_guia|memoria|excel|informes|pdf|tiendas]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import ingesta
+from .facturas_pdf import extraer_tabla_pdf
+from .exportacion import exportar_excel
+from .clasificador import ClasificadorTiendas
+from .duplicados import DUPLICADO_CERCANO, DUPLICADO_EXACTO, marcar_duplicados
+from .guias import BibliotecaPatrones, canonizar_guias
+from .incremental import HistorialReconciliacion
+from .tiendas import DimensionTiendas
+from .informes import GeneradorInformes
+from .lotes import emparejar_archivos, listar_directorio, reconciliar_lote
+from .memoria import reporte_memoria
+from .mapeo_columnas import ROLES_FACTURAS, ROLES_MANIFIESTO, inferir_mapeo
+from .montos import parsear_montos_con_errores
+from .motor import reconciliar, resumir_reconciliacion
+from .similitud import proponer_coincidencias
+from .sin_guia import CRUCE_MONTO, cruzar_sin_guia
+from .reglas import identificar_tipo_tienda_v8, procesar_subtotal_wilo
+from .tarifas import Tarifario, auditar_tarifas
+
+DESTINATARIOS_DEMO = [
+    'JOFRE SANTANA IMPORT',
+    'MALL DEL SOL AEROPOSTALE',
+    'SAN MARINO TIENDA',
+    'CARLOS PEREZ',
+    'MARIA GONZALEZ',
+    'CENTRO COMERCIAL QUITO',
+    'PLAZA DE LAS AMERICAS'
+]
+
+COLUMNAS_DEMO = {
+    'col_guia_m': 'GUIA',
+    'col_dest_m': 'DESTINATARIO',
+    'col_valor_m': 'VALOR_DECLARADO',
+    'col_piezas_m': 'PIEZAS',
+    'col_guia_f': 'GUIA_FACTURA',
+    'col_valor_f': 'VALOR_COBRADO'
+}
+
+
+def generar_datos_demo(num_rows: int, seed: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Genera un manifiesto y un archivo de facturas con la forma de los datos de demostración"""
+    rng = np.random.default_rng(seed)
+    num_fact = int(num_rows * 0.8)
+
+    df_m = pd.DataFrame({
+        'GUIA': [f'GUA-{i:04d}' for i in range(1001, 1001 + num_rows)],
+        'DESTINATARIO': rng.choice(DESTINATARIOS_DEMO, num_rows),
+        'PIEZAS': rng.integers(1, 20, num_rows),
+        'VALOR_DECLARADO': rng.uniform(50, 500, num_rows).round(2)
+    })
+
+    # Las facturas llegan como texto con formatos mixtos
+    valores = rng.uniform(45, 550, num_fact).round(2)
+    formatos = rng.integers(0, 3, num_fact)
+    texto = np.where(formatos == 0, [f'${v:,.2f}' for v in valores],
+                     np.where(formatos == 1, [f'{v:.2f}'.replace('.', ',') for v in valores],
+                              valores.astype(str)))
+    df_f = pd.DataFrame({
+        'GUIA_FACTURA': [f'gua-{i:04d} ' for i in range(1001, 1001 + num_fact)],
+        'VALOR_COBRADO': texto
+    })
+    return df_m, df_f
+
+
+def _reconciliar_fila_a_fila(df_m: pd.DataFrame, df_f: pd.DataFrame) -> pd.DataFrame:
+    """Ruta original de la pestaña de resultados (Series.apply por fila)"""
+    df_m = df_m.copy()
+    df_f = df_f.copy()
+    df_m['GUIA_CLEAN'] = df_m['GUIA'].astype(str).str.strip().str.upper()
+    df_f['GUIA_CLEAN'] = df_f['GUIA_FACTURA'].astype(str).str.strip().str.upper()
+    df_final = pd.merge(df_m, df_f, on='GUIA_CLEAN', how='left', suffixes=('_MAN', '_FAC'))
+    df_final['DESTINATARIO_NORM'] = df_final['DESTINATARIO'].fillna('DESCONOCIDO')
+    df_final['TIPO_TIENDA'] = df_final['DESTINATARIO_NORM'].apply(identificar_tipo_tienda_v8)
+    df_final['PIEZAS_CALC'] = pd.to_numeric(df_final['PIEZAS'], errors='coerce').fillna(1)
+    df_final['VALOR_REAL'] = df_final['VALOR_COBRADO'].apply(procesar_subtotal_wilo).fillna(0)
+    df_final['VALOR_MANIFIESTO'] = df_final['VALOR_DECLARADO'].apply(procesar_subtotal_wilo).fillna(0)
+    return df_final
+
+
+def _medir(func, *args) -> Tuple[float, object]:
+    inicio = time.perf_counter()
+    resultado = func(*args)
+    return time.perf_counter() - inicio, resultado
+
+
+def benchmark_motor(tamanos=(10_000, 100_000, 1_000_000), limite_fila_a_fila: int = 100_000) -> Dict[int, Dict[str, float]]:
+    """
+    Mide filas por segundo del motor vectorizado frente a la ruta fila a fila.
+    La equivalencia de resultados se comprueba en tests/test_motor.py.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'vectorizado (filas/s)':>22} | {'fila a fila (filas/s)':>22}")
+    for n in tamanos:
+        df_m, df_f = generar_datos_demo(n)
+        seg, _ = _medir(lambda: reconciliar(df_m, df_f, **COLUMNAS_DEMO))
+        fila = {'vectorizado': n / seg}
+
+        if n <= limite_fila_a_fila:
+            seg_ref, _ = _medir(_reconciliar_fila_a_fila, df_m, df_f)
+            fila['fila_a_fila'] = n / seg_ref
+
+        ref = f"{fila['fila_a_fila']:>22,.0f}" if 'fila_a_fila' in fila else f"{'-':>22}"
+        print(f"{n:>10,} | {fila['vectorizado']:>22,.0f} | {ref}")
+        resultados[n] = fila
+    return resultados
+
+
+def generar_destinatarios(num_rows: int, distintos: int = 3_000, seed: int = 7) -> pd.Series:
+    """Destinatarios repetidos como en un manifiesto real (pocos miles de nombres distintos)"""
+    rng = np.random.default_rng(seed)
+    nombres = [f'{base} {i}' if i % 3 else f'Señora Núñez {i}'
+               for i, base in zip(range(distintos), np.resize(DESTINATARIOS_DEMO, distintos))]
+    return pd.Series(rng.choice(nombres, num_rows), dtype=object)
+
+
+def benchmark_clasificador(tamanos=(100_000, 300_000, 1_000_000), distintos: int = 3_000,
+                           limite_fila_a_fila: int = 300_000) -> Dict[int, Dict[str, float]]:
+    """
+    Mide el clasificador compilado (memoria fría y caliente) frente a Series.apply.
+    La equivalencia de resultados se comprueba en tests/test_clasificador.py.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'fila a fila':>14} | {'compilado (frío)':>17} | {'compilado (caliente)':>20}")
+    for n in tamanos:
+        serie = generar_destinatarios(n, distintos)
+        clasificador = ClasificadorTiendas()
+        seg_frio, _ = _medir(clasificador.clasificar, serie)
+        seg_caliente, _ = _medir(clasificador.clasificar, serie)
+        fila = {'frio': n / seg_frio, 'caliente': n / seg_caliente}
+
+        if n <= limite_fila_a_fila:
+            seg_ref, _ = _medir(serie.apply, identificar_tipo_tienda_v8)
+            fila['fila_a_fila'] = n / seg_ref
+
+        ref = f"{fila['fila_a_fila']:>14,.0f}" if 'fila_a_fila' in fila else f"{'-':>14}"
+        print(f"{n:>10,} | {ref} | {fila['frio']:>17,.0f} | {fila['caliente']:>20,.0f}")
+        resultados[n] = fila
+    return resultados
+
+
+def generar_montos(num_rows: int, seed: int = 11) -> pd.Series:
+    """Montos en texto con los formatos que llegan en manifiestos y facturas"""
+    rng = np.random.default_rng(seed)
+    valores = rng.uniform(0, 25_000, num_rows).round(2)
+    plantillas = [
+        lambda v: f'{v:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.'),  # 1.234,56
+        lambda v: f'{v:,.2f}',                                                         # 1,234.56
+        lambda v: f'{v:.1f}'.replace('.', ','),                                        # 12,5
+        lambda v: f'$ {v:,.2f}',
+        lambda v: f'USD {v:.2f}',
+        lambda v: f'€{v:.2f}',
+        lambda v: f'-{v:.2f}',
+        lambda v: '',
+        lambda v: '   ',
+        lambda v: 'N/D',
+        lambda v: None,
+    ]
+    pesos = np.array([20, 20, 15, 10, 10, 5, 5, 5, 3, 2, 5], dtype=float)
+    formatos = rng.choice(len(plantillas), num_rows, p=pesos / pesos.sum())
+    return pd.Series([plantillas[f](v) for f, v in zip(formatos, valores)], dtype=object)
+
+
+def benchmark_montos(tamanos=(1_000_000,), limite_fila_a_fila: int = 1_000_000) -> Dict[int, Dict[str, float]]:
+    """
+    Mide parsear_montos sobre montos de formato mixto frente a procesar_subtotal_wilo.
+    La equivalencia de resultados se comprueba en tests/test_montos.py.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'vectorizado (filas/s)':>22} | {'fila a fila (filas/s)':>22} | {'fallidos':>9}")
+    for n in tamanos:
+        serie = generar_montos(n)
+        seg, (_, fallidos) = _medir(parsear_montos_con_errores, serie)
+        fila = {'vectorizado': n / seg, 'fallidos': int(fallidos.sum())}
+
+        if n <= limite_fila_a_fila:
+            seg_ref, _ = _medir(serie.apply, procesar_subtotal_wilo)
+            fila['fila_a_fila'] = n / seg_ref
+
+        ref = f"{fila['fila_a_fila']:>22,.0f}" if 'fila_a_fila' in fila else f"{'-':>22}"
+        print(f"{n:>10,} | {fila['vectorizado']:>22,.0f} | {ref} | {fila['fallidos']:>9,}")
+        resultados[n] = fila
+    return resultados
+
+
+def benchmark_incremental(historial: int = 1_000_000, deltas=(1_000, 10_000, 100_000),
+                          modificadas: float = 0.2) -> Dict[int, Dict[str, float]]:
+    """
+    Manifiesto acumulado: historial ya reconciliado + delta diario (nuevas y modificadas),
+    con las filas en el mismo orden y con el archivo reordenado.
+    Que el acumulado coincida con reconciliar todo se comprueba en tests/test_incremental.py.
+    """
+    resultados = {}
+    print(f"{'delta':>10} | {'completa (s)':>13} | {'incremental (s)':>16} | {'reordenado (s)':>15} | "
+          f"{'nuevas':>8} | {'modificadas':>11}")
+    for delta in deltas:
+        df_m, df_f = generar_datos_demo(historial + delta)
+        base_m = df_m.iloc[:historial]
+
+        # Una parte del delta corrige valores de guías ya reconciliadas
+        n_mod = int(delta * modificadas)
+        df_m = df_m.copy()
+        df_m.iloc[:n_mod, df_m.columns.get_loc('VALOR_DECLARADO')] += 1
+        reordenado = df_m.sample(frac=1, random_state=7)
+
+        seg_completa, _ = _medir(lambda: reconciliar(df_m, df_f, **COLUMNAS_DEMO))
+        segundos = {}
+        for nombre, carga in (('incremental', df_m), ('reordenado', reordenado)):
+            with tempfile.TemporaryDirectory() as directorio:
+                almacen = HistorialReconciliacion(os.path.join(directorio, 'historial.db'))
+                almacen.reconciliar(base_m, df_f, **COLUMNAS_DEMO)
+                segundos[nombre], (_, _, conteos) = _medir(
+                    lambda: almacen.reconciliar(carga, df_f, **COLUMNAS_DEMO))
+
+        print(f"{delta:>10,} | {seg_completa:>13.2f} | {segundos['incremental']:>16.2f} | "
+              f"{segundos['reordenado']:>15.2f} | {conteos['nuevas']:>8,} | {conteos['modificadas']:>11,}")
+        resultados[delta] = {'completa': seg_completa, **segundos}
+    return resultados
+
+
+def benchmark_ingesta(num_rows: int = 100_000, columnas_extra: int = 20) -> Dict[str, float]:
+    """
+    Lectura de un manifiesto ancho (xlsx y csv con ';') completo y proyectado a 4 columnas.
+    Que la proyección lea lo mismo que la lectura completa se comprueba en tests/test_ingesta.py.
+    """
+    df_m, _ = generar_datos_demo(num_rows)
+    rng = np.random.default_rng(3)
+    for i in range(columnas_extra):
+        df_m[f'EXTRA_{i}'] = rng.uniform(0, 1_000, num_rows).round(2)
+    proyeccion = [COLUMNAS_DEMO[c] for c in ('col_guia_m', 'col_dest_m', 'col_valor_m', 'col_piezas_m')]
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        rutas = {'csv': os.path.join(directorio, 'manifiesto.csv'), 'xlsx': os.path.join(directorio, 'manifiesto.xlsx')}
+        df_m.to_csv(rutas['csv'], sep=';', index=False)
+        df_m.to_excel(rutas['xlsx'], index=False)
+
+        motores = [True, False] if ingesta.CALAMINE_DISPONIBLE else [False]
+        print(f"{'archivo':>30} | {'completo (s)':>13} | {'proyectado (s)':>15}")
+        for formato, ruta in rutas.items():
+            for calamine in (motores if formato == 'xlsx' else [ingesta.CALAMINE_DISPONIBLE]):
+                disponible, ingesta.CALAMINE_DISPONIBLE = ingesta.CALAMINE_DISPONIBLE, calamine
+                try:
+                    seg_completo, _ = _medir(ingesta.leer_tabla, ruta, ['GUIA'])
+                    seg_proy, _ = _medir(ingesta.leer_tabla, ruta, ['GUIA'], proyeccion)
+                finally:
+                    ingesta.CALAMINE_DISPONIBLE = disponible
+                nombre = formato if formato == 'csv' else f"xlsx ({'calamine' if calamine else 'openpyxl'})"
+                print(f"{f'{nombre} {num_rows:,} filas':>30} | {seg_completo:>13.2f} | {seg_proy:>15.2f}")
+                resultados[nombre] = seg_proy
+    return resultados
+
+
+def benchmark_mapeo(num_rows: int = 1_000_000, repeticiones: int = 20) -> Dict[str, float]:
+    """
+    Inferencia de columnas sobre la muestra de un archivo grande (objetivo: < 100 ms).
+    El mapeo esperado se comprueba en tests/test_mapeo_columnas.py.
+    """
+    df_m, df_f = generar_datos_demo(num_rows)
+    # Columnas adicionales que suelen traer los archivos de los transportistas
+    rng = np.random.default_rng(5)
+    df_m.insert(0, 'FECHA', pd.Timestamp('2024-01-01').strftime('%Y-%m-%d'))
+    df_m['CIUDAD'] = rng.choice(['QUITO', 'GUAYAQUIL', 'CUENCA'], num_rows)
+    df_m['PESO'] = rng.uniform(0.5, 30, num_rows).round(1)
+
+    resultados = {}
+    print(f"{'archivo':>12} | {'filas':>10} | {'inferencia (ms)':>16}")
+    for nombre, df, roles in (('manifiesto', df_m, ROLES_MANIFIESTO), ('facturas', df_f, ROLES_FACTURAS)):
+        muestra = df.head(200).astype(str)
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            inferir_mapeo(muestra, roles)
+        ms = (time.perf_counter() - inicio) / repeticiones * 1000
+        print(f"{nombre:>12} | {len(df):>10,} | {ms:>16.1f}")
+        resultados[nombre] = ms
+    return resultados
+
+
+def benchmark_lotes(pares: int = 8, filas_por_par: int = 200_000,
+                    procesos=(1, 2, 4, 8)) -> Dict[int, float]:
+    """
+    Escalamiento del lote con el número de procesos.
+    Que los totales igualen a la suma de los pares se comprueba en tests/test_lotes.py.
+    Con un solo núcleo no hay aceleración que medir: cada proceso extra solo agrega
+    su arranque (spawn) y la lectura de los archivos compite por el mismo núcleo.
+    """
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        for i in range(pares):
+            df_m, df_f = generar_datos_demo(filas_por_par, seed=i)
+            df_m.to_csv(os.path.join(directorio, f'TRANSPORTISTA{i}_2024-{i % 12 + 1:02d}_MANIFIESTO.csv'), index=False)
+            df_f.to_csv(os.path.join(directorio, f'facturas transportista{i} 2024-{i % 12 + 1:02d}.csv'), index=False)
+        emparejados, _ = emparejar_archivos(listar_directorio(directorio))
+
+        print(f"núcleos disponibles: {os.cpu_count()}")
+        print(f"{'procesos':>9} | {'segundos':>9} | {'aceleración':>12}")
+        for n in procesos:
+            seg, _ = _medir(lambda: reconciliar_lote(emparejados, columnas=COLUMNAS_DEMO, procesos=n))
+            resultados[n] = seg
+            print(f"{n:>9} | {seg:>9.2f} | {resultados[procesos[0]] / seg:>11.2f}x")
+    return resultados
+
+
+def benchmark_tarifas(tamanos=(100_000, 1_000_000)) -> Dict[int, float]:
+    """
+    Costo esperado y alertas de sobrecobro por guía (objetivo: 1M guías en pocos segundos).
+    El costo frente a la búsqueda banda por banda se comprueba en tests/test_tarifas.py.
+    """
+    resultados = {}
+    with tempfile.TemporaryDirectory() as directorio:
+        tarifario = Tarifario(os.path.join(directorio, 'tarifas.csv'))
+        print(f"{'filas':>10} | {'segundos':>9} | {'filas/s':>12} | {'sobrecobros':>12}")
+        for n in tamanos:
+            df_m, df_f = generar_datos_demo(n)
+            df_m['CIUDAD'] = np.random.default_rng(9).choice(['Quito', 'Galápagos', 'GUAYAQUIL', None], n)
+            df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+            seg, auditado = _medir(auditar_tarifas, df_final, 'GENERAL', 'CIUDAD', 0.02, 0.10, tarifario)
+            print(f"{n:>10,} | {seg:>9.2f} | {n / seg:>12,.0f} | {int(auditado['ALERTA_SOBRECOBRO'].sum()):>12,}")
+            resultados[n] = seg
+    return resultados
+
+
+def benchmark_duplicados(tamanos=(100_000, 1_000_000), tasa: float = 0.01) -> Dict[int, float]:
+    """
+    Detección de cobros duplicados (debe crecer linealmente).
+    Los conteos y el cruce sin filas infladas se comprueban en tests/test_duplicados.py.
+    """
+    resultados = {}
+    print(f"{'líneas':>10} | {'detección (s)':>14} | {'líneas/s':>12} | {'exactos':>8} | {'cercanos':>8}")
+    for n in tamanos:
+        _, df_f = generar_datos_demo(n)
+        rng = np.random.default_rng(11)
+        k = int(len(df_f) * tasa)
+        # k copias exactas y k cobros cercanos (+0.5%) de guías distintas
+        filas = rng.choice(len(df_f), 2 * k, replace=False)
+        exactas = df_f.iloc[filas[:k]]
+        montos = parsear_montos_con_errores(df_f['VALOR_COBRADO'].iloc[filas[k:]])[0]
+        cercanas = df_f.iloc[filas[k:]].assign(VALOR_COBRADO=(montos * 1.005).round(2).astype(str).to_numpy())
+        facturas = pd.concat([df_f, exactas, cercanas], ignore_index=True)
+
+        guias = facturas['GUIA_FACTURA'].str.strip().str.upper()
+        montos_f = parsear_montos_con_errores(facturas['VALOR_COBRADO'])[0]
+        seg, tipo = _medir(marcar_duplicados, guias, montos_f)
+        exactos, cercanos = int((tipo == DUPLICADO_EXACTO).sum()), int((tipo == DUPLICADO_CERCANO).sum())
+        print(f"{len(facturas):>10,} | {seg:>14.3f} | {len(facturas) / seg:>12,.0f} | {exactos:>8,} | {cercanos:>8,}")
+        resultados[n] = seg
+    return resultados
+
+
+# Transportista de la biblioteca de demostración: serie GUA, que sus facturas a veces omiten
+TRANSPORTISTA_PRUEBA = 'GENERAL'
+
+
+def generar_guias_variantes(num_rows: int, seed: int = 5) -> pd.Series:
+    """Las guías GUA-1001.. escritas como las devuelven distintos transportistas"""
+    rng = np.random.default_rng(seed)
+    numeros = np.arange(1001, 1001 + num_rows)
+    formatos = rng.integers(0, 5, num_rows)
+    variantes = [
+        np.char.add('GUA-', numeros.astype(str)),
+        np.char.add('gua ', numeros.astype(str)),
+        np.char.add('000', numeros.astype(str)),
+        np.char.add(numeros.astype(str), '.0'),
+        np.char.add(' GUA_', np.char.add(numeros.astype(str), ' ')),
+    ]
+    return pd.Series(np.choose(formatos, variantes), dtype='str')
+
+
+def benchmark_guias(tamanos=(100_000, 1_000_000)) -> Dict[int, Dict[str, float]]:
+    """
+    Guías que cruzan con la llave canónica frente a strip+upper, y costo del join por tipo de llave.
+    Con la serie por defecto GUA del transportista, 0001001 y 1001.0 cruzan con GUA-1001
+    (se comprueba en tests/test_guias.py).
+    """
+    # Biblioteca en memoria: el benchmark no depende de patrones_guia.json ni lo modifica
+    biblioteca = BibliotecaPatrones(ruta=None)
+    resultados = {}
+    print(f"{'filas':>10} | {'canonizar (filas/s)':>20} | {'cruzan texto':>12} | {'cruzan canónica':>15} | "
+          f"{'join texto (s)':>14} | {'join entero (s)':>15}")
+    for n in tamanos:
+        manifiesto = pd.Series([f'GUA-{i:04d}' for i in range(1001, 1001 + n)], dtype='str')
+        facturas = generar_guias_variantes(n)
+
+        seg, llaves_f = _medir(canonizar_guias, facturas, TRANSPORTISTA_PRUEBA, biblioteca)
+        llaves_m = canonizar_guias(manifiesto, TRANSPORTISTA_PRUEBA, biblioteca)
+        texto_m, texto_f = manifiesto.str.strip().str.upper(), facturas.str.strip().str.upper()
+        cruzan_texto = int(texto_f.isin(texto_m).sum())
+        cruzan = int(llaves_f.isin(llaves_m).sum())
+
+        seg_texto, _ = _medir(pd.merge, texto_m.to_frame('G'), texto_f.to_frame('G'), 'left', 'G')
+        seg_entero, _ = _medir(pd.merge, llaves_m.to_frame('G'), llaves_f.to_frame('G'), 'left', 'G')
+        print(f"{n:>10,} | {n / seg:>20,.0f} | {cruzan_texto:>12,} | {cruzan:>15,} | "
+              f"{seg_texto:>14.3f} | {seg_entero:>15.3f}")
+        resultados[n] = {'canonizar': n / seg, 'join_texto': seg_texto, 'join_entero': seg_entero}
+    return resultados
+
+
+def introducir_errores(numeros: np.ndarray, seed: int = 13) -> np.ndarray:
+    """Cada número con un error de tipeo: sustitución, transposición, inserción o borrado de un dígito"""
+    rng = np.random.default_rng(seed)
+    resultado = []
+    for texto, tipo, digito in zip(numeros.astype(str), rng.integers(0, 4, len(numeros)),
+                                   rng.integers(0, 10, len(numeros)).astype(str)):
+        pos = int(rng.integers(1, len(texto) - 1))
+        if tipo == 0:
+            digito = digito if digito != texto[pos] else str((int(digito) + 1) % 10)
+            texto = texto[:pos] + digito + texto[pos + 1:]
+        elif tipo == 1 and texto[pos] != texto[pos + 1]:
+            texto = texto[:pos] + texto[pos + 1] + texto[pos] + texto[pos + 2:]
+        elif tipo == 2:
+            texto = texto[:pos] + digito + texto[pos:]
+        else:
+            texto = texto[:pos] + texto[pos + 1:]
+        resultado.append(texto)
+    return np.array(resultado)
+
+
+def benchmark_similitud(tamanos=(10_000, 50_000)) -> Dict[str, float]:
+    """Segunda pasada aproximada sobre n x n guías sin cruzar (números dispersos y consecutivos)"""
+    resultados = {}
+    print(f"{'numeración':>12} | {'sin cruzar':>12} | {'segundos':>9} | {'propuestas':>10} | {'correctas':>10}")
+    for n in tamanos:
+        rng = np.random.default_rng(3)
+        for numeracion, numeros in (('dispersa', rng.choice(10 ** 10, n, replace=False) + 10 ** 9),
+                                    ('consecutiva', np.arange(100_001, 100_001 + n))):
+            df_m = pd.DataFrame({'GUIA': [f'GUA-{i}' for i in numeros], 'DESTINATARIO': 'CARLOS PEREZ',
+                                 'PIEZAS': 1, 'VALOR_DECLARADO': 10.0})
+            df_f = pd.DataFrame({'GUIA_FACTURA': np.char.add('GUA-', introducir_errores(numeros)),
+                                 'VALOR_COBRADO': '10.00'}).sample(frac=1, random_state=1)
+            df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+            sin_cruzar = int((df_final['LINEAS_FACTURA'] == 0).sum())
+            seg, propuestas = _medir(proponer_coincidencias, df_final, df_f, 'GUIA', 'GUIA_FACTURA')
+            esperada = dict(zip(df_m['GUIA'], np.char.add('GUA-', introducir_errores(numeros))))
+            correctas = int((propuestas['GUIA_MANIFIESTO'].map(esperada) == propuestas['GUIA_FACTURA']).sum())
+            print(f"{numeracion:>12} | {sin_cruzar:>12,} | {seg:>9.2f} | {len(propuestas):>10,} | {correctas:>10,}")
+            resultados[f'{numeracion}_{n}'] = seg
+    return resultados
+
+
+def benchmark_sin_guia(tamanos=(100_000, 1_000_000), fraccion: float = 0.2) -> Dict[int, float]:
+    """Cruce por monto de facturas sin guía (bloques destinatario + día, merge_asof) y tasa de aciertos"""
+    resultados = {}
+    print(f"{'guías':>10} | {'sin guía':>9} | {'segundos':>9} | {'cruzadas':>9} | {'correctas':>9}")
+    for n in tamanos:
+        rng = np.random.default_rng(17)
+        destinos = generar_destinatarios(n)
+        fechas = pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D')
+        df_m = pd.DataFrame({'GUIA': [f'GUA-{i}' for i in range(1001, 1001 + n)], 'DESTINATARIO': destinos,
+                             'PIEZAS': 1, 'VALOR_DECLARADO': rng.uniform(5, 500, n).round(2),
+                             'FECHA': fechas.strftime('%d/%m/%Y')})
+        # Una fracción de las guías se factura sin número, con el monto redondeado por el transportista
+        sin_guia = rng.random(n) < fraccion
+        df_f = pd.DataFrame({
+            'GUIA_FACTURA': np.where(sin_guia, '', df_m['GUIA'].to_numpy()),
+            'VALOR_COBRADO': (df_m['VALOR_DECLARADO'] + rng.uniform(-0.2, 0.2, n)).round(2).astype(str),
+            'DESTINO': destinos.to_numpy(), 'FECHA_FACTURA': fechas.strftime('%Y-%m-%d'),
+        }).sample(frac=1, random_state=2)
+
+        df_final = reconciliar(df_m, df_f, 'GUIA', 'DESTINATARIO', 'VALOR_DECLARADO', 'PIEZAS',
+                               'GUIA_FACTURA', 'VALOR_COBRADO')
+        seg, (df_final, resumen) = _medir(cruzar_sin_guia, df_final, df_f, 'GUIA_FACTURA', 'DESTINO',
+                                          'VALOR_COBRADO', 'DESTINATARIO', 'FECHA', 'FECHA_FACTURA')
+        cruzadas = df_final['CRUCE'] == CRUCE_MONTO
+        # Acierto: el monto asignado es el de la factura de esa misma guía
+        esperado = pd.to_numeric(df_f.set_index(df_m['GUIA'].reindex(df_f.index))['VALOR_COBRADO'])
+        correctas = int((df_final.loc[cruzadas, 'VALOR_REAL'].to_numpy()
+                         == esperado.reindex(df_final.loc[cruzadas, 'GUIA']).to_numpy()).sum())
+        print(f"{n:>10,} | {resumen['lineas_sin_guia']:>9,} | {seg:>9.2f} | {resumen['cruzadas']:>9,} | {correctas:>9,}")
+        resultados[n] = seg
+    return resultados
+
+
+def benchmark_memoria(tamanos=(100_000, 1_000_000)) -> Dict[int, Dict[str, float]]:
+    """
+    Bytes por fila de df_final con tipos compactos frente a los tipos que deja pandas (mismo resumen).
+    Con los datos demo queda en 2.6-2.7x, no en 3x: de los ~58 B/fila compactos, 18 son el
+    texto original de la guía y 32 la llave y los tres montos (float64), que se conservan.
+    Que el resumen y el reporte coincidan se comprueba en tests/test_memoria.py.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'sin compactar (B/fila)':>22} | {'compacto':>9} | {'reducción':>9} | {'reporte':>8}")
+    for n in tamanos:
+        df_m, df_f = generar_datos_demo(n)
+        completo = reconciliar(df_m, df_f, **COLUMNAS_DEMO, compactar=False)
+        compacto = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+
+        bytes_completo = completo.memory_usage(deep=True).sum() / n
+        bytes_compacto = compacto.memory_usage(deep=True).sum() / n
+        reduccion = bytes_completo / bytes_compacto
+        reporte = reporte_memoria(compacto)['reduccion']
+        print(f"{n:>10,} | {bytes_completo:>22,.1f} | {bytes_compacto:>9,.1f} | {reduccion:>8.1f}x | {reporte:>7.1f}x")
+        resultados[n] = {'sin_compactar': bytes_completo, 'compacto': bytes_compacto, 'reduccion': reduccion,
+                         'reporte': reporte}
+    return resultados
+
+
+def _rss_mb() -> float:
+    """Memoria residente actual del proceso (Linux, /proc/self/statm)"""
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+def _pico_rss(funcion, intervalo: float = 0.02) -> Tuple[float, float]:
+    """Segundos de funcion() y crecimiento máximo de la memoria residente (MB) mientras corre"""
+    base = pico = _rss_mb()
+    activo = True
+
+    def muestrear():
+        nonlocal pico
+        while activo:
+            pico = max(pico, _rss_mb())
+            time.sleep(intervalo)
+
+    hilo = threading.Thread(target=muestrear, daemon=True)
+    hilo.start()
+    inicio = time.perf_counter()
+    try:
+        funcion()
+    finally:
+        segundos = time.perf_counter() - inicio
+        activo = False
+        hilo.join()
+    return segundos, max(pico, _rss_mb()) - base
+
+
+def benchmark_excel(tamanos=(100_000, 1_000_000)) -> Dict[int, Dict[str, float]]:
+    """
+    Exportación a Excel en memoria constante: tiempo y crecimiento de la memoria residente.
+    Que el libro tenga todas las filas se comprueba en tests/test_exportacion.py.
+    Medido: 100k filas 17 s, 1M filas 160 s (~6.000 filas/s) con +20 MB de RSS.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'segundos':>8} | {'filas/s':>9} | {'+RSS (MB)':>9} | {'archivo (MB)':>12}")
+    for n in tamanos:
+        df_m, df_f = generar_datos_demo(n)
+        df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+        resumen = resumir_reconciliacion(df_final)
+        del df_m, df_f
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, 'resultado.xlsx')
+            segundos, crecimiento = _pico_rss(lambda: exportar_excel(df_final, resumen, ruta))
+            tamano = os.path.getsize(ruta) / 2 ** 20
+        print(f"{n:>10,} | {segundos:>8.2f} | {n / segundos:>9,.0f} | {crecimiento:>9.1f} | {tamano:>12.1f}")
+        resultados[n] = {'segundos': segundos, 'rss_mb': crecimiento, 'archivo_mb': tamano}
+    return resultados
+
+
+def benchmark_informes(tamanos=(10_000, 200_000)) -> Dict[int, Dict[str, float]]:
+    """
+    Informe PDF en segundo plano: cuánto bloquea la solicitud, cuánto tarda y la descarga repetida.
+    Que la segunda solicitud sirva el PDF ya generado se comprueba en tests/test_informes.py.
+    """
+    resultados = {}
+    print(f"{'filas':>10} | {'solicitud (ms)':>14} | {'generación (s)':>14} | {'repetida (ms)':>13} | {'PDF (MB)':>8}")
+    for n in tamanos:
+        df_m, df_f = generar_datos_demo(n)
+        df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+        resumen = resumir_reconciliacion(df_final)
+        with tempfile.TemporaryDirectory() as carpeta:
+            generador = GeneradorInformes(carpeta)
+            inicio = time.perf_counter()
+            generador.solicitar('informe', df_final, resumen, col_guia=COLUMNAS_DEMO['col_guia_m'])
+            solicitud = time.perf_counter() - inicio
+            while generador.estado('informe')['estado'] == 'generando':
+                time.sleep(0.05)
+            generacion = time.perf_counter() - inicio
+            estado = generador.estado('informe')
+
+            # Segunda solicitud del mismo resultado: se sirve el PDF en disco
+            inicio = time.perf_counter()
+            generador.solicitar('informe', df_final, resumen)
+            repetida = time.perf_counter() - inicio
+            tamano = os.path.getsize(estado['ruta']) / 2 ** 20
+        print(f"{n:>10,} | {solicitud * 1000:>14.2f} | {generacion:>14.2f} | {repetida * 1000:>13.2f} | {tamano:>8.1f}")
+        resultados[n] = {'solicitud': solicitud, 'generacion': generacion, 'repetida': repetida, 'pdf_mb': tamano}
+    return resultados
+
+
+def generar_factura_pdf(ruta: str, paginas: int, filas_por_pagina: int = 40, semilla: int = 0) -> pd.DataFrame:
+    """
+    Factura de transportista en PDF: bloque de cabecera, tabla con bordes y encabezado
+    repetido en cada página, y total al final. Devuelve las líneas escritas.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    rng = np.random.default_rng(semilla)
+    n = paginas * filas_por_pagina
+    lineas = pd.DataFrame({
+        'GUIA': [f"GUA-{i:07d}" for i in rng.permutation(n) + 1],
+        'FECHA': pd.Timestamp('2024-03-01') + pd.to_timedelta(rng.integers(0, 31, n), unit='D'),
+        'DESTINO': rng.choice(['QUITO', 'GUAYAQUIL', 'CUENCA', 'MANTA', 'LOJA'], n),
+        'PIEZAS': rng.integers(1, 20, n).astype(str),
+        'VALOR': [f"{v:,.2f}" for v in rng.uniform(2, 500, n)],
+    })
+    lineas['FECHA'] = lineas['FECHA'].dt.strftime('%d/%m/%Y')
+    estilo = getSampleStyleSheet()
+    cabecera = Table([['SERVIENTREGA S.A.', 'FACTURA 001-002-000123'], ['RUC 0990000000001', 'Marzo 2024'],
+                      ['Cliente: WILO', 'Guías: ' + f"{n:,}"]])
+    detalle = Table([list(lineas.columns)] + lineas.values.tolist(), repeatRows=1)
+    detalle.setStyle(TableStyle([('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+                                 ('FONTSIZE', (0, 0), (-1, -1), 7), ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+                                 ('TOPPADDING', (0, 0), (-1, -1), 1)]))
+    SimpleDocTemplate(ruta, pagesize=A4).build(
+        [cabecera, Spacer(1, 12), detalle, Spacer(1, 12), Paragraph(f"TOTAL: {n:,} guías", estilo['Normal'])]
+    )
+    return lineas
+
+
+def benchmark_pdf(paginas: int = 500, procesos=(1, 2)) -> Dict[int, float]:
+    """
+    Extracción de la tabla de una factura PDF por número de procesos.
+    Que se lean las mismas líneas que se escribieron se comprueba en tests/test_facturas_pdf.py.
+    Medido en una máquina de 1 núcleo (171 páginas, 8.000 líneas): 1 proceso 36,3 s,
+    2 procesos 42,3 s. Sin núcleos libres el pool solo suma el arranque de los procesos;
+    la ganancia depende de tener más de un núcleo y aquí no se pudo medir.
+    """
+    import pdfplumber
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'factura.pdf')
+        esperado = generar_factura_pdf(ruta, paginas)
+        with pdfplumber.open(ruta) as pdf:
+            paginas = len(pdf.pages)
+        print(f"núcleos disponibles: {os.cpu_count()} • {paginas} páginas • {len(esperado):,} líneas")
+        print(f"{'procesos':>8} | {'segundos':>8} | {'páginas/s':>9} | {'líneas':>8}")
+        for n in procesos:
+            inicio = time.perf_counter()
+            tabla = extraer_tabla_pdf(ruta, n)
+            segundos = time.perf_counter() - inicio
+            print(f"{n:>8} | {segundos:>8.2f} | {paginas / segundos:>9.1f} | {len(tabla):>8,}")
+            resultados[n] = segundos
+    return resultados
+
+
+def benchmark_tiendas(num_rows: int = 1_000_000, distintos: int = 3_000) -> Dict[str, float]:
+    """
+    Clasificación desde la dimensión de tiendas (fría: tabla vacía; caliente: todos los
+    nombres guardados) frente a las reglas. Que den los mismos tipos, y estables si las
+    reglas cambian, se comprueba en tests/test_tiendas.py.
+    """
+    serie = generar_destinatarios(num_rows, distintos)
+    seg_reglas, _ = _medir(ClasificadorTiendas().clasificar, serie)
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, 'tiendas.db')
+        seg_frio, _ = _medir(DimensionTiendas(ruta, ClasificadorTiendas()).clasificar, serie)
+        # Clasificador nuevo (sin memoria): todos los tipos salen del join
+        seg_caliente, _ = _medir(DimensionTiendas(ruta, ClasificadorTiendas()).clasificar, serie)
+
+    print(f"{num_rows:,} filas, {distintos:,} destinatarios distintos")
+    print(f"{'reglas':>10} | {'dimensión (fría)':>17} | {'dimensión (caliente)':>20}")
+    print(f"{seg_reglas:>9.3f}s | {seg_frio:>16.3f}s | {seg_caliente:>19.3f}s")
+    return {'reglas': seg_reglas, 'frio': seg_frio, 'caliente': seg_caliente}
+
+
+BENCHMARKS = {
+    'motor': benchmark_motor,
+    'clasificador': benchmark_clasificador,
+    'montos': benchmark_montos,
+    'incremental': benchmark_incremental,
+    'ingesta': benchmark_ingesta,
+    'mapeo': benchmark_mapeo,
+    'lotes': benchmark_lotes,
+    'tarifas': benchmark_tarifas,
+    'duplicados': benchmark_duplicados,
+    'guias': benchmark_guias,
+    'similitud': benchmark_similitud,
+    'sin_guia': benchmark_sin_guia,
+    'memoria': benchmark_memoria,
+    'excel': benchmark_excel,
+    'informes': benchmark_informes,
+    'pdf': benchmark_pdf,
+    'tiendas': benchmark_tiendas,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks de reconciliación (filas por segundo)")
+    parser.add_argument('nombres', nargs='*', help=f"Benchmarks a ejecutar: {', '.join(BENCHMARKS)} (todos por defecto)")
+    nombres = parser.parse_args().nombres or list(BENCHMARKS)
+    desconocidos = set(nombres) - set(BENCHMARKS)
+    if desconocidos:
+        parser.error(f"Benchmark desconocido: {', '.join(sorted(desconocidos))}")
+    for nombre in nombres:
+        print(f"\n== {nombre} ==")
+        BENCHMARKS[nombre]()
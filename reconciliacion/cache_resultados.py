@@ -0,0 +1,126 @@
+"""Caché en disco de resultados de reconciliación, indexada por el contenido de los archivos."""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_CACHE = "cache_reconciliacion"
+MAX_MB_CACHE = 512
+
+# Cambiar al modificar las reglas del motor para invalidar resultados anteriores
+VERSION_MOTOR = "v8.5"
+
+_TAMANO_LECTURA = 1024 * 1024
+
+
+def _actualizar_hash(h, origen) -> None:
+    """Agrega al hash el contenido de una ruta, un archivo subido o un DataFrame"""
+    if isinstance(origen, pd.DataFrame):
+        h.update(json.dumps([str(c) for c in origen.columns]).encode())
+        h.update(pd.util.hash_pandas_object(origen, index=True).to_numpy().tobytes())
+        return
+
+    if hasattr(origen, 'read'):
+        origen.seek(0)
+        for bloque in iter(lambda: origen.read(_TAMANO_LECTURA), b''):
+            h.update(bloque)
+        origen.seek(0)
+        return
+
+    with open(origen, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(_TAMANO_LECTURA), b''):
+            h.update(bloque)
+
+
+def calcular_llave(origenes: Iterable[Any], configuracion: Dict[str, Any]) -> str:
+    """SHA-256 del contenido de los archivos más la configuración de columnas"""
+    h = hashlib.sha256(VERSION_MOTOR.encode())
+    for origen in origenes:
+        _actualizar_hash(h, origen)
+        h.update(b'\0')
+    h.update(json.dumps(configuracion, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class CacheResultados:
+    """Resultados (df_final + resumen) en archivos pickle, con desalojo por tamaño (LRU)"""
+
+    def __init__(self, directorio: str = DIRECTORIO_CACHE, max_mb: int = MAX_MB_CACHE):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_mb * 1024 ** 2
+
+    def _ruta(self, llave: str) -> Path:
+        return self.directorio / f"{llave}.pkl"
+
+    def obtener(self, llave: str) -> Optional[Tuple[Optional[pd.DataFrame], Dict[str, Any]]]:
+        """Devuelve (df_final, resumen) si la llave está en caché"""
+        ruta = self._ruta(llave)
+        try:
+            with open(ruta, 'rb') as archivo:
+                resultado = pickle.load(archivo)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de caché ilegible {ruta.name}, se descarta: {e}")
+            ruta.unlink(missing_ok=True)
+            return None
+
+        # La fecha de modificación marca el último uso para el desalojo LRU
+        os.utime(ruta)
+        return resultado['df_final'], resultado['resumen']
+
+    def guardar(self, llave: str, df_final: Optional[pd.DataFrame], resumen: Dict[str, Any]) -> None:
+        """Guarda un resultado y desaloja los más antiguos si se supera el tamaño máximo"""
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as archivo:
+                pickle.dump({'df_final': df_final, 'resumen': resumen}, archivo,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, self._ruta(llave))
+        except Exception:
+            Path(temporal).unlink(missing_ok=True)
+            raise
+        self._desalojar()
+
+    def _entradas(self):
+        return sorted(self.directorio.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+
+    def _desalojar(self) -> None:
+        entradas = self._entradas()
+        total = sum(p.stat().st_size for p in entradas)
+        for entrada in entradas:
+            if total <= self.max_bytes:
+                break
+            total -= entrada.stat().st_size
+            entrada.unlink(missing_ok=True)
+            logger.info(f"Caché de reconciliación: desalojada {entrada.name}")
+
+    def estadisticas(self) -> Dict[str, Any]:
+        entradas = self._entradas() if self.directorio.exists() else []
+        return {
+            'entradas': len(entradas),
+            'tamano_mb': sum(p.stat().st_size for p in entradas) / 1024 ** 2,
+            'max_mb': self.max_bytes / 1024 ** 2
+        }
+
+    def limpiar(self) -> int:
+        """Elimina todas las entradas y devuelve cuántas había"""
+        if not self.directorio.exists():
+            return 0
+        entradas = list(self.directorio.glob("*.pkl"))
+        for entrada in entradas:
+            entrada.unlink(missing_ok=True)
+        return len(entradas)
+
+
+# Instancia compartida por todo el proceso
+CACHE_RESULTADOS = CacheResultados()
@@ -0,0 +1,96 @@
+"""Clasificador de tiendas V8 compilado una sola vez y memoizado por destinatario."""
+import re
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from .normalizacion import CACHE_NORMALIZACION, como_texto
+from .reglas import (PATRONES_FISICAS, TIPO_DESCONOCIDO, TIPO_FISICA,
+                     TIPO_MAYORISTA, TIPO_WEB)
+
+
+class ClasificadorTiendas:
+    """
+    Reglas de identificar_tipo_tienda_v8 en un solo objeto:
+    1. JOFRE + SANTANA -> venta al por mayor
+    2. Alternación compilada de patrones de tienda física
+    3. Nombres de 1 a 3 palabras -> venta web
+    Los resultados se memorizan por nombre normalizado.
+    """
+
+    def __init__(self, patrones_fisicas: Iterable[str] = PATRONES_FISICAS,
+                 max_palabras_web: int = 3, max_memo: int = 200_000):
+        # Los patrones más largos primero para que la alternación no corte antes
+        patrones = sorted(set(patrones_fisicas), key=len, reverse=True)
+        self._re_fisica = re.compile('|'.join(re.escape(p) for p in patrones))
+        self._max_palabras_web = max_palabras_web
+        self._max_memo = max_memo
+        self._memo: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def _clasificar_normalizados(self, nombres: pd.Series) -> np.ndarray:
+        """Aplica las reglas en bloque sobre nombres ya normalizados"""
+        mayorista = (nombres.str.contains('JOFRE', regex=False) &
+                     nombres.str.contains('SANTANA', regex=False)).to_numpy(dtype=bool)
+        fisica = nombres.str.contains(self._re_fisica).to_numpy(dtype=bool)
+        # El texto normalizado tiene un solo espacio entre palabras
+        web = ((nombres != '') &
+               (nombres.str.count(' ') < self._max_palabras_web)).to_numpy(dtype=bool)
+
+        return np.select([mayorista, fisica, web], [TIPO_MAYORISTA, TIPO_FISICA, TIPO_WEB],
+                         default=TIPO_FISICA).astype(object)
+
+    def clasificar_normalizados(self, nombres: pd.Series) -> np.ndarray:
+        """Clasifica nombres normalizados distintos usando la memoria de resultados"""
+        memo = self._memo
+        tipos = np.array([memo.get(n) for n in nombres], dtype=object)
+        nuevos = pd.isna(tipos)
+        if nuevos.any():
+            por_calcular = nombres[nuevos]
+            tipos[nuevos] = self._clasificar_normalizados(por_calcular)
+            with self._lock:
+                if len(memo) + len(por_calcular) > self._max_memo:
+                    memo.clear()
+                memo.update(zip(por_calcular, tipos[nuevos]))
+        return tipos
+
+    def clasificar(self, serie: pd.Series,
+                   resolver: Optional[Callable[[pd.Series], np.ndarray]] = None) -> pd.Series:
+        """
+        Clasifica una columna completa de destinatarios en una sola llamada (resultado categórico).
+        resolver recibe los nombres normalizados distintos; por defecto, las reglas con memoria.
+        """
+        # Se deduplica antes de normalizar: los destinatarios se repiten mucho
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            codigos = serie.cat.codes.to_numpy()
+            unicos = pd.Series(como_texto(pd.Series(serie.cat.categories)), dtype=object)
+        else:
+            codigos, unicos = pd.factorize(como_texto(serie), use_na_sentinel=True)
+            unicos = pd.Series(unicos, dtype=object)
+
+        tipos_unicos = np.full(len(unicos) + 1, TIPO_DESCONOCIDO, dtype=object)
+        validos = (unicos != '').to_numpy(dtype=bool)
+        if validos.any():
+            normalizados = CACHE_NORMALIZACION.normalizar_unicos(list(unicos[validos]))
+            # Varios valores crudos pueden compartir el mismo nombre normalizado
+            distintos, inverso = np.unique(np.array(normalizados, dtype=str), return_inverse=True)
+            tipos_distintos = (resolver or self.clasificar_normalizados)(pd.Series(distintos, dtype=object))
+            tipos_unicos[:-1][validos] = tipos_distintos[inverso]
+
+        # El código -1 (NaN) apunta a la última posición: DESCONOCIDO
+        codigos_tipo, tipos = pd.factorize(tipos_unicos)
+        return pd.Series(pd.Categorical.from_codes(codigos_tipo[codigos], tipos), index=serie.index)
+
+    def limpiar_memoria(self) -> None:
+        with self._lock:
+            self._memo.clear()
+
+    @property
+    def tamano_memoria(self) -> int:
+        return len(self._memo)
+
+
+# Instancia compartida por todo el proceso
+CLASIFICADOR_V8 = ClasificadorTiendas()
@@ -0,0 +1,92 @@
+"""Detección de facturación duplicada y agrupación de las líneas de factura por guía."""
+import numpy as np
+import pandas as pd
+
+# Dos cobros de la misma guía con montos a menos de este porcentaje se consideran duplicados
+TOLERANCIA_CERCANO = 0.02
+
+DUPLICADO_EXACTO = 'EXACTO'
+DUPLICADO_CERCANO = 'CERCANO'
+
+COLUMNAS_DUPLICADOS = ['LINEAS_FACTURA', 'DUPLICADOS_EXACTOS', 'DUPLICADOS_CERCANOS', 'MONTO_EN_RIESGO']
+
+
+def _tipos_duplicado(codigos: np.ndarray, repetidas: np.ndarray, montos: np.ndarray,
+                     tolerancia: float) -> np.ndarray:
+    """Tipo de duplicado por línea; solo se ordenan las líneas de guías repetidas"""
+    tipo = np.full(len(codigos), '', dtype=object)
+    if not repetidas.any():
+        return tipo
+
+    # Exactos: hash del par (guía, monto en centavos)
+    indices = np.flatnonzero(repetidas)
+    centavos = np.round(montos[indices] * 100).astype('int64')
+    exacto = pd.DataFrame({'guia': codigos[indices], 'centavos': centavos}).duplicated().to_numpy()
+
+    # Cercanos: montos consecutivos (ordenados dentro de cada guía) que no son exactos
+    posiciones = indices[~exacto]
+    valores = montos[posiciones]
+    orden = np.lexsort((valores, codigos[posiciones]))
+    posiciones, valores = posiciones[orden], valores[orden]
+    misma_guia = codigos[posiciones][1:] == codigos[posiciones][:-1]
+    escala = np.maximum(np.abs(valores[1:]), np.abs(valores[:-1]))
+    cercano = misma_guia & (np.abs(valores[1:] - valores[:-1]) <= tolerancia * escala)
+
+    tipo[indices[exacto]] = DUPLICADO_EXACTO
+    tipo[posiciones[1:][cercano]] = DUPLICADO_CERCANO
+    return tipo
+
+
+def _codificar(guias_clean: pd.Series):
+    """Código entero de cada guía (tabla hash lineal) y si la guía aparece más de una vez"""
+    codigos, guias = pd.factorize(guias_clean, use_na_sentinel=False)
+    repetidas = np.bincount(codigos, minlength=len(guias))[codigos] > 1
+    return codigos, guias, repetidas
+
+
+def marcar_duplicados(guias_clean: pd.Series, montos: pd.Series,
+                      tolerancia: float = TOLERANCIA_CERCANO) -> pd.Series:
+    """
+    Tipo de duplicado de cada línea de factura ('' si no es un cobro repetido).
+    Exacto: misma guía y mismo monto al centavo que una línea anterior.
+    Cercano: misma guía y monto a menos de la tolerancia (relativa) de otra línea.
+    """
+    codigos, _, repetidas = _codificar(guias_clean)
+    tipo = _tipos_duplicado(codigos, repetidas, montos.to_numpy(float), tolerancia)
+    return pd.Series(tipo, index=guias_clean.index, name='DUPLICADO')
+
+
+def agrupar_facturas(guias_clean: pd.Series, montos: pd.Series, invalidos: pd.Series,
+                     tolerancia: float = TOLERANCIA_CERCANO) -> pd.DataFrame:
+    """
+    Una fila por GUIA_CLEAN con VALOR_REAL (suma de sus líneas), FACTURA_INVALIDA y
+    las columnas de duplicados, para que el cruce no multiplique las filas del manifiesto.
+    Tiempo lineal: una tabla hash de guías y sumas con bincount sobre sus códigos.
+    """
+    codigos, guias, repetidas = _codificar(guias_clean)
+    valores = montos.to_numpy(float)
+    invalido = invalidos.to_numpy(bool)
+    tipo = _tipos_duplicado(codigos, repetidas, valores, tolerancia)
+    exacto = tipo == DUPLICADO_EXACTO
+    cercano = tipo == DUPLICADO_CERCANO
+    en_riesgo = np.where(exacto | cercano, valores, 0.0)
+
+    if not repetidas.any():
+        return pd.DataFrame({
+            'GUIA_CLEAN': guias_clean.array, 'VALOR_REAL': valores, 'FACTURA_INVALIDA': invalido,
+            'LINEAS_FACTURA': np.ones(len(valores), dtype='int64'),
+            'DUPLICADOS_EXACTOS': np.zeros(len(valores), dtype='int64'),
+            'DUPLICADOS_CERCANOS': np.zeros(len(valores), dtype='int64'),
+            'MONTO_EN_RIESGO': en_riesgo,
+        })
+
+    n = len(guias)
+    return pd.DataFrame({
+        'GUIA_CLEAN': guias,
+        'VALOR_REAL': np.bincount(codigos, weights=valores, minlength=n),
+        'FACTURA_INVALIDA': np.bincount(codigos, weights=invalido, minlength=n) > 0,
+        'LINEAS_FACTURA': np.bincount(codigos, minlength=n),
+        'DUPLICADOS_EXACTOS': np.bincount(codigos, weights=exacto, minlength=n).astype('int64'),
+        'DUPLICADOS_CERCANOS': np.bincount(codigos, weights=cercano, minlength=n).astype('int64'),
+        'MONTO_EN_RIESGO': np.bincount(codigos, weights=en_riesgo, minlength=n),
+    })
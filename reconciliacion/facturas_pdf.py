@@ -0,0 +1,159 @@
+"""Facturas en PDF: tablas de guía/monto extraídas página por página en un pool de procesos."""
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .cache_resultados import CacheResultados
+
+try:
+    import pdfplumber
+    PDFPLUMBER_DISPONIBLE = True
+except ImportError:
+    PDFPLUMBER_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_CACHE_PDF = "cache_facturas_pdf"
+MAX_MB_CACHE_PDF = 128
+
+# Cambiar al modificar la extracción para no reutilizar tablas anteriores
+VERSION_EXTRACTOR = "1"
+
+# Con menos páginas no compensa levantar procesos
+PAGINAS_MINIMAS_PARALELO = 16
+# Páginas por tarea: cada tarea abre el PDF una vez
+PAGINAS_POR_TAREA = 16
+
+# Facturas sin líneas de tabla dibujadas: las columnas se deducen de la alineación del texto
+_AJUSTES_TEXTO = {'vertical_strategy': 'text', 'horizontal_strategy': 'text'}
+
+Fila = Tuple[str, ...]
+
+
+def _limpiar(celda: Optional[str]) -> str:
+    return ' '.join(celda.split()) if celda else ''
+
+
+def _tablas_pagina(pagina) -> List[List[Fila]]:
+    """Tablas con bordes de la página; si no hay, la tabla deducida del texto"""
+    tablas = pagina.extract_tables() or [pagina.extract_table(_AJUSTES_TEXTO) or []]
+    return [[tuple(_limpiar(c) for c in fila) for fila in tabla if any(fila)] for tabla in tablas]
+
+
+def _extraer_paginas(ruta: str, desde: int, hasta: int) -> List[List[Fila]]:
+    """Trabajo de cada proceso: filas de las páginas [desde, hasta), en orden"""
+    filas = []
+    with pdfplumber.open(ruta) as pdf:
+        for numero in range(desde, hasta):
+            pagina = pdf.pages[numero]
+            filas.append([fila for tabla in _tablas_pagina(pagina) for fila in tabla])
+            # pdfplumber guarda los objetos de cada página ya leída
+            pagina.close()
+    return filas
+
+
+def _es_encabezado(fila: Fila) -> bool:
+    """Todas las celdas con texto y ninguna es un número (guía o monto)"""
+    return all(c and not c.replace('.', '').replace(',', '').replace('$', '').replace('-', '').isdigit()
+               for c in fila)
+
+
+def _unir_paginas(paginas: Sequence[List[Fila]]) -> pd.DataFrame:
+    """
+    Une las filas de todas las páginas en una tabla: el ancho más frecuente es el de
+    las líneas de detalle; el encabezado es su primera fila de texto y se descarta
+    donde se repite (inicio de cada página). Los bloques de cabecera o totales con
+    otro número de columnas quedan fuera.
+    """
+    conteo = Counter(len(fila) for filas in paginas for fila in filas)
+    if not conteo:
+        return pd.DataFrame()
+    ancho = conteo.most_common(1)[0][0]
+    detalle = [fila for filas in paginas for fila in filas if len(fila) == ancho]
+    encabezado = next((fila for fila in detalle if _es_encabezado(fila)), None)
+    if encabezado is None:
+        columnas = [f"Unnamed: {i}" for i in range(ancho)]
+    else:
+        columnas = [c or f"Unnamed: {i}" for i, c in enumerate(encabezado)]
+        detalle = [fila for fila in detalle if fila != encabezado]
+    return pd.DataFrame.from_records(detalle, columns=columnas).replace('', None)
+
+
+def _tareas(paginas: int, procesos: int) -> List[Tuple[int, int]]:
+    por_tarea = max(1, min(PAGINAS_POR_TAREA, -(-paginas // procesos)))
+    return [(desde, min(desde + por_tarea, paginas)) for desde in range(0, paginas, por_tarea)]
+
+
+def extraer_tabla_pdf(ruta: str, procesos: Optional[int] = None) -> pd.DataFrame:
+    """Tabla de detalle de un PDF; las páginas se reparten entre procesos si son muchas"""
+    if not PDFPLUMBER_DISPONIBLE:
+        raise ImportError("Leer facturas en PDF requiere pdfplumber (pip install pdfplumber)")
+    with pdfplumber.open(ruta) as pdf:
+        paginas = len(pdf.pages)
+
+    procesos = max(1, min(procesos or os.cpu_count() or 1, -(-paginas // PAGINAS_MINIMAS_PARALELO)))
+    # Dentro de un proceso del lote no se abre otro pool
+    if multiprocessing.parent_process() is not None:
+        procesos = 1
+    tareas = _tareas(paginas, procesos)
+    if procesos == 1:
+        partes = [_extraer_paginas(ruta, desde, hasta) for desde, hasta in tareas]
+    else:
+        logger.info(f"PDF: {paginas} páginas en {len(tareas)} tareas y {procesos} procesos")
+        # spawn: no se heredan los hilos del servidor de Streamlit
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            partes = list(pool.map(_extraer_paginas, *zip(*((ruta, d, h) for d, h in tareas))))
+    return _unir_paginas([filas for parte in partes for filas in parte])
+
+
+def _contenido(origen) -> bytes:
+    if hasattr(origen, 'read'):
+        origen.seek(0)
+        contenido = origen.read()
+        origen.seek(0)
+        return contenido
+    with open(origen, 'rb') as archivo:
+        return archivo.read()
+
+
+def leer_tabla_pdf(origen, procesos: Optional[int] = None,
+                   cache: Optional[CacheResultados] = None) -> pd.DataFrame:
+    """
+    Tabla de un PDF (ruta o archivo subido), todas las columnas como texto.
+    Se guarda por hash del contenido: leer encabezados, sugerir columnas y
+    reconciliar el mismo archivo extrae las páginas una sola vez.
+    """
+    cache = CACHE_TABLAS_PDF if cache is None else cache
+    contenido = _contenido(origen)
+    llave = hashlib.sha256(VERSION_EXTRACTOR.encode() + contenido).hexdigest()
+    en_cache = cache.obtener(llave)
+    if en_cache is not None:
+        return en_cache[0].copy()
+
+    if hasattr(origen, 'read'):
+        # Los procesos abren el PDF por ruta: el archivo subido se copia a disco una vez
+        fd, ruta = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as archivo:
+                archivo.write(contenido)
+            tabla = extraer_tabla_pdf(ruta, procesos)
+        finally:
+            os.remove(ruta)
+    else:
+        tabla = extraer_tabla_pdf(os.fspath(origen), procesos)
+
+    cache.guardar(llave, tabla, {'filas': len(tabla), 'columnas': list(tabla.columns)})
+    logger.info(f"PDF: {len(tabla):,} líneas de factura extraídas")
+    return tabla.copy()
+
+
+# Tablas ya extraídas, compartidas por todo el proceso
+CACHE_TABLAS_PDF = CacheResultados(DIRECTORIO_CACHE_PDF, MAX_MB_CACHE_PDF)
@@ -0,0 +1,303 @@
+"""Llave canónica de guía: serie y número extraídos con patrones compilados por transportista."""
+import json
+import logging
+import os
+import re
+import string
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+RUTA_PATRONES = "patrones_guia.json"
+
+# Serie (letras, forma parte de la llave), separador opcional, ceros a la izquierda y número;
+# admite el ".0" que deja Excel al convertir la guía en número.
+# Los patrones se aplican sobre el texto ya sin espacios al inicio ni al final.
+PATRON_GENERAL = r'^(?P<serie>[A-Za-z]{0,6})[\s\-_/.#]*0*(?P<numero>\d{1,18})(?:\.0+)?$'
+# Lo que puede preceder al número en PATRON_GENERAL
+_CARACTERES_PREFIJO = string.ascii_letters + ' \t\n\r\f\v-_/.#'
+# Lo que puede seguir a la serie en PATRON_GENERAL
+_CARACTERES_SUFIJO = string.digits + ' \t\n\r\f\v-_/.#'
+
+# Guía vacía; los textos sin número reconocible usan un hash con el bit de signo encendido,
+# así nunca chocan con un número de guía (siempre >= 0)
+LLAVE_VACIA = -1
+_BIT_TEXTO = np.uint64(1 << 63)
+_MAXIMO_NUMERICO = 10 ** 18
+
+# Con serie de hasta 6 letras y número de hasta 10 dígitos la llave es
+# BASE_SERIE + código de la serie * 10^10 + número: queda por encima de cualquier
+# número sin serie, y A-100 y B-100 no chocan. El resto de las guías con serie
+# usa el hash de "SERIE-número".
+BASE_SERIE = _MAXIMO_NUMERICO
+MAXIMO_CON_SERIE = 10 ** 10
+_LARGO_SERIE = 6
+
+_PATRONES_GENERALES = [re.compile(PATRON_GENERAL)]
+
+# Biblioteca inicial hasta que se edite la de cada transportista: las guías del
+# transportista GENERAL (el del tarifario de demostración) son GUA-nnnn, y sus
+# facturas a veces traen solo el número (0001, o 1001.0 si pasaron por Excel)
+PATRONES_DEMO: Dict[str, Dict[str, Any]] = {
+    'GENERAL': {'serie': 'GUA', 'patrones': []},
+}
+
+
+def _compilar(transportista: str, definicion: Dict[str, Any]) -> Tuple[List[re.Pattern], str]:
+    """Patrones compilados y serie por defecto; ValueError si la definición no es válida"""
+    serie = str(definicion.get('serie') or '').strip().upper()
+    if serie and _codigo_serie(serie) < 0:
+        raise ValueError(f"La serie {serie!r} de {transportista} debe tener de 1 a {_LARGO_SERIE} letras")
+    compilados = []
+    for patron in definicion.get('patrones') or []:
+        try:
+            compilado = re.compile(patron)
+        except re.error as e:
+            raise ValueError(f"Patrón inválido para {transportista}: {patron!r} ({e})")
+        if 'numero' not in compilado.groupindex:
+            raise ValueError(f"El patrón {patron!r} no tiene el grupo (?P<numero>...)")
+        compilados.append(compilado)
+    return compilados, serie
+
+
+class BibliotecaPatrones:
+    """
+    Patrones de guía por transportista en un archivo JSON (ruta None: solo en memoria).
+    Cada patrón debe capturar el grupo 'numero'; el grupo opcional 'serie' entra en la
+    llave y lo demás que reconozca (un prefijo fijo, por ejemplo) se descarta como ruido.
+    Las guías sin serie escrita toman la serie por defecto del transportista.
+    """
+
+    def __init__(self, ruta: Optional[str] = RUTA_PATRONES):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._definiciones: Optional[Dict[str, Dict[str, Any]]] = None
+        self._compilados: Dict[str, Tuple[List[re.Pattern], str]] = {}
+
+    def _cargar(self) -> Dict[str, Dict[str, Any]]:
+        if self._definiciones is None:
+            definiciones = PATRONES_DEMO
+            if self.ruta is not None:
+                try:
+                    with open(self.ruta, encoding='utf-8') as archivo:
+                        definiciones = json.load(archivo)
+                    for transportista, definicion in definiciones.items():
+                        _compilar(transportista, definicion)
+                except FileNotFoundError:
+                    pass
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.warning(f"No se pudo leer {self.ruta}, se usan los patrones de demostración: {e}")
+                    definiciones = PATRONES_DEMO
+            self._definiciones = {t.strip().upper(): dict(d) for t, d in definiciones.items()}
+        return self._definiciones
+
+    def transportistas(self) -> List[str]:
+        with self._lock:
+            return sorted(self._cargar())
+
+    def definicion(self, transportista: Optional[str]) -> Dict[str, Any]:
+        """Serie y patrones del transportista (vacíos si no tiene)"""
+        with self._lock:
+            definicion = self._cargar().get(transportista.strip().upper(), {}) if transportista else {}
+        return {'serie': definicion.get('serie') or '', 'patrones': list(definicion.get('patrones') or [])}
+
+    def registrar(self, transportista: str, patrones: Sequence[str], serie: str = '') -> None:
+        """Valida, agrega o reemplaza los patrones del transportista y guarda la biblioteca"""
+        transportista = transportista.strip().upper()
+        definicion = {'serie': serie.strip().upper(), 'patrones': list(patrones)}
+        _compilar(transportista, definicion)
+        with self._lock:
+            definiciones = dict(self._cargar())
+            definiciones[transportista] = definicion
+            self._guardar(definiciones)
+
+    def tabla(self) -> pd.DataFrame:
+        """Una fila por patrón (o por transportista, si solo tiene serie), para editarla"""
+        filas = []
+        with self._lock:
+            for transportista, definicion in sorted(self._cargar().items()):
+                for patron in definicion.get('patrones') or ['']:
+                    filas.append((transportista, definicion.get('serie') or '', patron))
+        return pd.DataFrame(filas, columns=['TRANSPORTISTA', 'SERIE', 'PATRON'])
+
+    def guardar(self, tabla: pd.DataFrame) -> None:
+        """Valida y reemplaza la biblioteca completa desde una tabla como la de tabla()"""
+        tabla = tabla.reindex(columns=['TRANSPORTISTA', 'SERIE', 'PATRON']).fillna('').astype(str)
+        tabla = tabla[tabla['TRANSPORTISTA'].str.strip() != '']
+        definiciones: Dict[str, Dict[str, Any]] = {}
+        for fila in tabla.itertuples(index=False):
+            transportista = fila.TRANSPORTISTA.strip().upper()
+            definicion = definiciones.setdefault(transportista, {'serie': fila.SERIE.strip().upper(), 'patrones': []})
+            if fila.SERIE.strip() and fila.SERIE.strip().upper() != definicion['serie']:
+                raise ValueError(f"{transportista} tiene más de una serie por defecto")
+            if fila.PATRON.strip():
+                definicion['patrones'].append(fila.PATRON.strip())
+        for transportista, definicion in definiciones.items():
+            _compilar(transportista, definicion)
+        with self._lock:
+            self._guardar(definiciones)
+
+    def _guardar(self, definiciones: Dict[str, Dict[str, Any]]) -> None:
+        if self.ruta is not None:
+            directorio = os.path.dirname(os.path.abspath(self.ruta))
+            fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+                json.dump(definiciones, archivo, ensure_ascii=False, indent=2)
+            os.replace(temporal, self.ruta)
+        self._definiciones = definiciones
+        self._compilados.clear()
+
+    def patrones(self, transportista: Optional[str]) -> Tuple[List[re.Pattern], str]:
+        """Patrones compilados del transportista seguidos de los generales, y su serie por defecto"""
+        clave = transportista.strip().upper() if transportista else ''
+        with self._lock:
+            compilados = self._compilados.get(clave)
+            if compilados is None:
+                definicion = self._cargar().get(clave) if clave else None
+                compilados = _compilar(clave, definicion) if definicion else ([], '')
+                self._compilados[clave] = compilados
+        propios, serie = compilados
+        return propios + _PATRONES_GENERALES, serie
+
+
+# Biblioteca compartida por todo el proceso (se lee al primer uso, también en los procesos del lote)
+BIBLIOTECA_PATRONES = BibliotecaPatrones()
+
+
+def patrones_guia(transportista: Optional[str] = None,
+                  biblioteca: Optional[BibliotecaPatrones] = None) -> List[re.Pattern]:
+    """Patrones del transportista (si los tiene) seguidos de los generales"""
+    return (biblioteca or BIBLIOTECA_PATRONES).patrones(transportista)[0]
+
+
+def _llaves_texto(texto: pd.Series) -> np.ndarray:
+    """Hash (negativo) del texto normalizado para guías sin número reconocible"""
+    hashes = pd.util.hash_pandas_object(texto.str.upper(), index=False, categorize=False).to_numpy()
+    return (hashes | _BIT_TEXTO).view(np.int64)
+
+
+def _codigo_serie(serie: str) -> int:
+    """Serie de 1 a 6 letras en base 27 (A=1 .. Z=26, sin distinguir mayúsculas); 0 sin serie y -1 si no entra"""
+    if not serie:
+        return 0
+    if len(serie) > _LARGO_SERIE or not (serie.isascii() and serie.isalpha()):
+        return -1
+    codigo = 0
+    for letra in serie.upper():
+        codigo = codigo * 27 + ord(letra) - ord('A') + 1
+    return codigo
+
+
+def _llaves_con_serie(numeros: np.ndarray, series: Optional[pd.Series], serie_defecto: str = '') -> np.ndarray:
+    """
+    Llave de las guías reconocidas: el número solo, o con el código de su serie en los
+    dígitos altos. Las que no traen serie toman la del transportista, si tiene.
+    """
+    if series is None:
+        if not serie_defecto:
+            return numeros
+        indices, unicas = np.zeros(len(numeros), dtype=np.intp), ['']
+    else:
+        # Las series se repiten mucho: el código se calcula una vez por serie distinta
+        indices, unicas = pd.factorize(series)
+    unicas = [serie or serie_defecto for serie in unicas]
+    codigos = np.array([_codigo_serie(serie) for serie in unicas] + [0], dtype=np.int64)[indices]
+    llaves = numeros.copy()
+    empaquetada = (codigos > 0) & (numeros < MAXIMO_CON_SERIE)
+    llaves[empaquetada] = BASE_SERIE + codigos[empaquetada] * MAXIMO_CON_SERIE + numeros[empaquetada]
+    con_hash = (codigos != 0) & ~empaquetada
+    if con_hash.any():
+        textos = np.array(unicas + [''], dtype=object)[indices[con_hash]]
+        llaves[con_hash] = _llaves_texto(pd.Series(textos, dtype='str') + '-'
+                                         + pd.Series(numeros[con_hash]).astype('str'))
+    return llaves
+
+
+def _numeros_generales(arreglo) -> Tuple[np.ndarray, pd.Series]:
+    """
+    PATRON_GENERAL sin capturas (varias veces más rápido en RE2): se valida la forma,
+    el número es lo que queda al quitar serie, separadores y el sufijo ".0" y la serie
+    lo que queda al quitar separadores y número.
+    """
+    valido = pc.fill_null(pc.match_substring_regex(arreglo, PATRON_GENERAL), False)
+    numero = pc.utf8_ltrim(arreglo, characters=_CARACTERES_PREFIJO)
+    # En un texto válido el único punto posible es el del sufijo ".0+"
+    con_sufijo = pc.fill_null(pc.match_substring(numero, '.'), False)
+    numero = pc.if_else(con_sufijo, pc.utf8_rtrim(pc.utf8_rtrim(numero, characters='0'), characters='.'), numero)
+    numeros = pc.cast(pc.if_else(valido, numero, '-1'), pa.int64())
+    series = pc.utf8_rtrim(arreglo, characters=_CARACTERES_SUFIJO)
+    return numeros.to_numpy(zero_copy_only=False), pd.Series(series, dtype=pd.StringDtype('pyarrow'))
+
+
+def _extraer_numeros(texto: pd.Series, patron: re.Pattern) -> Tuple[np.ndarray, Optional[pd.Series]]:
+    """Número capturado por el patrón en cada texto (-1 si no coincide) y su serie, si el patrón la captura"""
+    con_serie = 'serie' in patron.groupindex
+    if pa is not None and isinstance(texto.dtype, pd.StringDtype) and texto.dtype.storage == 'pyarrow':
+        if patron.pattern == PATRON_GENERAL:
+            return _numeros_generales(pa.array(texto.array))
+        # str.extract sobre texto de Arrow pasa por Python; extract_regex corre en C++ (RE2)
+        capturas = pc.extract_regex(pa.array(texto.array), patron.pattern)
+        numeros = pc.cast(pc.struct_field(capturas, [patron.groupindex['numero'] - 1]), pa.int64())
+        series = None
+        if con_serie:
+            series = pc.fill_null(pc.struct_field(capturas, [patron.groupindex['serie'] - 1]), '')
+            series = pd.Series(series, dtype=pd.StringDtype('pyarrow'))
+        return pc.fill_null(numeros, -1).to_numpy(), series
+    capturas = texto.str.extract(patron, expand=True)
+    numeros = capturas['numero'].fillna('-1').astype(np.int64).to_numpy()
+    series = capturas['serie'].fillna('').reset_index(drop=True) if con_serie else None
+    return numeros, series
+
+
+def canonizar_guias(serie: pd.Series, transportista: Optional[str] = None,
+                    biblioteca: Optional[BibliotecaPatrones] = None) -> pd.Series:
+    """
+    Llave entera (int64) de cada guía: 0001 y 1.0 dan 1; GUA-0001, gua 0001 y GUA_1
+    dan la misma llave, distinta de la de A-0001. Sin serie escrita, la guía toma la
+    serie por defecto del transportista (con la de GUA, 0001 y 1001.0 cruzan con
+    GUA-0001 y GUA-1001); sin transportista conocido, 1 y GUA-1 son guías distintas.
+    Los patrones del transportista se extraen en bloque, en orden; lo que
+    ninguno reconoce se compara por su texto normalizado.
+    """
+    patrones, serie_defecto = (biblioteca or BIBLIOTECA_PATRONES).patrones(transportista)
+    llaves = np.full(len(serie), LLAVE_VACIA, dtype=np.int64)
+    presente = serie.notna().to_numpy()
+
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        # Columna numérica (Excel): los enteros no negativos ya son la llave
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        entero = presente & (valores >= 0) & (valores < _MAXIMO_NUMERICO) & (np.floor(valores) == valores)
+        llaves[entero] = _llaves_con_serie(serie[entero].to_numpy().astype(np.int64), None, serie_defecto)
+        pendiente = presente & ~entero
+        if pendiente.any():
+            llaves[pendiente] = _llaves_texto(serie[pendiente].astype('str').str.strip())
+        return pd.Series(llaves, index=serie.index, name='GUIA_CLEAN')
+
+    posiciones = np.flatnonzero(presente)
+    texto = (serie if presente.all() else serie[presente]).astype('str').str.strip()
+    pendiente = (texto != '').to_numpy(dtype=bool, copy=True)
+    for patron in patrones:
+        if not pendiente.any():
+            break
+        indices = np.flatnonzero(pendiente)
+        numeros, series = _extraer_numeros(texto.iloc[indices], patron)
+        reconocido = numeros >= 0
+        if series is not None:
+            series = series[reconocido].reset_index(drop=True)
+        llaves[posiciones[indices[reconocido]]] = _llaves_con_serie(numeros[reconocido], series, serie_defecto)
+        pendiente[indices[reconocido]] = False
+
+    if pendiente.any():
+        llaves[posiciones[pendiente]] = _llaves_texto(texto[pendiente])
+    return pd.Series(llaves, index=serie.index, name='GUIA_CLEAN')
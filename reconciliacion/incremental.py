@@ -0,0 +1,499 @@
+"""Reconciliación incremental: solo se cruzan las guías nuevas o modificadas respecto al historial."""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+from .cache_resultados import VERSION_MOTOR
+from .guias import BIBLIOTECA_PATRONES, canonizar_guias
+from .motor import _CAMPOS_ADITIVOS, combinar_resumenes, limpiar_guias, reconciliar
+from .tiendas import DimensionTiendas
+
+logger = logging.getLogger(__name__)
+
+RUTA_HISTORIAL = "historial_reconciliacion.db"
+
+ESTADO_CONCILIADA = "CONCILIADA"
+ESTADO_PENDIENTE = "PENDIENTE"
+
+# Límite de parámetros por consulta en SQLite
+_LOTE_SQL = 900
+
+# Versión del esquema (PRAGMA user_version); la 1 guarda la guía como llave entera,
+# la 2, con la serie dentro de la llave (A-100 y B-100 son guías distintas) y la 3
+# deja la huella fuera de SQLite (la última carga guardada la reemplaza)
+VERSION_ESQUEMA = 3
+
+
+def _sal(configuracion: Dict[str, Any]) -> np.uint64:
+    """Sal de la configuración: cambia si cambian columnas, formato de montos o versión del motor"""
+    texto = json.dumps(dict(configuracion, version=VERSION_MOTOR), sort_keys=True, default=str)
+    return np.frombuffer(hashlib.sha256(texto.encode()).digest()[:8], dtype=np.uint64)[0]
+
+
+def filas_distintas(actual: pd.DataFrame, anterior: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compara dos cargas fila a fila por posición (sin hashear): máscaras de las filas de
+    actual que cambiaron o son nuevas y de las de anterior que cambiaron o se quitaron.
+    """
+    comunes = min(len(actual), len(anterior))
+    iguales = np.ones(comunes, dtype=bool)
+    for columna in actual.columns:
+        a = actual[columna].iloc[:comunes].reset_index(drop=True)
+        b = anterior[columna].iloc[:comunes].reset_index(drop=True)
+        # Tipos no comparables (p. ej. guía leída como número y luego como texto) dan False
+        iguales &= a.eq(b).fillna(False).to_numpy(dtype=bool) | (a.isna() & b.isna()).to_numpy()
+    distinta = np.ones(len(actual), dtype=bool)
+    distinta_anterior = np.ones(len(anterior), dtype=bool)
+    distinta[:comunes] = distinta_anterior[:comunes] = ~iguales
+    return distinta, distinta_anterior
+
+
+def _hash_columna(serie: pd.Series) -> np.ndarray:
+    """Hash de cada valor; el texto de Arrow se codifica en C++ y solo se hashean los valores distintos"""
+    if pa is not None and isinstance(serie.dtype, pd.StringDtype) and serie.dtype.storage == 'pyarrow':
+        arreglo = pa.array(serie.array)
+        if isinstance(arreglo, pa.ChunkedArray):
+            arreglo = arreglo.combine_chunks()
+        codificada = pc.dictionary_encode(arreglo)
+        # Mismo hash que hash_pandas_object sobre la serie, también para los nulos
+        nulo = pd.util.hash_pandas_object(pd.Series([None], dtype=serie.dtype), index=False).to_numpy()
+        distintos = np.append(pd.util.hash_array(codificada.dictionary.to_numpy(zero_copy_only=False)
+                                                 .astype(object), categorize=False), nulo)
+        indices = pc.fill_null(codificada.indices, len(codificada.dictionary)).to_numpy()
+        return distintos[indices]
+    return pd.util.hash_pandas_object(serie, index=False).to_numpy()
+
+
+def huellas_filas(df: pd.DataFrame, columnas: List[str]) -> np.ndarray:
+    """Hash de 64 bits del contenido de cada fila (sin la guía: la guía es la llave de la suma)"""
+    hashes = pd.DataFrame({i: _hash_columna(df[columna]) for i, columna in enumerate(columnas)})
+    return pd.util.hash_pandas_object(hashes, index=False).to_numpy()
+
+
+def huellas_por_guia(llaves_m: np.ndarray, filas_m: np.ndarray, llaves_f: np.ndarray, filas_f: np.ndarray,
+                     sal: int) -> pd.Series:
+    """
+    Huella de cada guía del manifiesto (indexada por su llave): la suma (módulo 2^64) de
+    los hash de sus filas de manifiesto y de facturas, que no depende del orden de las filas.
+    """
+    man = pd.Series(filas_m).groupby(llaves_m, sort=False).sum()
+    fac = pd.Series(filas_f).groupby(llaves_f, sort=False).sum().reindex(man.index, fill_value=0)
+    combinado = pd.DataFrame({'man': man.to_numpy(), 'fac': fac.to_numpy()})
+    return pd.Series(pd.util.hash_pandas_object(combinado, index=False).to_numpy() ^ np.uint64(sal),
+                     index=man.index, name='huella')
+
+
+def contribuciones_por_guia(df_final: pd.DataFrame) -> pd.DataFrame:
+    """Aporte de cada GUIA_CLEAN a los campos aditivos del resumen"""
+    aportes = pd.DataFrame({
+        'GUIA_CLEAN': df_final['GUIA_CLEAN'],
+        'TIPO_TIENDA': df_final['TIPO_TIENDA'],
+        'guias': 1,
+        'con_factura': (df_final['VALOR_REAL'] > 0).astype(int),
+        'sin_factura': (df_final['VALOR_REAL'] == 0).astype(int),
+        'total_facturado': df_final['VALOR_REAL'],
+        'total_manifiesto': df_final['VALOR_MANIFIESTO'],
+        'total_piezas': df_final['PIEZAS_CALC'],
+        'montos_invalidos': df_final['MONTO_INVALIDO'].astype(int),
+        'duplicados_exactos': df_final['DUPLICADOS_EXACTOS'],
+        'duplicados_cercanos': df_final['DUPLICADOS_CERCANOS'],
+        'total_en_riesgo': df_final['MONTO_EN_RIESGO'],
+    })
+    agregado = aportes.groupby('GUIA_CLEAN', sort=False).agg(
+        {'TIPO_TIENDA': 'first', **{campo: 'sum' for campo in _CAMPOS_ADITIVOS}}
+    )
+    agregado['ESTADO'] = np.where(agregado['con_factura'] > 0, ESTADO_CONCILIADA, ESTADO_PENDIENTE)
+    return agregado
+
+
+class HistorialReconciliacion:
+    """
+    Guías ya reconciliadas: estado y aportes por guía y totales acumulados en SQLite,
+    más, en disco, la huella de contenido de cada guía y la última carga recibida.
+    El delta se decide por guía: solo pasan por el join las guías cuya huella cambió.
+    La última carga es solo un atajo: las filas iguales en la misma posición reusan su
+    llave y su hash, y solo se limpian y hashean las demás. Un bloqueo serializa las
+    escrituras de las sesiones que comparten el historial.
+    """
+
+    def __init__(self, ruta: str = RUTA_HISTORIAL):
+        self.ruta = ruta
+        base = os.path.splitext(ruta)[0]
+        self.ruta_carga = f"{base}_ultima_carga.pkl"
+        # Índice de huellas por guía del esquema 2, sin uso desde la versión 3
+        self._ruta_indice_huellas = f"{base}_huellas.npz"
+        self._tablas_creadas = False
+        self._lock = threading.RLock()
+
+    def _borrar_ultima_carga(self) -> None:
+        for ruta in (self.ruta_carga, self._ruta_indice_huellas):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _apartar_esquema_1(self) -> None:
+        """
+        El esquema 1 guardaba la llave sin la serie y no conserva el texto de la guía,
+        así que sus llaves no se pueden recalcular: ese historial se aparta y se empieza otro.
+        """
+        if not os.path.exists(self.ruta):
+            return
+        conn = sqlite3.connect(self.ruta)
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+        if version != 1:
+            return
+        respaldo = f"{self.ruta}.v1"
+        os.replace(self.ruta, respaldo)
+        self._borrar_ultima_carga()
+        logger.warning(f"Historial con llaves sin serie apartado en {respaldo}; se inicia uno nuevo")
+
+    @contextmanager
+    def _conexion(self):
+        if not self._tablas_creadas:
+            self._apartar_esquema_1()
+        conn = sqlite3.connect(self.ruta)
+        try:
+            if not self._tablas_creadas:
+                self._crear_tablas(conn)
+                self._tablas_creadas = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _definicion(campo: str) -> str:
+        return f"{campo} {'REAL' if campo.startswith('total_') else 'INTEGER'} NOT NULL DEFAULT 0"
+
+    def _crear_tablas(self, conn) -> None:
+        campos = ", ".join(self._definicion(campo) for campo in _CAMPOS_ADITIVOS)
+        with conn:
+            anteriores = self._guias_anteriores(conn)
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS guias (
+                    guia INTEGER PRIMARY KEY,
+                    tipo_tienda TEXT,
+                    estado TEXT,
+                    {campos},
+                    actualizado TEXT
+                )
+            ''')
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS totales (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    {campos}
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO totales (id) VALUES (1)")
+
+            # Historiales creados por versiones anteriores: se agregan los campos nuevos en 0
+            for tabla in ('guias', 'totales'):
+                existentes = {fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+                for campo in _CAMPOS_ADITIVOS:
+                    if campo not in existentes:
+                        conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {self._definicion(campo)}")
+
+            if anteriores is not None:
+                self._migrar_guias(conn, anteriores)
+            elif "huella" in {fila[1] for fila in conn.execute("PRAGMA table_info(guias)")}:
+                # Esquema 2: la huella por guía ya no se usa
+                conn.execute("ALTER TABLE guias DROP COLUMN huella")
+                self._borrar_ultima_carga()
+            conn.execute(f"PRAGMA user_version = {VERSION_ESQUEMA}")
+
+    def _guias_anteriores(self, conn) -> Optional[pd.DataFrame]:
+        """Guías de un historial con llave de texto (esquema 0); la tabla se recrea con llave entera"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        existe = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'guias'").fetchone()[0]
+        if version != 0 or not existe:
+            return None
+        anteriores = pd.read_sql("SELECT * FROM guias", conn).drop(columns='huella', errors='ignore')
+        conn.execute("DROP TABLE guias")
+        # Las llaves del índice eran hashes del texto
+        self._borrar_ultima_carga()
+        return anteriores
+
+    @staticmethod
+    def _migrar_guias(conn, anteriores: pd.DataFrame) -> None:
+        """
+        Reinserta las guías con su llave canónica; las que ahora coinciden
+        (GUA-0001 y 0001) suman sus aportes. Los totales no cambian.
+        """
+        for campo in _CAMPOS_ADITIVOS:
+            if campo not in anteriores.columns:
+                anteriores[campo] = 0
+        anteriores['guia'] = canonizar_guias(anteriores['guia'].astype(str))
+        migradas = anteriores.groupby('guia', sort=False).agg(
+            {'tipo_tienda': 'first', 'actualizado': 'max',
+             **{campo: 'sum' for campo in _CAMPOS_ADITIVOS}}
+        )
+        migradas['estado'] = np.where(migradas['con_factura'] > 0, ESTADO_CONCILIADA, ESTADO_PENDIENTE)
+        migradas.reset_index().to_sql('guias', conn, if_exists='append', index=False)
+        logger.info(f"Historial migrado a llaves enteras: {len(anteriores)} guías -> {len(migradas)}")
+
+    # --- Última carga ----------------------------------------------------------
+
+    def _cargar_ultima_carga(self, conn, sal: int) -> Optional[Dict[str, Any]]:
+        """
+        Última carga reconciliada con la misma configuración. Sin ella (o con el
+        historial vacío) todas las filas cuentan como nuevas y se vuelve a guardar.
+        """
+        if conn.execute("SELECT EXISTS (SELECT 1 FROM guias)").fetchone()[0] == 0:
+            return None
+        try:
+            with open(self.ruta_carga, 'rb') as archivo:
+                carga = pickle.load(archivo)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Última carga ilegible, se reconcilian todas las guías recibidas: {e}")
+            return None
+        return carga if carga.get('sal') == sal else None
+
+    def _guardar_ultima_carga(self, carga: Dict[str, Any]) -> None:
+        directorio = os.path.dirname(os.path.abspath(self.ruta_carga))
+        fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.pkl')
+        try:
+            with os.fdopen(fd, 'wb') as archivo:
+                pickle.dump(carga, archivo, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporal, self.ruta_carga)
+        except Exception:
+            os.remove(temporal)
+            raise
+
+    @staticmethod
+    def _filas(actual: pd.DataFrame, col_guia: str, contenido: List[str], anterior: Dict[str, Any],
+               transportista: Optional[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Llave y hash de cada fila de actual, más las llaves de las filas que cambiaron
+        respecto a la última carga (las de antes y las de ahora).
+        """
+        previa = anterior.get('filas')
+        if previa is None:
+            distinta, distinta_anterior = np.ones(len(actual), dtype=bool), np.zeros(0, dtype=bool)
+        else:
+            distinta, distinta_anterior = filas_distintas(actual, previa)
+        llaves = np.empty(len(actual), dtype=np.int64)
+        hashes = np.empty(len(actual), dtype=np.uint64)
+        comunes = min(len(actual), len(distinta_anterior))
+        if comunes:
+            llaves[:comunes] = anterior['llaves'][:comunes]
+            hashes[:comunes] = anterior['hashes'][:comunes]
+        if distinta.any():
+            cambiadas = actual[distinta]
+            llaves[distinta] = limpiar_guias(cambiadas[col_guia], transportista).to_numpy(dtype=np.int64)
+            hashes[distinta] = huellas_filas(cambiadas, contenido)
+        tocadas = llaves[distinta]
+        if distinta_anterior.any():
+            tocadas = np.concatenate([tocadas, anterior['llaves'][distinta_anterior]])
+        return llaves, hashes, tocadas, distinta
+
+    @staticmethod
+    def _ubicar(guias_hist: np.ndarray, llaves: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Posición de inserción de cada llave entre las guardadas (ordenadas) y si ya estaba"""
+        if not len(guias_hist):
+            return np.zeros(len(llaves), dtype=np.intp), np.zeros(len(llaves), dtype=bool)
+        # Buscar en orden es varias veces más rápido que con llaves desordenadas
+        orden = np.argsort(llaves)
+        pos = np.empty(len(llaves), dtype=np.intp)
+        pos[orden] = np.searchsorted(guias_hist, llaves[orden])
+        return pos, guias_hist[np.minimum(pos, len(guias_hist) - 1)] == llaves
+
+    @staticmethod
+    def _fusionar(guias_hist: np.ndarray, huellas_hist: np.ndarray, llaves: np.ndarray, huellas: np.ndarray,
+                  pos: np.ndarray, existe: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Huellas guardadas con las recalculadas: se reemplazan en su lugar y las llaves nuevas se insertan"""
+        huellas_hist = huellas_hist.copy()
+        huellas_hist[pos[existe]] = huellas[existe]
+        if existe.all():
+            return guias_hist, huellas_hist
+        orden = np.argsort(llaves[~existe])
+        insertar = pos[~existe][orden]
+        return (np.insert(guias_hist, insertar, llaves[~existe][orden]),
+                np.insert(huellas_hist, insertar, huellas[~existe][orden]))
+
+    @staticmethod
+    def _guias_existentes(conn, guias: List[int]) -> int:
+        """Cuántas de las guías indicadas ya estaban en el historial"""
+        existentes = 0
+        for inicio in range(0, len(guias), _LOTE_SQL):
+            lote = guias[inicio:inicio + _LOTE_SQL]
+            existentes += conn.execute(
+                f"SELECT COUNT(*) FROM guias WHERE guia IN ({', '.join('?' * len(lote))})", lote
+            ).fetchone()[0]
+        return existentes
+
+    # --- Reconciliación ------------------------------------------------------
+
+    def _leer_totales(self, conn) -> Dict[str, Any]:
+        fila = conn.execute(f"SELECT {', '.join(_CAMPOS_ADITIVOS)} FROM totales WHERE id = 1").fetchone()
+        return combinar_resumenes([dict(zip(_CAMPOS_ADITIVOS, fila))])
+
+    def resumen(self) -> Dict[str, Any]:
+        """Totales acumulados de todas las guías del historial"""
+        with self._conexion() as conn:
+            return self._leer_totales(conn)
+
+    def reconciliar(self, df_m: pd.DataFrame, df_f: pd.DataFrame,
+                    col_guia_m: str, col_dest_m: str, col_valor_m: str, col_piezas_m: str,
+                    col_guia_f: str, col_valor_f: str,
+                    separador_decimal: Optional[str] = None,
+                    transportista: Optional[str] = None,
+                    tiendas: Optional[DimensionTiendas] = None) -> Tuple[pd.DataFrame, Dict[str, Any], Dict[str, int]]:
+        """
+        Cruza solo las guías cuya huella de contenido cambió y aplica el delta a los totales
+        (tiendas, como en reconciliar).
+        Devuelve (df_final del delta, resumen acumulado, conteos del delta).
+        """
+        columnas = dict(col_guia_m=col_guia_m, col_dest_m=col_dest_m, col_valor_m=col_valor_m,
+                        col_piezas_m=col_piezas_m, col_guia_f=col_guia_f, col_valor_f=col_valor_f,
+                        separador_decimal=separador_decimal, transportista=transportista)
+        # Otros patrones de guía dan otras llaves: la última carga guardada deja de servir
+        sal = int(_sal(dict(columnas, patrones=BIBLIOTECA_PATRONES.definicion(transportista))))
+        actual_m = df_m[[col_guia_m, col_dest_m, col_valor_m, col_piezas_m]].reset_index(drop=True)
+        actual_f = df_f[[col_guia_f, col_valor_f]].reset_index(drop=True)
+
+        with self._lock:
+            with self._conexion() as conn:
+                anterior = self._cargar_ultima_carga(conn, sal) or {}
+            llaves_m, filas_m, tocadas_m, distinta_m = self._filas(
+                actual_m, col_guia_m, [col_dest_m, col_valor_m, col_piezas_m], anterior.get('manifiesto', {}),
+                transportista)
+            llaves_f, filas_f, tocadas_f, distinta_f = self._filas(
+                actual_f, col_guia_f, [col_valor_f], anterior.get('facturas', {}), transportista)
+            recibidas = pd.unique(llaves_m)
+
+            # Solo las guías con alguna fila distinta pueden haber cambiado; su huella se
+            # recalcula con todas sus filas y se compara con la guardada
+            tocadas = pd.unique(np.concatenate([tocadas_m, tocadas_f]))
+            if len(tocadas) > len(recibidas) // 2:
+                # Casi todo cambió de lugar: sumar todas las guías sale más barato que filtrar
+                fila_m, fila_f = slice(None), slice(None)
+            else:
+                fila_m = pd.Series(llaves_m).isin(tocadas).to_numpy()
+                fila_f = pd.Series(llaves_f).isin(tocadas).to_numpy()
+            huellas = huellas_por_guia(llaves_m[fila_m], filas_m[fila_m], llaves_f[fila_f], filas_f[fila_f], sal)
+            llaves_h, huellas_h = huellas.index.to_numpy(dtype=np.int64), huellas.to_numpy()
+            guias_hist = anterior.get('guias', np.empty(0, dtype=np.int64))
+            huellas_hist = anterior.get('huellas', np.empty(0, dtype=np.uint64))
+            pos, existe = self._ubicar(guias_hist, llaves_h)
+            cambiada = ~existe
+            cambiada[existe] = huellas_hist[pos[existe]] != huellas_h[existe]
+            afectadas = llaves_h[cambiada]
+
+            # Solo el delta pasa por el join, la clasificación y el parseo de montos
+            fila_m = pd.Series(llaves_m).isin(afectadas).to_numpy()
+            fila_f = pd.Series(llaves_f).isin(afectadas).to_numpy()
+            df_final = reconciliar(df_m[fila_m], df_f[fila_f], tiendas=tiendas, **columnas)
+
+            with self._conexion() as conn:
+                modificadas = self._guias_existentes(conn, afectadas.tolist())
+                if len(afectadas):
+                    self._aplicar_delta(conn, contribuciones_por_guia(df_final))
+                totales = self._leer_totales(conn)
+
+            # La carga se guarda después del commit: si falla, la próxima solo repite trabajo
+            if distinta_m.any() or distinta_f.any() or len(tocadas_m) or len(tocadas_f):
+                guias_hist, huellas_hist = self._fusionar(guias_hist, huellas_hist, llaves_h, huellas_h, pos, existe)
+                self._guardar_ultima_carga({
+                    'sal': sal, 'guias': guias_hist, 'huellas': huellas_hist,
+                    'manifiesto': {'filas': actual_m, 'llaves': llaves_m, 'hashes': filas_m},
+                    'facturas': {'filas': actual_f, 'llaves': llaves_f, 'hashes': filas_f},
+                })
+
+        conteos = {
+            'recibidas': len(recibidas),
+            'nuevas': len(afectadas) - modificadas,
+            'modificadas': modificadas,
+            'sin_cambios': len(recibidas) - len(afectadas)
+        }
+        logger.info(f"Reconciliación incremental: {conteos}")
+        return df_final, totales, conteos
+
+    def _aportes_anteriores(self, conn, guias) -> Dict[str, Any]:
+        """Suma de lo que aportaban las guías indicadas que ya estaban en el historial"""
+        campos = list(_CAMPOS_ADITIVOS)
+        anterior = dict.fromkeys(campos, 0)
+        for inicio in range(0, len(guias), _LOTE_SQL):
+            lote = guias[inicio:inicio + _LOTE_SQL]
+            fila = conn.execute(
+                f"SELECT {', '.join(f'COALESCE(SUM({c}), 0)' for c in campos)} FROM guias "
+                f"WHERE guia IN ({', '.join('?' * len(lote))})", lote
+            ).fetchone()
+            for campo, valor in zip(campos, fila):
+                anterior[campo] += valor
+        return anterior
+
+    def _aplicar_delta(self, conn, aportes: pd.DataFrame) -> None:
+        """Reemplaza el aporte anterior de cada guía cambiada por el nuevo"""
+        campos = list(_CAMPOS_ADITIVOS)
+        guias = aportes.index.tolist()
+
+        anterior = self._aportes_anteriores(conn, guias)
+        nuevo = aportes[campos].sum()
+        conn.execute(
+            f"UPDATE totales SET {', '.join(f'{c} = {c} + ?' for c in campos)} WHERE id = 1",
+            [nuevo[c].item() - anterior[c] for c in campos]
+        )
+
+        ahora = datetime.now().isoformat(timespec='seconds')
+        registros = zip(
+            guias, aportes['TIPO_TIENDA'].tolist(), aportes['ESTADO'].tolist(),
+            *(aportes[c].tolist() for c in campos),
+            [ahora] * len(guias)
+        )
+        actualizaciones = ', '.join(f"{c} = excluded.{c}"
+                                    for c in ['tipo_tienda', 'estado', *campos, 'actualizado'])
+        conn.executemany(
+            f"INSERT INTO guias (guia, tipo_tienda, estado, {', '.join(campos)}, actualizado) "
+            f"VALUES ({', '.join('?' * (len(campos) + 4))}) "
+            f"ON CONFLICT(guia) DO UPDATE SET {actualizaciones}",
+            registros
+        )
+
+    def recalcular_totales(self) -> Dict[str, Any]:
+        """Reconstruye los totales sumando el historial completo (corrige deriva de redondeo)"""
+        campos = list(_CAMPOS_ADITIVOS)
+        with self._lock, self._conexion() as conn:
+            conn.execute(
+                f"UPDATE totales SET ({', '.join(campos)}) = "
+                f"(SELECT {', '.join(f'COALESCE(SUM({c}), 0)' for c in campos)} FROM guias) WHERE id = 1"
+            )
+            return self._leer_totales(conn)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._conexion() as conn:
+            guias, ultima = conn.execute("SELECT COUNT(*), MAX(actualizado) FROM guias").fetchone()
+        return {'guias': guias, 'ultima_actualizacion': ultima}
+
+    def limpiar(self) -> int:
+        """Vacía el historial y devuelve cuántas guías tenía"""
+        with self._lock:
+            with self._conexion() as conn:
+                eliminadas = conn.execute("DELETE FROM guias").rowcount
+                conn.execute("UPDATE totales SET " + ", ".join(f"{c} = 0" for c in _CAMPOS_ADITIVOS))
+            self._borrar_ultima_carga()
+        return eliminadas
+
+
+# Historial compartido por todo el proceso
+HISTORIAL_RECONCILIACION = HistorialReconciliacion()
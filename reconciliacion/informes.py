@@ -0,0 +1,308 @@
+"""Informe PDF de la reconciliación (reportlab), generado en un hilo de fondo y guardado en disco."""
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.pdfgen import canvas
+
+from .exportacion import ETIQUETAS_RESUMEN, resumen_por_tipo
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_INFORMES = "informes_reconciliacion"
+MAX_MB_INFORMES = 256
+# Trabajos fallidos que se recuerdan para mostrar su error; los más antiguos se olvidan
+MAX_TRABAJOS_FALLIDOS = 32
+
+# Cambiar al modificar el contenido del informe para no servir PDFs anteriores
+VERSION_INFORME = "1"
+
+# Filas que se formatean a la vez; cada bloque se dibuja y se suelta antes del siguiente
+FILAS_POR_BLOQUE = 5_000
+
+_MARGEN = 36
+_ALTO_FILA = 13
+_TAMANO_LETRA = 8
+_GRIS = colors.HexColor('#DDEBF7')
+
+# (título, columnas, orden) de cada tabla de excepciones; la condición está en _excepciones
+_EXCEPCIONES = [
+    ('Guías sin factura', ['VALOR_MANIFIESTO', 'PIEZAS_CALC'], 'VALOR_MANIFIESTO'),
+    ('Cobros duplicados', ['LINEAS_FACTURA', 'DUPLICADOS_EXACTOS', 'DUPLICADOS_CERCANOS', 'VALOR_REAL',
+                           'MONTO_EN_RIESGO'], 'MONTO_EN_RIESGO'),
+    ('Montos inválidos', ['VALOR_REAL', 'VALOR_MANIFIESTO'], None),
+    ('Sobrecobros', ['PIEZAS_CALC', 'VALOR_REAL', 'COSTO_ESPERADO', 'SOBRECOBRO'], 'SOBRECOBRO'),
+]
+
+
+def _excepciones(df_final: pd.DataFrame) -> Dict[str, pd.Series]:
+    """Máscara de filas de cada tabla de excepciones (solo las que aplican a df_final)"""
+    mascaras = {'Guías sin factura': df_final['LINEAS_FACTURA'] == 0}
+    if 'DUPLICADOS_EXACTOS' in df_final:
+        mascaras['Cobros duplicados'] = (df_final['DUPLICADOS_EXACTOS'] > 0) | (df_final['DUPLICADOS_CERCANOS'] > 0)
+    if 'MONTO_INVALIDO' in df_final:
+        mascaras['Montos inválidos'] = df_final['MONTO_INVALIDO'].astype(bool)
+    if 'ALERTA_SOBRECOBRO' in df_final:
+        mascaras['Sobrecobros'] = df_final['ALERTA_SOBRECOBRO'].astype(bool)
+    return mascaras
+
+
+def _texto(valor: Any) -> str:
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return ''
+    if isinstance(valor, float):
+        return f"{valor:,.2f}"
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return f"{valor:,}"
+    return str(valor)
+
+
+def _filas(df: pd.DataFrame, filas_por_bloque: int) -> Iterator[Tuple[str, ...]]:
+    """Filas de df como textos, convertidas bloque por bloque"""
+    for desde in range(0, len(df), filas_por_bloque):
+        bloque = df.iloc[desde:desde + filas_por_bloque]
+        columnas = [bloque[c].astype(object).tolist() for c in bloque.columns]
+        for valores in zip(*columnas):
+            yield tuple(_texto(v) for v in valores)
+
+
+class _Lienzo:
+    """Canvas con encabezado y número de página; abre una página nueva cuando no hay espacio"""
+
+    def __init__(self, destino, titulo: str):
+        self.tamano = landscape(A4)
+        self.canvas = canvas.Canvas(destino, pagesize=self.tamano, pageCompression=1)
+        self.canvas.setTitle(titulo)
+        self.titulo = titulo
+        self.pagina = 0
+        self.y = 0.0
+        self._nueva_pagina()
+
+    @property
+    def ancho(self) -> float:
+        return self.tamano[0] - 2 * _MARGEN
+
+    def _nueva_pagina(self) -> None:
+        if self.pagina:
+            self.canvas.showPage()
+        self.pagina += 1
+        alto = self.tamano[1]
+        self.canvas.setFont('Helvetica', 7)
+        self.canvas.setFillColor(colors.grey)
+        self.canvas.drawString(_MARGEN, alto - 20, self.titulo)
+        self.canvas.drawRightString(self.tamano[0] - _MARGEN, 18, f"Página {self.pagina}")
+        self.canvas.setFillColor(colors.black)
+        self.y = alto - _MARGEN - 10
+
+    def asegurar(self, alto: float) -> bool:
+        """True si hubo que abrir una página nueva para tener alto disponible"""
+        if self.y - alto < _MARGEN:
+            self._nueva_pagina()
+            return True
+        return False
+
+    def titulo_seccion(self, texto: str) -> None:
+        self.asegurar(3 * _ALTO_FILA)
+        self.y -= 8
+        self.canvas.setFont('Helvetica-Bold', 12)
+        self.canvas.drawString(_MARGEN, self.y, texto)
+        self.y -= 16
+
+    def texto(self, texto: str, tamano: int = 9) -> None:
+        self.asegurar(_ALTO_FILA)
+        self.canvas.setFont('Helvetica', tamano)
+        self.canvas.drawString(_MARGEN, self.y, texto)
+        self.y -= _ALTO_FILA
+
+    def _fila(self, valores: Sequence[str], anchos: Sequence[float], negrita: bool = False) -> None:
+        if negrita:
+            self.canvas.setFillColor(_GRIS)
+            self.canvas.rect(_MARGEN, self.y - 3, sum(anchos), _ALTO_FILA, stroke=0, fill=1)
+            self.canvas.setFillColor(colors.black)
+        self.canvas.setFont('Helvetica-Bold' if negrita else 'Helvetica', _TAMANO_LETRA)
+        x = _MARGEN
+        for valor, ancho in zip(valores, anchos):
+            # Recorte por caracteres: el ancho medio de Helvetica es ~0,5 del tamaño de letra
+            maximo = max(int(ancho / (_TAMANO_LETRA * 0.5)) - 1, 1)
+            self.canvas.drawString(x + 2, self.y, valor if len(valor) <= maximo else valor[:maximo - 1] + '…')
+            x += ancho
+        self.y -= _ALTO_FILA
+
+    def tabla(self, columnas: Sequence[str], filas: Iterator[Sequence[str]],
+              avance: Optional[Callable[[int], None]] = None) -> int:
+        """Dibuja las filas a medida que llegan, repitiendo el encabezado en cada página"""
+        anchos = [self.ancho / len(columnas)] * len(columnas)
+        self.asegurar(2 * _ALTO_FILA)
+        self._fila(columnas, anchos, negrita=True)
+        total = 0
+        for fila in filas:
+            if self.asegurar(_ALTO_FILA):
+                self._fila(columnas, anchos, negrita=True)
+            self._fila(fila, anchos)
+            total += 1
+            if avance is not None and total % FILAS_POR_BLOQUE == 0:
+                avance(FILAS_POR_BLOQUE)
+        if avance is not None:
+            avance(total % FILAS_POR_BLOQUE)
+        return total
+
+    def guardar(self) -> None:
+        self.canvas.save()
+
+
+def generar_informe(df_final: pd.DataFrame, resumen: Dict[str, Any], destino,
+                    col_guia: Optional[str] = None, titulo: str = "Informe de Reconciliación",
+                    progreso: Optional[Callable[[float], None]] = None,
+                    filas_por_bloque: int = FILAS_POR_BLOQUE) -> int:
+    """
+    PDF con el resumen, el desglose por tipo de tienda y las tablas de excepciones.
+    Las tablas se dibujan página por página desde bloques de df_final, sin armar el
+    documento completo en memoria. Devuelve el número de páginas.
+    """
+    lienzo = _Lienzo(destino, titulo)
+    mascaras = _excepciones(df_final)
+    total = max(int(sum(m.sum() for m in mascaras.values())), 1)
+    hechas = 0
+
+    def avance(filas: int) -> None:
+        nonlocal hechas
+        hechas += filas
+        if progreso is not None:
+            progreso(min(hechas / total, 1.0))
+
+    lienzo.texto(f"Generado el {datetime.now():%Y-%m-%d %H:%M}", tamano=8)
+
+    lienzo.titulo_seccion("Resumen")
+    lienzo.tabla(['Métrica', 'Valor'],
+                 iter([(ETIQUETAS_RESUMEN[c], _texto(resumen[c])) for c in ETIQUETAS_RESUMEN if c in resumen]))
+
+    lienzo.titulo_seccion("Por tipo de tienda")
+    por_tipo = resumen_por_tipo(df_final)
+    lienzo.tabla(list(por_tipo.columns), _filas(por_tipo, filas_por_bloque))
+
+    guia = [col_guia] if col_guia in df_final else ['GUIA_CLEAN']
+    for nombre, columnas, orden in _EXCEPCIONES:
+        if nombre not in mascaras:
+            continue
+        columnas = guia + ['DESTINATARIO_NORM', 'TIPO_TIENDA'] + [c for c in columnas if c in df_final]
+        filas = df_final.loc[mascaras[nombre], columnas]
+        if orden is not None:
+            filas = filas.sort_values(orden, ascending=False, kind='stable')
+        lienzo.titulo_seccion(f"{nombre} ({len(filas):,})")
+        if filas.empty:
+            lienzo.texto("Sin casos.")
+            continue
+        lienzo.tabla(columnas, _filas(filas, filas_por_bloque), avance)
+
+    paginas = lienzo.pagina
+    lienzo.guardar()
+    if progreso is not None:
+        progreso(1.0)
+    return paginas
+
+
+class GeneradorInformes:
+    """
+    Genera informes en un hilo de fondo (la interfaz consulta el avance) y los deja
+    en disco por llave, así las descargas repetidas reusan el mismo PDF.
+    """
+
+    def __init__(self, directorio: str = DIRECTORIO_INFORMES, max_mb: int = MAX_MB_INFORMES, trabajadores: int = 1):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_mb * 1024 ** 2
+        self._ejecutor = ThreadPoolExecutor(max_workers=trabajadores, thread_name_prefix='informes')
+        # Solo trabajos en curso o fallidos: al quedar el PDF en disco la entrada se borra
+        self._trabajos: "OrderedDict[str, Future]" = OrderedDict()
+        self._progreso: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def ruta(self, llave: str) -> Path:
+        return self.directorio / f"{llave}.pdf"
+
+    def solicitar(self, llave: str, df_final: pd.DataFrame, resumen: Dict[str, Any], **opciones) -> None:
+        """Encola el informe si no está en disco ni en curso"""
+        with self._lock:
+            trabajo = self._trabajos.get(llave)
+            if self.ruta(llave).exists() or (trabajo is not None and not trabajo.done()):
+                return
+            self._progreso[llave] = 0.0
+            self._trabajos.pop(llave, None)
+            self._trabajos[llave] = self._ejecutor.submit(self._generar, llave, df_final, resumen, opciones)
+            self._podar()
+
+    def _podar(self) -> None:
+        """Olvida los fallidos más antiguos por encima de MAX_TRABAJOS_FALLIDOS (con el lock tomado)"""
+        fallidos = [llave for llave, trabajo in self._trabajos.items() if trabajo.done()]
+        for llave in fallidos[:max(0, len(fallidos) - MAX_TRABAJOS_FALLIDOS)]:
+            del self._trabajos[llave]
+
+    def _generar(self, llave: str, df_final: pd.DataFrame, resumen: Dict[str, Any], opciones: Dict[str, Any]) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        os.close(fd)
+        try:
+            paginas = generar_informe(df_final, resumen, temporal,
+                                      progreso=lambda avance: self._progreso.__setitem__(llave, avance), **opciones)
+            os.replace(temporal, self.ruta(llave))
+        except Exception:
+            Path(temporal).unlink(missing_ok=True)
+            logger.exception(f"No se pudo generar el informe {llave[:12]}")
+            with self._lock:
+                self._progreso.pop(llave, None)
+            raise
+        # El resultado ya está en disco: estado() lo encuentra sin el trabajo
+        with self._lock:
+            self._trabajos.pop(llave, None)
+            self._progreso.pop(llave, None)
+        logger.info(f"Informe {llave[:12]} generado: {paginas} páginas")
+        self._desalojar()
+
+    def estado(self, llave: str) -> Dict[str, Any]:
+        """'listo', 'generando', 'error' o 'sin_solicitar', con el avance (0 a 1) y el error si lo hubo"""
+        ruta = self.ruta(llave)
+        if ruta.exists():
+            os.utime(ruta)
+            return {'estado': 'listo', 'progreso': 1.0, 'ruta': str(ruta), 'error': None}
+        trabajo = self._trabajos.get(llave)
+        if trabajo is None:
+            return {'estado': 'sin_solicitar', 'progreso': 0.0, 'ruta': None, 'error': None}
+        if trabajo.done() and trabajo.exception() is not None:
+            return {'estado': 'error', 'progreso': 0.0, 'ruta': None, 'error': str(trabajo.exception())}
+        return {'estado': 'generando', 'progreso': self._progreso.get(llave, 0.0), 'ruta': None, 'error': None}
+
+    def _entradas(self) -> List[Path]:
+        return sorted(self.directorio.glob("*.pdf"), key=lambda p: p.stat().st_mtime)
+
+    def _desalojar(self) -> None:
+        entradas = self._entradas()
+        total = sum(p.stat().st_size for p in entradas)
+        for entrada in entradas:
+            if total <= self.max_bytes:
+                break
+            total -= entrada.stat().st_size
+            entrada.unlink(missing_ok=True)
+            logger.info(f"Informes: desalojado {entrada.name}")
+
+    def limpiar(self) -> int:
+        """Elimina los informes en disco y devuelve cuántos había"""
+        if not self.directorio.exists():
+            return 0
+        entradas = list(self.directorio.glob("*.pdf"))
+        for entrada in entradas:
+            entrada.unlink(missing_ok=True)
+        with self._lock:
+            self._trabajos = OrderedDict((llave, t) for llave, t in self._trabajos.items() if not t.done())
+        return len(entradas)
+
+
+# Instancia compartida por todo el proceso (un solo hilo de fondo)
+GENERADOR_INFORMES = GeneradorInformes()
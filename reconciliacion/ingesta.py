@@ -0,0 +1,370 @@
+"""Lectura de manifiestos y facturas (rutas o archivos subidos en Streamlit)."""
+import codecs
+import csv
+import html
+import os
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .facturas_pdf import leer_tabla_pdf
+
+try:
+    from python_calamine import CalamineWorkbook
+    CALAMINE_DISPONIBLE = True
+except ImportError:
+    CALAMINE_DISPONIBLE = False
+
+EXTENSIONES_EXCEL = ('.xlsx', '.xlsm')
+EXTENSIONES_EXCEL_ANTIGUO = ('.xls',)
+EXTENSIONES_PDF = ('.pdf',)
+
+FORMATO_XLSX = 'xlsx'
+FORMATO_XLS = 'xls'
+FORMATO_CSV = 'csv'
+FORMATO_PDF = 'pdf'
+
+# Firmas de archivo: xlsx es un zip, xls un documento OLE2
+_FIRMA_ZIP = b'PK\x03\x04'
+_FIRMA_OLE2 = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_FIRMA_PDF = b'%PDF-'
+
+SEPARADORES_CSV = ',;\t|'
+_TAMANO_MUESTRA = 64 * 1024
+
+
+def _nombre(origen) -> str:
+    """Nombre del archivo, tanto para rutas como para objetos subidos"""
+    return str(getattr(origen, 'name', origen)).lower()
+
+
+def _rebobinar(origen) -> None:
+    """Vuelve al inicio un archivo subido para poder leerlo otra vez"""
+    if hasattr(origen, 'seek'):
+        origen.seek(0)
+
+
+def _leer_muestra(origen, tamano: int = _TAMANO_MUESTRA) -> bytes:
+    if hasattr(origen, 'read'):
+        _rebobinar(origen)
+        muestra = origen.read(tamano)
+        _rebobinar(origen)
+        return muestra
+    with open(origen, 'rb') as archivo:
+        return archivo.read(tamano)
+
+
+def tamano_bytes(origen) -> int:
+    """Tamaño en bytes de una ruta o de un archivo subido"""
+    if hasattr(origen, 'size'):
+        return int(origen.size)
+    if hasattr(origen, 'seek'):
+        actual = origen.tell()
+        origen.seek(0, os.SEEK_END)
+        tamano = origen.tell()
+        origen.seek(actual)
+        return tamano
+    return os.path.getsize(origen)
+
+
+def detectar_formato(origen) -> str:
+    """
+    Formato real según la firma del archivo; muchos transportistas envían CSV o HTML
+    con extensión .xls, por eso la extensión solo se usa si no hay firma reconocible.
+    """
+    cabecera = _leer_muestra(origen, 8)
+    if cabecera.startswith(_FIRMA_ZIP):
+        return FORMATO_XLSX
+    if cabecera.startswith(_FIRMA_OLE2):
+        return FORMATO_XLS
+    if cabecera.startswith(_FIRMA_PDF):
+        return FORMATO_PDF
+    if cabecera:
+        return FORMATO_CSV
+    if _nombre(origen).endswith(EXTENSIONES_EXCEL):
+        return FORMATO_XLSX
+    return FORMATO_XLS if _nombre(origen).endswith(EXTENSIONES_EXCEL_ANTIGUO) else FORMATO_CSV
+
+
+def es_excel(origen) -> bool:
+    return detectar_formato(origen) in (FORMATO_XLSX, FORMATO_XLS)
+
+
+def detectar_csv(origen) -> Tuple[str, str]:
+    """Separador y codificación de un CSV a partir de sus primeros 64 KB"""
+    muestra = _leer_muestra(origen)
+    if muestra.startswith(codecs.BOM_UTF8):
+        codificacion = 'utf-8-sig'
+    else:
+        try:
+            # Decodificador incremental: la muestra puede cortar un carácter multibyte
+            codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+            codificacion = 'utf-8'
+        except UnicodeDecodeError:
+            codificacion = 'latin-1'
+
+    texto = muestra.decode(codificacion, errors='ignore')
+    # Solo líneas completas: la última puede estar cortada
+    lineas = texto.splitlines()[:-1] or texto.splitlines()
+    try:
+        separador = csv.Sniffer().sniff('\n'.join(lineas[:50]), delimiters=SEPARADORES_CSV).delimiter
+    except csv.Error:
+        separador = ','
+    return separador, codificacion
+
+
+def _encabezados_excel(fila) -> List[str]:
+    return [_a_texto(c) if c not in (None, '') else f"Unnamed: {i}" for i, c in enumerate(fila)]
+
+
+def _a_texto(valor):
+    """Texto de una celda tal como lo muestra Excel (1001, no 1001.0)"""
+    if isinstance(valor, str):
+        return valor
+    if pd.isna(valor):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+def _como_texto(df: pd.DataFrame, columnas_texto: Iterable[str]) -> pd.DataFrame:
+    """Fuerza columnas a texto para que la llave no dependa del tipo inferido en cada bloque"""
+    for col in columnas_texto:
+        if col in df.columns:
+            df[col] = df[col].map(_a_texto)
+    return df
+
+
+def _proyeccion(encabezados: List[str], columnas: Optional[Sequence[str]]) -> Tuple[List[str], Optional[itemgetter]]:
+    """Columnas a conservar y el extractor de sus posiciones en cada fila"""
+    if columnas is None:
+        return encabezados, None
+    faltantes = [c for c in columnas if c not in encabezados]
+    if faltantes:
+        raise ValueError(f"Columnas no encontradas en el archivo: {', '.join(faltantes)}")
+    posiciones = [encabezados.index(c) for c in columnas]
+    extraer = itemgetter(*posiciones)
+    if len(posiciones) == 1:
+        return list(columnas), lambda fila: (extraer(fila),)
+    return list(columnas), extraer
+
+
+def _filas_excel(origen) -> Iterator[Sequence]:
+    """
+    Filas de la primera hoja: calamine si está instalado (varias veces más rápido),
+    si no openpyxl en modo read_only. Las celdas vacías pueden llegar como None o ''.
+    """
+    if CALAMINE_DISPONIBLE:
+        libro = (CalamineWorkbook.from_filelike(origen) if hasattr(origen, 'read')
+                 else CalamineWorkbook.from_path(str(origen)))
+        yield from libro.get_sheet_by_index(0).iter_rows()
+        return
+
+    from openpyxl import load_workbook
+
+    libro = load_workbook(origen, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+def _armar_bloque(filas: List[Sequence], encabezados: List[str], columnas_texto: Iterable[str]) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(filas, columns=encabezados)
+    if CALAMINE_DISPONIBLE:
+        # calamine devuelve '' en las celdas vacías; openpyxl devuelve None
+        df = df.replace('', None).infer_objects()
+    return _como_texto(df, columnas_texto)
+
+
+def _bloques_excel(origen, filas_por_bloque: int, columnas_texto: Iterable[str],
+                   columnas: Optional[Sequence[str]]) -> Iterator[pd.DataFrame]:
+    filas = _filas_excel(origen)
+    encabezados, extraer = _proyeccion(_encabezados_excel(next(filas, ())), columnas)
+    bloque = []
+    emitidos = 0
+    for fila in filas:
+        bloque.append(fila if extraer is None else extraer(fila))
+        if len(bloque) >= filas_por_bloque:
+            yield _armar_bloque(bloque, encabezados, columnas_texto)
+            emitidos += 1
+            bloque = []
+    # Siempre se emite al menos un bloque para conservar las columnas
+    if bloque or not emitidos:
+        yield _armar_bloque(bloque, encabezados, columnas_texto)
+
+
+def leer_bloques(origen, filas_por_bloque: int = 100_000,
+                 columnas_texto: Iterable[str] = (),
+                 columnas: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Lee un archivo Excel/CSV en bloques de filas_por_bloque filas.
+    Con columnas solo se extraen esas columnas (en ese orden).
+    """
+    columnas_texto = list(columnas_texto)
+    if columnas is not None:
+        columnas = list(dict.fromkeys(columnas))
+    formato = detectar_formato(origen)
+    _rebobinar(origen)
+
+    if formato == FORMATO_CSV:
+        separador, codificacion = detectar_csv(origen)
+        bloques = pd.read_csv(origen, sep=separador, encoding=codificacion, usecols=columnas,
+                              chunksize=filas_por_bloque, dtype={c: str for c in columnas_texto})
+        # usecols respeta el orden del archivo, no el pedido
+        yield from (bloques if columnas is None else (bloque[columnas] for bloque in bloques))
+    elif formato == FORMATO_PDF:
+        # Las tablas del PDF se extraen completas (en paralelo y con caché) y luego se proyectan
+        df = leer_tabla_pdf(origen)
+        if columnas is not None:
+            df = df[_proyeccion(list(df.columns), columnas)[0]]
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            yield df.iloc[inicio:inicio + filas_por_bloque]
+    elif formato == FORMATO_XLS and not CALAMINE_DISPONIBLE:
+        # openpyxl no lee .xls: lectura completa con xlrd
+        df = _como_texto(pd.read_excel(origen, usecols=columnas,
+                                       dtype={c: object for c in columnas_texto}), columnas_texto)
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            yield df.iloc[inicio:inicio + filas_por_bloque]
+    else:
+        yield from _bloques_excel(origen, filas_por_bloque, columnas_texto, columnas)
+
+
+def leer_tabla(origen, columnas_texto: Iterable[str] = (),
+               columnas: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Lee el archivo completo en memoria con las mismas reglas que leer_bloques"""
+    bloques = list(leer_bloques(origen, filas_por_bloque=1_000_000, columnas_texto=columnas_texto,
+                                columnas=columnas))
+    return bloques[0] if len(bloques) == 1 else pd.concat(bloques, ignore_index=True)
+
+
+_NS_XLSX = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PAQUETE = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+def _ruta_primera_hoja(libro: zipfile.ZipFile) -> str:
+    """Ruta dentro del zip de la primera hoja del libro"""
+    hoja = None
+    for _, elemento in iterparse(libro.open('xl/workbook.xml')):
+        if elemento.tag == f'{_NS_XLSX}sheet':
+            hoja = elemento.get(f'{_NS_REL}id')
+            break
+    for _, elemento in iterparse(libro.open('xl/_rels/workbook.xml.rels')):
+        if elemento.tag == f'{_NS_PAQUETE}Relationship' and elemento.get('Id') == hoja:
+            destino = elemento.get('Target')
+            return destino.lstrip('/') if destino.startswith('/') else posixpath.normpath(posixpath.join('xl', destino))
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _columna_celda(referencia: str) -> int:
+    """Índice (desde 0) de la columna de una referencia como 'AB12'"""
+    indice = 0
+    for letra in re.match(r'[A-Z]+', referencia).group():
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+_PATRON_SI = re.compile(rb'<(?:\w+:)?si\b')
+_PATRON_T = re.compile(rb'<(?:\w+:)?t(?:\s[^>]*)?>(.*?)</(?:\w+:)?t>', re.S)
+_PATRON_FONETICO = re.compile(rb'<(?:\w+:)?rPh\b.*?</(?:\w+:)?rPh>', re.S)
+
+
+def _textos_compartidos(libro: zipfile.ZipFile, indices: Iterable[int]) -> Dict[int, str]:
+    """
+    Textos compartidos de los índices pedidos. La tabla se corta con re.split hasta el
+    mayor índice y solo se decodifican los necesarios: recorrerla con un parser XML
+    tarda segundos en tablas de cientos de miles de textos.
+    """
+    indices = set(indices)
+    if not indices or 'xl/sharedStrings.xml' not in libro.namelist():
+        return {}
+    # El primer trozo es la cabecera <sst ...>; cada siguiente empieza en un <si>
+    items = _PATRON_SI.split(libro.read('xl/sharedStrings.xml'), maxsplit=max(indices) + 1)[1:]
+    textos = {}
+    for indice in indices:
+        if indice < len(items):
+            cuerpo = _PATRON_FONETICO.sub(b'', items[indice])
+            textos[indice] = html.unescape(b''.join(_PATRON_T.findall(cuerpo)).decode('utf-8'))
+    return textos
+
+
+def _muestra_xlsx(origen, filas: int) -> Tuple[List[str], List[List[Optional[str]]]]:
+    """
+    Encabezados y primeras filas (como texto) leyendo el XML de la hoja en streaming.
+    openpyxl y calamine cargan antes todos los textos compartidos o la hoja completa,
+    lo que en archivos grandes tarda segundos.
+    """
+    celdas = []
+    with zipfile.ZipFile(origen) as libro:
+        for _, elemento in iterparse(libro.open(_ruta_primera_hoja(libro))):
+            if elemento.tag != f'{_NS_XLSX}row':
+                continue
+            fila = {}
+            for celda in elemento.iter(f'{_NS_XLSX}c'):
+                tipo = celda.get('t')
+                if tipo == 'inlineStr':
+                    valor = ''.join(t.text or '' for t in celda.iter(f'{_NS_XLSX}t'))
+                else:
+                    v = celda.find(f'{_NS_XLSX}v')
+                    valor = v.text if v is not None else None
+                if valor is not None:
+                    fila[_columna_celda(celda.get('r'))] = (tipo, valor)
+            elemento.clear()
+            celdas.append(fila)
+            if len(celdas) > filas:
+                break
+
+        compartidos = _textos_compartidos(libro, (int(v) for fila in celdas for t, v in fila.values() if t == 's'))
+
+    def texto(tipo, valor):
+        if tipo == 's':
+            return compartidos[int(valor)]
+        if tipo is None or tipo == 'n':
+            return _a_texto(float(valor))
+        return valor
+
+    ancho = max((max(fila) + 1 for fila in celdas if fila), default=0)
+    tabla = [[texto(*fila[i]) if i in fila else None for i in range(ancho)] for fila in celdas]
+    encabezados = _encabezados_excel(tabla[0]) if tabla else []
+    return encabezados, tabla[1:]
+
+
+def leer_muestra(origen, filas: int = 200) -> pd.DataFrame:
+    """Primeras filas del archivo, todas como texto, sin recorrer el resto"""
+    formato = detectar_formato(origen)
+    _rebobinar(origen)
+    if formato == FORMATO_CSV:
+        separador, codificacion = detectar_csv(origen)
+        muestra = pd.read_csv(origen, sep=separador, encoding=codificacion, nrows=filas, dtype=str)
+    elif formato == FORMATO_XLSX:
+        encabezados, tabla = _muestra_xlsx(origen, filas)
+        muestra = pd.DataFrame.from_records(tabla, columns=encabezados)
+    elif formato == FORMATO_PDF:
+        muestra = leer_tabla_pdf(origen).head(filas)
+    else:
+        muestra = pd.read_excel(origen, nrows=filas, dtype=str, engine='calamine' if CALAMINE_DISPONIBLE else None)
+    _rebobinar(origen)
+    muestra.columns = [str(c) for c in muestra.columns]
+    return muestra
+
+
+def leer_encabezados(origen) -> List[str]:
+    """Devuelve solo los nombres de columna del archivo"""
+    return list(leer_muestra(origen, filas=0).columns)
+
+
+def firma_lectura(origen, columnas: Optional[Sequence[str]] = None,
+                  columnas_texto: Iterable[str] = ()) -> Tuple:
+    """Identifica una lectura (archivo + columnas) para reutilizar el DataFrame ya parseado"""
+    archivo = getattr(origen, 'file_id', None) or (
+        _nombre(origen), tamano_bytes(origen),
+        None if hasattr(origen, 'read') else os.path.getmtime(origen)
+    )
+    return (archivo, tuple(columnas) if columnas is not None else None, tuple(columnas_texto))
@@ -0,0 +1,225 @@
+"""Reconciliación por lotes: empareja manifiestos y facturas por nombre y los cruza en paralelo."""
+import io
+import logging
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .duplicados import COLUMNAS_DUPLICADOS
+from .ingesta import leer_tabla, tamano_bytes
+from .mapeo_columnas import (MEMORIA_MAPEOS, ROLES_FACTURAS, ROLES_MANIFIESTO,
+                             MemoriaMapeos, sugerir_mapeo)
+from .motor import combinar_resumenes, reconciliar, resumir_reconciliacion
+from .tiendas import DimensionTiendas
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_LOTE = ('.csv', '.xlsx', '.xls', '.pdf')
+
+# Palabras del nombre que identifican el tipo de archivo; el resto del nombre es la llave del par
+PATRON_MANIFIESTO = re.compile(r'manifiestos?|manifests?', re.IGNORECASE)
+PATRON_FACTURAS = re.compile(r'facturas?|invoices?', re.IGNORECASE)
+
+# Columnas comunes a todos los transportistas en el resultado consolidado (más GUIA, la guía original)
+COLUMNAS_CONSOLIDADO = ['GUIA_CLEAN', 'DESTINATARIO_NORM', 'TIPO_TIENDA', 'PIEZAS_CALC',
+                        'VALOR_REAL', 'VALOR_MANIFIESTO', 'MONTO_INVALIDO', *COLUMNAS_DUPLICADOS]
+
+# Correspondencia entre los roles inferidos y los argumentos de reconciliar
+_ARGUMENTOS_MANIFIESTO = {'guia': 'col_guia_m', 'destinatario': 'col_dest_m',
+                          'valor': 'col_valor_m', 'piezas': 'col_piezas_m'}
+_ARGUMENTOS_FACTURAS = {'guia': 'col_guia_f', 'valor': 'col_valor_f'}
+
+
+def nombre_archivo(origen) -> str:
+    """Nombre sin directorio de una ruta o de un archivo subido"""
+    return os.path.basename(str(getattr(origen, 'name', origen)))
+
+
+def llave_par(nombre: str) -> Optional[Tuple[str, str]]:
+    """
+    Tipo ('manifiesto' o 'facturas') y llave de emparejamiento de un nombre de archivo.
+    SERVIENTREGA_2024-03_MANIFIESTO.xlsx y facturas servientrega 2024-03.csv
+    comparten la llave SERVIENTREGA_2024_03.
+    """
+    base = os.path.splitext(nombre)[0]
+    for tipo, patron in (('manifiesto', PATRON_MANIFIESTO), ('facturas', PATRON_FACTURAS)):
+        if patron.search(base):
+            llave = re.sub(r'[\W_]+', '_', patron.sub(' ', base)).strip('_').upper()
+            return tipo, llave
+    return None
+
+
+def transportista_par(llave: str) -> str:
+    """Transportista de un par: la primera palabra de su llave (SERVIENTREGA_2024_03)"""
+    return llave.split('_')[0]
+
+
+def listar_directorio(ruta: str) -> List[str]:
+    """Archivos de manifiestos y facturas de un directorio (sin recorrer subdirectorios)"""
+    return sorted(
+        os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+        if nombre.lower().endswith(EXTENSIONES_LOTE) and os.path.isfile(os.path.join(ruta, nombre))
+    )
+
+
+def emparejar_archivos(archivos: Sequence[Any]) -> Tuple[List[Tuple[str, Any, Any]], List[str]]:
+    """Pares (llave, manifiesto, facturas) ordenados por llave y nombres que quedaron sin pareja"""
+    grupos: Dict[str, Dict[str, Any]] = {}
+    sin_pareja = []
+    for archivo in archivos:
+        nombre = nombre_archivo(archivo)
+        identificado = llave_par(nombre)
+        if identificado is None:
+            sin_pareja.append(nombre)
+            continue
+        tipo, llave = identificado
+        grupo = grupos.setdefault(llave, {})
+        if tipo in grupo:
+            logger.warning(f"Lote: {nombre} repite el {tipo} de {llave}, se ignora")
+            sin_pareja.append(nombre)
+            continue
+        grupo[tipo] = archivo
+
+    pares = []
+    for llave in sorted(grupos):
+        grupo = grupos[llave]
+        if 'manifiesto' in grupo and 'facturas' in grupo:
+            pares.append((llave, grupo['manifiesto'], grupo['facturas']))
+        else:
+            sin_pareja.extend(nombre_archivo(a) for a in grupo.values())
+    return pares, sin_pareja
+
+
+def resolver_columnas(manifiesto, facturas,
+                      memoria: MemoriaMapeos = MEMORIA_MAPEOS) -> Dict[str, str]:
+    """Columnas de un par según el mapeo recordado o inferido; ValueError si falta alguna"""
+    mapeo_m, _ = sugerir_mapeo(manifiesto, ROLES_MANIFIESTO, memoria=memoria)
+    mapeo_f, _ = sugerir_mapeo(facturas, ROLES_FACTURAS, memoria=memoria)
+    columnas = {}
+    for mapeo, argumentos, origen in ((mapeo_m, _ARGUMENTOS_MANIFIESTO, manifiesto),
+                                      (mapeo_f, _ARGUMENTOS_FACTURAS, facturas)):
+        faltantes = [rol for rol, columna in mapeo.items() if columna is None]
+        if faltantes:
+            raise ValueError(f"{nombre_archivo(origen)}: no se identificó la columna de {', '.join(faltantes)}")
+        columnas.update({argumentos[rol]: columna for rol, columna in mapeo.items()})
+    return columnas
+
+
+def _transportable(origen):
+    """Las rutas viajan tal cual; los archivos subidos se copian a un BytesIO serializable"""
+    if isinstance(origen, (str, os.PathLike)):
+        return os.fspath(origen)
+    datos = io.BytesIO(origen.getvalue())
+    datos.name = nombre_archivo(origen)
+    return datos
+
+
+def _reconciliar_par(llave: str, manifiesto, facturas, columnas: Dict[str, str],
+                     separador_decimal: Optional[str], incluir_detalle: bool,
+                     ruta_tiendas: Optional[str]) -> Dict[str, Any]:
+    """Trabajo de cada proceso: lee el par con proyección, lo cruza y lo resume"""
+    inicio = time.perf_counter()
+    df_m = leer_tabla(manifiesto, columnas_texto=[columnas['col_guia_m']],
+                      columnas=[columnas[c] for c in _ARGUMENTOS_MANIFIESTO.values()])
+    df_f = leer_tabla(facturas, columnas_texto=[columnas['col_guia_f']],
+                      columnas=[columnas[c] for c in _ARGUMENTOS_FACTURAS.values()])
+    # Un transportista sin patrones de guía propios usa los generales
+    # La dimensión de tiendas se lee sin escribir: solo el proceso de la aplicación la modifica
+    tiendas = DimensionTiendas(ruta_tiendas, solo_lectura=True) if ruta_tiendas else None
+    df_final = reconciliar(df_m, df_f, separador_decimal=separador_decimal,
+                           transportista=transportista_par(llave), tiendas=tiendas, **columnas)
+    detalle = None
+    if incluir_detalle:
+        # Cada transportista escribe la guía a su manera: se conserva como texto junto a la llave
+        detalle = df_final[COLUMNAS_CONSOLIDADO]
+        detalle.insert(0, 'GUIA', df_final[columnas['col_guia_m']].astype(str))
+    return {
+        'par': llave,
+        'resumen': resumir_reconciliacion(df_final),
+        'detalle': detalle,
+        'segundos': time.perf_counter() - inicio,
+    }
+
+
+def _fila_par(llave: str, manifiesto, facturas, resultado: Optional[Dict[str, Any]],
+              error: Optional[str]) -> Dict[str, Any]:
+    fila = {'par': llave, 'manifiesto': nombre_archivo(manifiesto), 'facturas': nombre_archivo(facturas)}
+    if resultado is not None:
+        fila.update(resultado['resumen'], segundos=resultado['segundos'])
+    fila['error'] = error
+    return fila
+
+
+def reconciliar_lote(pares: Sequence[Tuple[str, Any, Any]],
+                     columnas: Optional[Dict[str, str]] = None,
+                     separador_decimal: Optional[str] = None,
+                     procesos: Optional[int] = None,
+                     incluir_detalle: bool = True,
+                     ruta_tiendas: Optional[str] = None,
+                     al_terminar: Optional[Callable[[Dict[str, Any]], None]] = None
+                     ) -> Tuple[Optional[pd.DataFrame], Dict[str, Any], pd.DataFrame]:
+    """
+    Reconcilia los pares en un pool de procesos.
+    Devuelve (df_consolidado con la columna PAR, resumen total, resumen por par).
+    Si columnas es None, cada par usa su mapeo recordado o inferido. Un par con
+    error queda registrado en su fila y no detiene el resto del lote.
+    Con ruta_tiendas, los tipos de tienda salen de esa dimensión (solo lectura).
+    al_terminar recibe la fila de cada par al terminar, también la de los que fallan.
+    """
+    filas: Dict[str, Dict[str, Any]] = {}
+    detalles: Dict[str, pd.DataFrame] = {}
+    trabajos = []
+    for llave, manifiesto, facturas in pares:
+        try:
+            columnas_par = columnas if columnas is not None else resolver_columnas(manifiesto, facturas)
+        except Exception as e:
+            filas[llave] = _fila_par(llave, manifiesto, facturas, None, str(e))
+            if al_terminar is not None:
+                al_terminar(filas[llave])
+            continue
+        trabajos.append((llave, manifiesto, facturas, columnas_par))
+
+    # Los pares más grandes primero: el último en terminar no deja núcleos ociosos
+    trabajos.sort(key=lambda t: tamano_bytes(t[1]) + tamano_bytes(t[2]), reverse=True)
+
+    if trabajos:
+        procesos = max(1, min(procesos or os.cpu_count() or 1, len(trabajos)))
+        logger.info(f"Lote: {len(trabajos)} pares en {procesos} procesos")
+        # spawn: no se heredan los hilos del servidor de Streamlit
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            futuros = {
+                pool.submit(_reconciliar_par, llave, _transportable(manifiesto), _transportable(facturas),
+                            columnas_par, separador_decimal, incluir_detalle,
+                            ruta_tiendas): (llave, manifiesto, facturas)
+                for llave, manifiesto, facturas, columnas_par in trabajos
+            }
+            for futuro in as_completed(futuros):
+                llave, manifiesto, facturas = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    logger.error(f"Lote: falló el par {llave}: {e}")
+                    filas[llave] = _fila_par(llave, manifiesto, facturas, None, str(e))
+                else:
+                    filas[llave] = _fila_par(llave, manifiesto, facturas, resultado, None)
+                    if resultado['detalle'] is not None:
+                        detalles[llave] = resultado['detalle']
+                if al_terminar is not None:
+                    al_terminar(filas[llave])
+
+    resumen_pares = pd.DataFrame([filas[llave] for llave, _, _ in pares])
+    resumen = combinar_resumenes(filas[llave] for llave, _, _ in pares if filas[llave]['error'] is None)
+
+    df_consolidado = None
+    if incluir_detalle and detalles:
+        df_consolidado = pd.concat(
+            [detalles[llave].assign(PAR=llave) for llave, _, _ in pares if llave in detalles],
+            ignore_index=True
+        )
+    return df_consolidado, resumen, resumen_pares
@@ -0,0 +1,182 @@
+"""Inferencia del mapeo de columnas (guía, destinatario, valor, piezas) a partir de una muestra."""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from .ingesta import leer_muestra
+from .normalizacion import normalizar_textos
+
+logger = logging.getLogger(__name__)
+
+ROL_GUIA = 'guia'
+ROL_DESTINATARIO = 'destinatario'
+ROL_VALOR = 'valor'
+ROL_PIEZAS = 'piezas'
+
+ROLES_MANIFIESTO = (ROL_GUIA, ROL_DESTINATARIO, ROL_VALOR, ROL_PIEZAS)
+ROLES_FACTURAS = (ROL_GUIA, ROL_VALOR)
+
+FILAS_MUESTRA = 200
+PUNTAJE_MINIMO = 0.35
+
+# Palabras del encabezado (normalizado) que delatan cada rol
+PALABRAS_ENCABEZADO = {
+    ROL_GUIA: ['GUIA', 'GUA', 'TRACKING', 'AWB', 'RASTREO', 'ENVIO', 'NRO', 'NUMERO', 'CODIGO'],
+    ROL_DESTINATARIO: ['DESTINATARIO', 'DESTINO', 'CLIENTE', 'NOMBRE', 'CONSIGNATARIO', 'TIENDA', 'RAZON'],
+    ROL_VALOR: ['VALOR', 'MONTO', 'TOTAL', 'SUBTOTAL', 'COSTO', 'FLETE', 'PRECIO', 'COBRADO', 'IMPORTE', 'TARIFA'],
+    ROL_PIEZAS: ['PIEZAS', 'PIEZA', 'PZS', 'BULTOS', 'CANTIDAD', 'CANT', 'UNIDADES', 'ITEMS'],
+}
+PESO_ENCABEZADO = 0.3
+
+# Formas típicas de los valores de cada rol
+_PATRON_GUIA = r'[A-Za-z]{0,6}[-_ /]?\d{3,}[A-Za-z0-9-]*'
+_PATRON_MONTO = r'(?i)(?:USD|US\$|\$|€)?\s*-?\d[\d.,]*'
+_PATRON_DECIMALES = r'[.,]\d{1,2}$|\$|USD'
+_PATRON_ENTERO = r'\d{1,4}(?:\.0+)?'
+_PATRON_PALABRA = r'[A-Za-zÁÉÍÓÚÑáéíóúñ]{3,}'
+_PATRON_FECHA = r'\d{4}-\d{1,2}-\d{1,2}.*|\d{1,2}[-/]\d{1,2}[-/]\d{2,4}.*'
+
+RUTA_MAPEOS = "mapeos_columnas.json"
+
+
+def _valores(serie: pd.Series) -> pd.Series:
+    texto = serie.dropna().astype(str).str.strip()
+    return texto[texto != '']
+
+
+def _puntaje_contenido(texto: pd.Series) -> Dict[str, float]:
+    """Qué tan bien encajan los valores de una columna con cada rol (0 a 1)"""
+    n = len(texto)
+    if n == 0:
+        return dict.fromkeys(PALABRAS_ENCABEZADO, 0.0)
+
+    forma_guia = texto.str.fullmatch(_PATRON_GUIA) & ~texto.str.fullmatch(_PATRON_FECHA)
+    monto = texto.str.fullmatch(_PATRON_MONTO)
+    entero = texto.str.fullmatch(_PATRON_ENTERO)
+    palabra = texto.str.contains(_PATRON_PALABRA) & ~forma_guia
+    unicos = texto.nunique() / n
+
+    guia = forma_guia.mean() * unicos
+    # Un monto sin decimales ni símbolo también puede ser una guía o unas piezas
+    valor = monto.mean() * (0.5 + 0.5 * texto.str.contains(_PATRON_DECIMALES).mean())
+    if entero.any():
+        numeros = pd.to_numeric(texto[entero], errors='coerce')
+        piezas = entero.mean() * (1.0 if numeros.median() <= 100 else 0.3) * (1.0 if unicos < 0.9 else 0.6)
+    else:
+        piezas = 0.0
+    destinatario = palabra.mean() * (0.6 + 0.4 * texto.str.contains(' ').mean())
+
+    return {ROL_GUIA: float(guia), ROL_DESTINATARIO: float(destinatario),
+            ROL_VALOR: float(valor), ROL_PIEZAS: float(piezas)}
+
+
+def puntuar_columnas(muestra: pd.DataFrame) -> pd.DataFrame:
+    """Matriz columnas x roles con el puntaje combinado de contenido y encabezado"""
+    encabezados = normalizar_textos(pd.Series([str(c) for c in muestra.columns], dtype=object))
+    filas = {}
+    for (columna, serie), encabezado in zip(muestra.items(), encabezados):
+        contenido = _puntaje_contenido(_valores(serie))
+        palabras = set(encabezado.split())
+        filas[columna] = {
+            rol: (1 - PESO_ENCABEZADO) * contenido[rol]
+            + PESO_ENCABEZADO * any(p in palabras or encabezado.startswith(p) for p in PALABRAS_ENCABEZADO[rol])
+            for rol in PALABRAS_ENCABEZADO
+        }
+    return pd.DataFrame.from_dict(filas, orient='index', columns=list(PALABRAS_ENCABEZADO))
+
+
+def inferir_mapeo(muestra: pd.DataFrame, roles: Sequence[str] = ROLES_MANIFIESTO) -> Dict[str, Optional[str]]:
+    """Asigna a cada rol la columna de mayor puntaje, sin repetir columnas"""
+    puntajes = puntuar_columnas(muestra)[list(roles)].stack()
+    mapeo = dict.fromkeys(roles)
+    usadas = set()
+    for (columna, rol), puntaje in puntajes.sort_values(ascending=False).items():
+        if puntaje < PUNTAJE_MINIMO:
+            break
+        if mapeo[rol] is None and columna not in usadas:
+            mapeo[rol] = columna
+            usadas.add(columna)
+    return mapeo
+
+
+def firma_encabezados(columnas: Iterable[str]) -> str:
+    """Identifica el formato de un transportista por sus encabezados normalizados"""
+    normalizados = normalizar_textos(pd.Series([str(c) for c in columnas], dtype=object))
+    return hashlib.sha1('|'.join(normalizados).encode()).hexdigest()[:16]
+
+
+class MemoriaMapeos:
+    """Mapeos confirmados por el usuario, por firma de encabezados, en un archivo JSON"""
+
+    def __init__(self, ruta: str = RUTA_MAPEOS):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._mapeos: Optional[Dict[str, Dict[str, str]]] = None
+
+    def _cargar(self) -> Dict[str, Dict[str, str]]:
+        if self._mapeos is None:
+            try:
+                with open(self.ruta, encoding='utf-8') as archivo:
+                    self._mapeos = json.load(archivo)
+            except FileNotFoundError:
+                self._mapeos = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer {self.ruta}, se ignoran los mapeos guardados: {e}")
+                self._mapeos = {}
+        return self._mapeos
+
+    def obtener(self, columnas: Sequence[str]) -> Optional[Dict[str, str]]:
+        """Mapeo confirmado para estos encabezados, si todas sus columnas siguen existiendo"""
+        with self._lock:
+            mapeo = self._cargar().get(firma_encabezados(columnas))
+        if mapeo and all(c in columnas for c in mapeo.values()):
+            return dict(mapeo)
+        return None
+
+    def confirmar(self, columnas: Sequence[str], mapeo: Dict[str, str]) -> None:
+        """Recuerda el mapeo para los próximos archivos con los mismos encabezados"""
+        with self._lock:
+            mapeos = self._cargar()
+            mapeos[firma_encabezados(columnas)] = {rol: col for rol, col in mapeo.items() if col is not None}
+            directorio = os.path.dirname(os.path.abspath(self.ruta))
+            fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.json')
+            with os.fdopen(fd, 'w', encoding='utf-8') as archivo:
+                json.dump(mapeos, archivo, ensure_ascii=False, indent=2)
+            os.replace(temporal, self.ruta)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._cargar())
+
+    def olvidar(self) -> int:
+        """Elimina todos los mapeos y devuelve cuántos había"""
+        with self._lock:
+            cantidad = len(self._cargar())
+            self._mapeos = {}
+            if os.path.exists(self.ruta):
+                os.remove(self.ruta)
+        return cantidad
+
+
+# Memoria compartida por todo el proceso
+MEMORIA_MAPEOS = MemoriaMapeos()
+
+
+def sugerir_mapeo(origen, roles: Sequence[str] = ROLES_MANIFIESTO, filas: int = FILAS_MUESTRA,
+                  memoria: MemoriaMapeos = MEMORIA_MAPEOS) -> Tuple[Dict[str, Optional[str]], bool]:
+    """
+    Mapeo sugerido para un archivo (o DataFrame) y si proviene de un mapeo confirmado.
+    Solo se leen las primeras filas.
+    """
+    muestra = origen.head(filas) if isinstance(origen, pd.DataFrame) else leer_muestra(origen, filas)
+    columnas: List[str] = [str(c) for c in muestra.columns]
+    recordado = memoria.obtener(columnas)
+    if recordado is not None:
+        return {rol: recordado.get(rol) for rol in roles}, True
+    return inferir_mapeo(muestra, roles), False
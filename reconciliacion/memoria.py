@@ -0,0 +1,70 @@
+"""Tipos compactos para df_final y reporte de memoria por fila."""
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+# Un texto con menos valores distintos que esta fracción de las filas se guarda como categoría
+FRACCION_CATEGORIA = 0.5
+
+# Atributo de df_final (DataFrame.attrs) con los bytes medidos antes de compactar
+ATRIBUTO_BYTES_ANTES = 'bytes_sin_compactar'
+
+
+def como_categoria(serie: pd.Series) -> pd.Series:
+    """Categoría (códigos enteros + valores distintos una sola vez) si la columna repite lo suficiente"""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    codigos, unicos = pd.factorize(serie)
+    if len(unicos) > FRACCION_CATEGORIA * len(serie):
+        return serie
+    return pd.Series(pd.Categorical.from_codes(codigos, unicos), index=serie.index, name=serie.name)
+
+
+def rellenar(serie: pd.Series, valor: str) -> pd.Series:
+    """fillna que también sirve para categorías (agrega el valor como categoría si hace falta)"""
+    if isinstance(serie.dtype, pd.CategoricalDtype) and valor not in serie.cat.categories and serie.isna().any():
+        serie = serie.cat.add_categories([valor])
+    return serie.fillna(valor)
+
+
+def reducir_entero(serie: pd.Series) -> pd.Series:
+    """El entero más chico que contiene los valores; las columnas con decimales quedan igual"""
+    if pd.api.types.is_float_dtype(serie):
+        valores = serie.to_numpy()
+        if np.isnan(valores).any() or (np.floor(valores) != valores).any():
+            return serie
+    elif not pd.api.types.is_integer_dtype(serie):
+        return serie
+    return pd.to_numeric(serie.astype('int64'), downcast='integer')
+
+
+def compactar_tipos(df: pd.DataFrame, categorias: Iterable[str] = (), enteros: Iterable[str] = ()) -> pd.DataFrame:
+    """Convierte las columnas indicadas a categoría o al entero mínimo (en el mismo DataFrame)"""
+    for columna in dict.fromkeys(categorias):
+        df[columna] = como_categoria(df[columna])
+    for columna in dict.fromkeys(enteros):
+        df[columna] = reducir_entero(df[columna])
+    return df
+
+
+def medir_bytes(df: pd.DataFrame) -> int:
+    """Memoria real del DataFrame, incluidos los textos (memory_usage(deep=True))"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def reporte_memoria(df: pd.DataFrame, bytes_antes: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Bytes por fila de df_final ahora y antes de compactar (medidos por reconciliar con
+    los mismos tipos que devuelve pandas, antes de quitar las columnas ya interpretadas).
+    Sin medición previa, 'bytes_fila_antes' y 'reduccion' quedan en None.
+    """
+    filas = max(len(df), 1)
+    despues = medir_bytes(df)
+    antes = bytes_antes if bytes_antes is not None else df.attrs.get(ATRIBUTO_BYTES_ANTES)
+    return {
+        'filas': len(df),
+        'bytes_fila_antes': antes / filas if antes is not None else None,
+        'bytes_fila_despues': despues / filas,
+        'reduccion': antes / despues if antes is not None and despues else None,
+    }
@@ -0,0 +1,121 @@
+"""Interpretación vectorizada de montos (equivalente a procesar_subtotal_wilo)."""
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    # Con pyarrow las operaciones de texto corren en C en lugar de un bucle de Python
+    _DTYPE_TEXTO = pd.StringDtype('pyarrow')
+except ImportError:
+    _DTYPE_TEXTO = None
+
+_TIPOS_NUMERICOS = {'integer', 'floating', 'mixed-integer-float', 'decimal', 'boolean', 'empty'}
+
+# Textos que float() acepta después de la limpieza (solo dígitos, punto y signo)
+_PATRON_NUMERO = r'-?(?:\d+\.?\d*|\.\d+)'
+# La coma es el separador decimal si después de la última coma no hay ningún punto
+# (1.234,56 y 12,5); si no, el punto es el decimal y las comas son de miles
+_PATRON_COMA_DECIMAL = r',[^.]*$'
+
+# Formatos que el usuario puede fijar en la pestaña Configurar
+FORMATOS_MONTO = {
+    'Automático': None,
+    '1.234,56': ',',
+    '1,234.56': '.',
+}
+
+
+def _normalizar_separadores(limpio: pd.Series) -> pd.Series:
+    """Reglas automáticas: el separador que aparece al final es el decimal"""
+    con_coma = limpio.str.contains(',', regex=False).fillna(False).to_numpy(dtype=bool)
+    con_punto = limpio.str.contains('.', regex=False).fillna(False).to_numpy(dtype=bool)
+
+    # Formato europeo: la última coma va después del último punto
+    ambos = con_coma & con_punto
+    coma_final = limpio.str.contains(_PATRON_COMA_DECIMAL, regex=True).fillna(False).to_numpy(dtype=bool)
+    europeo = ambos & coma_final
+    americano = ambos & ~europeo
+    solo_coma = con_coma & ~con_punto
+
+    if europeo.any():
+        limpio = limpio.mask(europeo, limpio[europeo].str.replace('.', '', regex=False)
+                             .str.replace(',', '.', regex=False))
+    if americano.any():
+        limpio = limpio.mask(americano, limpio[americano].str.replace(',', '', regex=False))
+    if solo_coma.any():
+        limpio = limpio.mask(solo_coma, limpio[solo_coma].str.replace(',', '.', regex=False))
+    return limpio
+
+
+def _a_float(limpio: pd.Series) -> pd.Series:
+    """Convierte a float solo los textos con forma de número; el resto queda en NaN"""
+    validos = limpio.str.fullmatch(_PATRON_NUMERO).fillna(False).to_numpy(dtype=bool)
+    valores = np.full(len(limpio), np.nan)
+    if validos.any():
+        valores[validos] = limpio[validos].to_numpy(dtype=object).astype(float)
+    return pd.Series(valores, index=limpio.index)
+
+
+def _a_float_arrow(limpio: "pa.Array", separador_decimal: Optional[str]) -> np.ndarray:
+    """Separadores y conversión a float en pyarrow.compute (C), sin pasar por objetos de Python"""
+    sin_puntos = pc.replace_substring(pc.replace_substring(limpio, '.', ''), ',', '.')
+    sin_comas = pc.replace_substring(limpio, ',', '')
+    if separador_decimal == ',':
+        limpio = sin_puntos
+    elif separador_decimal == '.':
+        limpio = sin_comas
+    else:
+        limpio = pc.if_else(pc.match_substring_regex(limpio, _PATRON_COMA_DECIMAL), sin_puntos, sin_comas)
+    validos = pc.match_substring_regex(limpio, f'^{_PATRON_NUMERO}$')
+    numeros = pc.cast(pc.if_else(validos, limpio, pa.scalar(None, pa.string())), pa.float64())
+    return numeros.to_numpy(zero_copy_only=False)
+
+
+def parsear_montos_con_errores(serie: pd.Series,
+                               separador_decimal: Optional[str] = None) -> Tuple[pd.Series, pd.Series]:
+    """
+    Interpreta una columna de montos en bloque.
+    Devuelve (valores, fallidos): los vacíos y NaN valen 0.0 y no cuentan como error;
+    los textos que no se pueden interpretar valen 0.0 y quedan marcados en fallidos.
+    Con separador_decimal (',' o '.') se fuerza el formato en lugar de deducirlo.
+    """
+    tipo = pd.api.types.infer_dtype(serie, skipna=True)
+    if tipo in _TIPOS_NUMERICOS:
+        valores = pd.to_numeric(serie, errors='coerce').astype(float)
+        return valores.fillna(0.0), pd.Series(False, index=serie.index)
+
+    # Solo los valores de texto pasan por la limpieza; el resto queda en NaN
+    if _DTYPE_TEXTO is not None and tipo == 'string':
+        texto = serie.astype(_DTYPE_TEXTO).str.strip()
+    else:
+        texto = serie.str.strip()
+        if _DTYPE_TEXTO is not None:
+            texto = texto.astype(_DTYPE_TEXTO)
+    es_texto = texto.notna().to_numpy(dtype=bool)
+    vacio = es_texto & (texto == '').fillna(False).to_numpy(dtype=bool)
+    limpio = texto.str.replace(r'[^\d.,-]', '', regex=True)
+
+    if _DTYPE_TEXTO is not None:
+        valores = pd.Series(_a_float_arrow(pa.array(limpio.array), separador_decimal), index=serie.index)
+    else:
+        if separador_decimal == ',':
+            limpio = limpio.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        elif separador_decimal == '.':
+            limpio = limpio.str.replace(',', '', regex=False)
+        else:
+            limpio = _normalizar_separadores(limpio)
+        valores = _a_float(limpio)
+    if not es_texto.all():
+        no_texto = serie[~es_texto]
+        valores[~es_texto] = pd.to_numeric(no_texto, errors='coerce').astype(float).to_numpy()
+
+    fallidos = valores.isna().to_numpy() & serie.notna().to_numpy() & ~vacio
+    return valores.fillna(0.0), pd.Series(fallidos, index=serie.index)
+
+
+def parsear_montos(serie: pd.Series, separador_decimal: Optional[str] = None) -> pd.Series:
+    """Equivalente vectorizado de procesar_subtotal_wilo"""
+    return parsear_montos_con_errores(serie, separador_decimal)[0]
@@ -0,0 +1,128 @@
+"""Motor de reconciliación V8 vectorizado, utilizable fuera de Streamlit."""
+from typing import Any, Dict, Iterable, Optional
+
+import pandas as pd
+
+from .clasificador import CLASIFICADOR_V8
+from .duplicados import COLUMNAS_DUPLICADOS, agrupar_facturas
+from .guias import LLAVE_VACIA, canonizar_guias
+from .memoria import ATRIBUTO_BYTES_ANTES, compactar_tipos, medir_bytes, rellenar
+from .montos import parsear_montos_con_errores
+from .tiendas import DimensionTiendas
+
+# Columnas que produce el motor sobre df_final
+COLUMNAS_RESULTADO = ['GUIA_CLEAN', 'TIPO_TIENDA', 'PIEZAS_CALC', 'VALOR_REAL', 'VALOR_MANIFIESTO']
+
+SUFIJOS = ('_MAN', '_FAC')
+
+
+def limpiar_guias(serie: pd.Series, transportista: Optional[str] = None) -> pd.Series:
+    """Genera la llave de cruce GUIA_CLEAN (entera) a partir de la columna de guías"""
+    return canonizar_guias(serie, transportista)
+
+
+def clasificar_tiendas(serie: pd.Series, tiendas: Optional[DimensionTiendas] = None) -> pd.Series:
+    """Tipo de tienda con las reglas V8 compiladas o, si se indica, desde la dimensión persistente"""
+    if tiendas is None:
+        return CLASIFICADOR_V8.clasificar(serie)
+    return tiendas.clasificar(serie)
+
+
+def _columna_fusionada(df_final: pd.DataFrame, columna: str, sufijo: str) -> str:
+    """Nombre que recibe una columna después del merge (con sufijo si hubo choque)"""
+    return columna if columna in df_final.columns else f"{columna}{sufijo}"
+
+
+def reconciliar(df_m: pd.DataFrame, df_f: pd.DataFrame,
+                col_guia_m: str, col_dest_m: str, col_valor_m: str, col_piezas_m: str,
+                col_guia_f: str, col_valor_f: str,
+                separador_decimal: Optional[str] = None,
+                transportista: Optional[str] = None, compactar: bool = True,
+                tiendas: Optional[DimensionTiendas] = None) -> pd.DataFrame:
+    """
+    Cruza manifiesto y facturas por guía y calcula las columnas V8 de df_final.
+    Con compactar, los textos repetidos quedan como categoría, los conteos como el
+    entero mínimo y las columnas de valor y piezas del manifiesto (ya interpretadas
+    en VALOR_MANIFIESTO y PIEZAS_CALC) se eliminan; la memoria medida antes de
+    hacerlo queda en df_final.attrs (ver reporte_memoria). El texto original de la guía
+    se conserva (lo muestran los informes y lo usa la búsqueda por similitud).
+    Sin tiendas, el tipo de tienda sale de las reglas en memoria y el motor no toca el disco.
+    """
+    manifiesto = df_m.assign(GUIA_CLEAN=limpiar_guias(df_m[col_guia_m], transportista))
+
+    # Las líneas de factura se agrupan por guía antes del cruce (el índice puede venir repetido)
+    montos_f, invalido_f = parsear_montos_con_errores(df_f[col_valor_f].reset_index(drop=True), separador_decimal)
+    facturas = agrupar_facturas(limpiar_guias(df_f[col_guia_f], transportista), montos_f, invalido_f)
+    # Las líneas sin guía no se asignan a las guías vacías del manifiesto (se cruzan por monto, ver sin_guia)
+    facturas = facturas[facturas['GUIA_CLEAN'] != LLAVE_VACIA]
+
+    # Merge (hash join sobre la llave limpia)
+    df_final = pd.merge(manifiesto, facturas, on='GUIA_CLEAN', how='left', suffixes=SUFIJOS, sort=False)
+
+    col_dest = _columna_fusionada(df_final, col_dest_m, SUFIJOS[0])
+    col_piezas = _columna_fusionada(df_final, col_piezas_m, SUFIJOS[0])
+    col_valor_m = _columna_fusionada(df_final, col_valor_m, SUFIJOS[0])
+
+    # Lógica V8
+    df_final['DESTINATARIO_NORM'] = rellenar(df_final[col_dest], 'DESCONOCIDO')
+    df_final['TIPO_TIENDA'] = clasificar_tiendas(df_final['DESTINATARIO_NORM'], tiendas)
+
+    # Manejo de Piezas y Valores
+    df_final['PIEZAS_CALC'] = pd.to_numeric(df_final[col_piezas], errors='coerce').fillna(1)
+    df_final['VALOR_REAL'] = df_final['VALOR_REAL'].fillna(0.0)
+    df_final['VALOR_MANIFIESTO'], invalido_man = parsear_montos_con_errores(df_final[col_valor_m], separador_decimal)
+    df_final['MONTO_INVALIDO'] = df_final.pop('FACTURA_INVALIDA').fillna(False).astype(bool) | invalido_man
+    for columna in COLUMNAS_DUPLICADOS:
+        df_final[columna] = df_final[columna].fillna(0).astype(facturas[columna].dtype)
+
+    if compactar:
+        bytes_antes = medir_bytes(df_final)
+        consumidas = [c for c in dict.fromkeys([col_piezas, col_valor_m]) if c not in (col_guia_m, col_dest)]
+        df_final = compactar_tipos(
+            df_final.drop(columns=consumidas),
+            categorias=[col_dest, 'DESTINATARIO_NORM', 'TIPO_TIENDA'],
+            enteros=['PIEZAS_CALC', 'LINEAS_FACTURA', 'DUPLICADOS_EXACTOS', 'DUPLICADOS_CERCANOS']
+        )
+        df_final.attrs[ATRIBUTO_BYTES_ANTES] = bytes_antes
+    return df_final
+
+
+_CAMPOS_ADITIVOS = ('guias', 'con_factura', 'sin_factura', 'total_facturado', 'total_manifiesto',
+                    'total_piezas', 'montos_invalidos', 'duplicados_exactos', 'duplicados_cercanos',
+                    'total_en_riesgo')
+
+
+def resumir_reconciliacion(df_final: pd.DataFrame) -> Dict[str, Any]:
+    """Calcula las métricas que se muestran en la pestaña de resultados"""
+    total_facturado = float(df_final['VALOR_REAL'].sum())
+    total_manifiesto = float(df_final['VALOR_MANIFIESTO'].sum())
+    guias = len(df_final)
+    con_factura = int((df_final['VALOR_REAL'] > 0).sum())
+    sin_factura = int((df_final['VALOR_REAL'] == 0).sum())
+
+    return {
+        'guias': guias,
+        'con_factura': con_factura,
+        'sin_factura': sin_factura,
+        'porcentaje': (con_factura / guias) * 100 if guias > 0 else 0,
+        'total_facturado': total_facturado,
+        'total_manifiesto': total_manifiesto,
+        'total_piezas': float(df_final['PIEZAS_CALC'].sum()),
+        'montos_invalidos': int(df_final['MONTO_INVALIDO'].sum()) if 'MONTO_INVALIDO' in df_final else 0,
+        'duplicados_exactos': int(df_final['DUPLICADOS_EXACTOS'].sum()) if 'DUPLICADOS_EXACTOS' in df_final else 0,
+        'duplicados_cercanos': int(df_final['DUPLICADOS_CERCANOS'].sum()) if 'DUPLICADOS_CERCANOS' in df_final else 0,
+        'total_en_riesgo': float(df_final['MONTO_EN_RIESGO'].sum()) if 'MONTO_EN_RIESGO' in df_final else 0.0,
+        'diferencia': total_facturado - total_manifiesto
+    }
+
+
+def combinar_resumenes(resumenes: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Suma resúmenes parciales (particiones, lotes) en un único resumen"""
+    total = {campo: 0 for campo in _CAMPOS_ADITIVOS}
+    for resumen in resumenes:
+        for campo in _CAMPOS_ADITIVOS:
+            total[campo] += resumen[campo]
+
+    total['porcentaje'] = (total['con_factura'] / total['guias']) * 100 if total['guias'] > 0 else 0
+    total['diferencia'] = total['total_facturado'] - total['total_manifiesto']
+    return total
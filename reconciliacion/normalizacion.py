@@ -0,0 +1,106 @@
+"""Normalización de texto en lote (equivalente a normalizar_texto_wilo)."""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+def normalizar_textos(serie: pd.Series) -> pd.Series:
+    """Equivalente vectorizado de normalizar_texto_wilo"""
+    vacios = serie.isna() | (serie == '')
+    texto = serie.astype(str)
+    # NFKD + ASCII solo cambia los textos que tienen caracteres no ASCII
+    no_ascii = texto.str.contains(r'[^\x00-\x7f]', regex=True).fillna(False).astype(bool)
+    if no_ascii.any():
+        ascii_ = (texto[no_ascii].str.normalize('NFKD')
+                  .str.encode('ascii', 'ignore').str.decode('ascii'))
+        texto = texto.mask(no_ascii, ascii_)
+    texto = texto.str.upper().str.replace(r'[^A-Z0-9\s]', ' ', regex=True)
+    texto = texto.str.replace(r'\s+', ' ', regex=True).str.strip()
+    return texto.where(~vacios, '')
+
+
+def como_texto(serie: pd.Series) -> pd.Series:
+    """
+    Convierte a str los valores no textuales (conservando NaN) antes de deduplicar,
+    para que 1, 1.0 y True no se agrupen como un mismo valor.
+    """
+    if pd.api.types.infer_dtype(serie, skipna=True) in ('string', 'empty'):
+        return serie
+    return serie.astype(str).where(serie.notna())
+
+
+class CacheNormalizacion:
+    """
+    Caché LRU acotada de textos normalizados, compartida por todo el proceso
+    (y por lo tanto por todas las sesiones de Streamlit).
+    Los contadores de aciertos y fallos se cuentan por valor distinto consultado.
+    """
+
+    def __init__(self, capacidad: int = 100_000):
+        self.capacidad = capacidad
+        self._datos: 'OrderedDict[str, str]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def normalizar_unicos(self, valores: Sequence[str]) -> List[str]:
+        """Normaliza textos ya deduplicados consultando primero la caché"""
+        resultado: List[Optional[str]] = [None] * len(valores)
+        pendientes = []
+        with self._lock:
+            for i, valor in enumerate(valores):
+                texto = self._datos.get(valor)
+                if texto is None:
+                    pendientes.append(i)
+                else:
+                    self._datos.move_to_end(valor)
+                    resultado[i] = texto
+            self.aciertos += len(valores) - len(pendientes)
+            self.fallos += len(pendientes)
+
+        if pendientes:
+            nuevos = normalizar_textos(pd.Series([valores[i] for i in pendientes], dtype=object))
+            with self._lock:
+                for i, texto in zip(pendientes, nuevos):
+                    resultado[i] = texto
+                    self._datos[valores[i]] = texto
+                while len(self._datos) > self.capacidad:
+                    self._datos.popitem(last=False)
+        return resultado
+
+    def normalizar(self, serie: pd.Series) -> pd.Series:
+        """Normaliza una columna completa procesando solo sus valores distintos"""
+        codigos, unicos = pd.factorize(como_texto(serie), use_na_sentinel=True)
+        textos = np.empty(len(unicos) + 1, dtype=object)
+        textos[:-1] = self.normalizar_unicos(list(unicos))
+        # El código -1 (NaN) apunta a la última posición
+        textos[-1] = ''
+        return pd.Series(textos[codigos], index=serie.index, dtype=object)
+
+    def estadisticas(self) -> Dict[str, Any]:
+        consultas = self.aciertos + self.fallos
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': (self.aciertos / consultas) * 100 if consultas > 0 else 0,
+            'tamano': len(self._datos),
+            'capacidad': self.capacidad
+        }
+
+    def limpiar(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self.aciertos = 0
+            self.fallos = 0
+
+
+# Instancia compartida por todo el proceso
+CACHE_NORMALIZACION = CacheNormalizacion()
+
+
+def normalizar_serie(serie: pd.Series) -> pd.Series:
+    """Normaliza una columna usando la caché LRU del proceso"""
+    return CACHE_NORMALIZACION.normalizar(serie)
@@ -0,0 +1,122 @@
+"""Reconciliación fuera de memoria: particiona por hash de GUIA_CLEAN y cruza partición a partición."""
+import logging
+import math
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from .ingesta import es_excel, leer_bloques, tamano_bytes
+from .motor import combinar_resumenes, limpiar_guias, reconciliar, resumir_reconciliacion
+from .tiendas import DimensionTiendas
+
+logger = logging.getLogger(__name__)
+
+# Bytes en memoria por byte de archivo (pandas + merge); el xlsx viene comprimido
+FACTOR_EXPANSION_CSV = 8
+FACTOR_EXPANSION_EXCEL = 40
+BYTES_POR_FILA = 1_000
+
+
+def calcular_particiones(origenes: List[Any], memoria_max_mb: int) -> int:
+    """Número de particiones para que cada una quepa en memoria_max_mb"""
+    estimado = sum(
+        tamano_bytes(o) * (FACTOR_EXPANSION_EXCEL if es_excel(o) else FACTOR_EXPANSION_CSV)
+        for o in origenes
+    )
+    return max(1, math.ceil(estimado / (memoria_max_mb * 1024 ** 2)))
+
+
+def asignar_particion(guias_clean: pd.Series, num_particiones: int) -> pd.Series:
+    """Partición de cada fila según el hash de su llave limpia"""
+    hashes = pd.util.hash_pandas_object(guias_clean, index=False).to_numpy()
+    return pd.Series(hashes % num_particiones, index=guias_clean.index)
+
+
+def _particionar(origen, col_guia: str, num_particiones: int, filas_por_bloque: int,
+                 directorio: str, prefijo: str, proyeccion: Optional[List[str]] = None,
+                 transportista: Optional[str] = None) -> List[str]:
+    """Distribuye el archivo en num_particiones archivos de desborde y devuelve sus columnas"""
+    archivos = {}
+    columnas = []
+    try:
+        for bloque in leer_bloques(origen, filas_por_bloque, columnas_texto=[col_guia], columnas=proyeccion):
+            columnas = list(bloque.columns)
+            if bloque.empty:
+                continue
+            particion = asignar_particion(limpiar_guias(bloque[col_guia], transportista), num_particiones)
+            for p, grupo in bloque.groupby(particion, sort=False):
+                if p not in archivos:
+                    archivos[p] = open(os.path.join(directorio, f"{prefijo}_{p:05d}.pkl"), 'ab')
+                pickle.dump(grupo, archivos[p], protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for archivo in archivos.values():
+            archivo.close()
+    return columnas
+
+
+def _cargar_particion(directorio: str, prefijo: str, p: int, columnas: List[str]) -> pd.DataFrame:
+    """Reúne los bloques de una partición (vacía si no recibió filas)"""
+    ruta = os.path.join(directorio, f"{prefijo}_{p:05d}.pkl")
+    if not os.path.exists(ruta):
+        return pd.DataFrame(columns=columnas)
+    bloques = []
+    with open(ruta, 'rb') as archivo:
+        while True:
+            try:
+                bloques.append(pickle.load(archivo))
+            except EOFError:
+                break
+    os.remove(ruta)
+    return pd.concat(bloques, ignore_index=True)
+
+
+def reconciliar_por_particiones(manifiesto, facturas,
+                                col_guia_m: str, col_dest_m: str, col_valor_m: str, col_piezas_m: str,
+                                col_guia_f: str, col_valor_f: str,
+                                separador_decimal: Optional[str] = None,
+                                transportista: Optional[str] = None,
+                                memoria_max_mb: int = 256,
+                                num_particiones: Optional[int] = None,
+                                filas_por_bloque: Optional[int] = None,
+                                dir_temporal: Optional[str] = None,
+                                tiendas: Optional[DimensionTiendas] = None,
+                                al_procesar: Optional[Callable[[pd.DataFrame], None]] = None) -> Dict[str, Any]:
+    """
+    Reconciliación en modo streaming para manifiestos y facturas que no caben en memoria.
+    Devuelve el mismo resumen que resumir_reconciliacion; cada df_final parcial se
+    entrega a al_procesar (por ejemplo, para exportarlo) y luego se descarta.
+    """
+    if num_particiones is None:
+        num_particiones = calcular_particiones([manifiesto, facturas], memoria_max_mb)
+    if filas_por_bloque is None:
+        filas_por_bloque = max(10_000, memoria_max_mb * 1024 ** 2 // (2 * BYTES_POR_FILA))
+
+    logger.info(f"Reconciliación particionada: {num_particiones} particiones, bloques de {filas_por_bloque} filas")
+
+    resumenes = []
+    with tempfile.TemporaryDirectory(prefix="reconciliacion_", dir=dir_temporal) as directorio:
+        # Solo las columnas que usa el motor pasan a los archivos de desborde
+        columnas_m = _particionar(manifiesto, col_guia_m, num_particiones, filas_por_bloque, directorio, 'man',
+                                  [col_guia_m, col_dest_m, col_valor_m, col_piezas_m], transportista)
+        columnas_f = _particionar(facturas, col_guia_f, num_particiones, filas_por_bloque, directorio, 'fac',
+                                  [col_guia_f, col_valor_f], transportista)
+
+        for p in range(num_particiones):
+            df_m = _cargar_particion(directorio, 'man', p, columnas_m)
+            df_f = _cargar_particion(directorio, 'fac', p, columnas_f)
+            if df_m.empty:
+                continue
+
+            df_final = reconciliar(df_m, df_f, col_guia_m=col_guia_m, col_dest_m=col_dest_m,
+                                   col_valor_m=col_valor_m, col_piezas_m=col_piezas_m,
+                                   col_guia_f=col_guia_f, col_valor_f=col_valor_f,
+                                   separador_decimal=separador_decimal, transportista=transportista,
+                                   tiendas=tiendas)
+            resumenes.append(resumir_reconciliacion(df_final))
+            if al_procesar is not None:
+                al_procesar(df_final)
+
+    return combinar_resumenes(resumenes)
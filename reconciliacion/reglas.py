@@ -0,0 +1,74 @@
+"""Reglas de negocio V8 en su versión escalar (un valor por llamada)."""
+import re
+import unicodedata
+
+import pandas as pd
+
+# Patrones que identifican una tienda física dentro del nombre normalizado
+PATRONES_FISICAS = ['LOCAL', 'MALL', 'PLAZA', 'SHOPPING', 'CENTRO', 'COMERCIAL', 'CC',
+                    'TIENDA', 'PASEO', 'PORTAL', 'DORADO', 'CITY', 'CEIBOS', 'QUITO',
+                    'GUAYAQUIL', 'AMBATO', 'MANTA', 'MACHALA', 'RIOCENTRO', 'AEROPOSTALE']
+
+TIPO_DESCONOCIDO = "DESCONOCIDO"
+TIPO_MAYORISTA = "VENTAS AL POR MAYOR"
+TIPO_FISICA = "TIENDA FÍSICA"
+TIPO_WEB = "VENTA WEB"
+
+
+def normalizar_texto_wilo(texto):
+    """Normaliza texto para comparación"""
+    if pd.isna(texto) or texto == '':
+        return ''
+    texto = str(texto)
+    try:
+        texto = unicodedata.normalize('NFKD', texto).encode('ASCII', 'ignore').decode('ASCII')
+    except:
+        pass
+    texto = re.sub(r'[^A-Za-z0-9\s]', ' ', texto.upper())
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def procesar_subtotal_wilo(valor):
+    """Procesa valores monetarios"""
+    if pd.isna(valor):
+        return 0.0
+    try:
+        if isinstance(valor, (int, float)):
+            return float(valor)
+        valor_str = str(valor).strip()
+        valor_str = re.sub(r'[^\d.,-]', '', valor_str)
+        if ',' in valor_str and '.' in valor_str:
+            if valor_str.rfind(',') > valor_str.rfind('.'):
+                valor_str = valor_str.replace('.', '').replace(',', '.')
+            else:
+                valor_str = valor_str.replace(',', '')
+        elif ',' in valor_str:
+            valor_str = valor_str.replace(',', '.')
+        return float(valor_str) if valor_str else 0.0
+    except:
+        return 0.0
+
+
+def identificar_tipo_tienda_v8(nombre):
+    """
+    Lógica V8.0 para clasificación de tiendas.
+    Incluye regla específica para JOFRE SANTANA y manejo de Piezas.
+    """
+    if pd.isna(nombre) or nombre == '':
+        return TIPO_DESCONOCIDO
+    nombre_norm = normalizar_texto_wilo(nombre)
+
+    # 1. Regla Específica Solicitada
+    if 'JOFRE' in nombre_norm and 'SANTANA' in nombre_norm:
+        return TIPO_MAYORISTA
+
+    # 2. Tiendas Físicas (Patrones)
+    if any(p in nombre_norm for p in PATRONES_FISICAS):
+        return TIPO_FISICA
+
+    # 3. Nombres Propios (Venta Web)
+    palabras = nombre_norm.split()
+    if len(palabras) > 0 and len(palabras) <= 3:
+        return TIPO_WEB
+
+    return TIPO_FISICA # Default
@@ -0,0 +1,167 @@
+"""Coincidencias aproximadas para guías sin factura: índice de borrados (distancia de edición <= 2)."""
+import logging
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from .guias import BASE_SERIE, LLAVE_VACIA, MAXIMO_CON_SERIE, canonizar_guias
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de este puntaje (1 - distancia / largo) la candidata no se propone
+SIMILITUD_MINIMA = 0.75
+# Textos más cortos producen demasiadas coincidencias casuales
+LARGO_MINIMO = 4
+# Solo se generan borrados hasta este largo; más allá se compara el texto completo
+LARGO_MAXIMO = 24
+
+
+def textos_comparables(guias: pd.Series, llaves: pd.Series) -> pd.Series:
+    """
+    Texto sobre el que se miden los errores de tipeo: el número canónico de la guía
+    (sin prefijo ni ceros a la izquierda) o, si no tiene número, el texto sin separadores
+    ni prefijo de serie (GUA-1830X -> 1830X).
+    """
+    valores = llaves.to_numpy()
+    numero = valores >= 0
+    # Con serie, el número ocupa los dígitos bajos de la llave
+    valores = np.where(valores >= BASE_SERIE, valores % MAXIMO_CON_SERIE, valores)
+    textos = pd.Series(valores, index=guias.index).astype('str')
+    if not numero.all():
+        sin_numero = guias[~numero].astype('str').str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
+        sin_numero = sin_numero.str.replace(r'^[A-Z]{1,6}(?=\d)', '', regex=True)
+        textos = textos.mask(~numero, sin_numero)
+    return textos
+
+
+def _hash(textos: pd.Series) -> np.ndarray:
+    return pd.util.hash_pandas_object(textos, index=False, categorize=False).to_numpy()
+
+
+def _variantes(textos: pd.Series) -> pd.DataFrame:
+    """
+    Cada texto completo (pos = -1) y con cada uno de sus caracteres borrado, como hash.
+    Dos textos a distancia de edición <= 2 comparten al menos una variante.
+    """
+    largos = textos.str.len().to_numpy()
+    ids = np.arange(len(textos))
+    partes = [pd.DataFrame({'hash': _hash(textos), 'id': ids, 'pos': -1})]
+    for pos in range(min(int(largos.max(initial=0)), LARGO_MAXIMO)):
+        tiene = (largos > pos) & (largos <= LARGO_MAXIMO)
+        if not tiene.any():
+            continue
+        subtextos = textos[tiene]
+        borrados = subtextos.str.slice(0, pos) + subtextos.str.slice(pos + 1)
+        partes.append(pd.DataFrame({'hash': _hash(borrados), 'id': ids[tiene], 'pos': pos}))
+    return pd.concat(partes, ignore_index=True)
+
+
+def _caracteres(textos: pd.Series) -> np.ndarray:
+    """Matriz (textos x posiciones) con el código de cada carácter"""
+    ancho = max(int(textos.str.len().max()), 1) if len(textos) else 1
+    return np.array(textos.tolist(), dtype=f'U{ancho}').view(np.int32).reshape(len(textos), ancho)
+
+
+class IndiceSimilitud:
+    """
+    Índice de borrados sobre un conjunto de textos (las guías de factura sin cruzar), con
+    su llave de guía opcional. Cada búsqueda es un hash join de variantes:
+    O((n + m) * largo), sin comparar todos los pares.
+    """
+
+    def __init__(self, textos: pd.Series, llaves: Optional[pd.Series] = None):
+        self.textos = textos.reset_index(drop=True).astype('str')
+        self._llaves = None if llaves is None else llaves.to_numpy()
+        self._variantes = _variantes(self.textos)
+        self._largos = self.textos.str.len().to_numpy()
+        self._caracteres = _caracteres(self.textos)
+
+    def __len__(self) -> int:
+        return len(self.textos)
+
+    def buscar(self, consultas: pd.Series, similitud_minima: float = SIMILITUD_MINIMA,
+               llaves: Optional[pd.Series] = None) -> pd.DataFrame:
+        """
+        Mejor candidata de cada consulta (posición en consultas): CANDIDATA (posición en el
+        índice), DISTANCIA (Damerau-Levenshtein, de 0 a 2), SIMILITUD y CANDIDATOS empatados.
+        Distancia 0 es el mismo número con otra serie (GUA-1001 y 1001.0): va primero. Solo
+        se descarta la candidata que es literalmente la misma guía (misma llave, si se dan).
+        """
+        consultas = consultas.reset_index(drop=True).astype('str')
+        columnas = ['CONSULTA', 'CANDIDATA', 'DISTANCIA', 'SIMILITUD', 'CANDIDATOS']
+        if consultas.empty or not len(self):
+            return pd.DataFrame({columna: pd.Series(dtype='float64' if columna == 'SIMILITUD' else 'int64')
+                                 for columna in columnas})
+
+        pares = pd.merge(_variantes(consultas), self._variantes, on='hash', suffixes=('_c', '_i'))
+        pos_c, pos_i = pares['pos_c'].to_numpy(), pares['pos_i'].to_numpy()
+        id_c, id_i = pares['id_c'].to_numpy(), pares['id_i'].to_numpy()
+
+        # Variante compartida -> distancia: mismo borrado = sustitución, borrado en un solo
+        # lado = inserción, borrados contiguos del mismo carácter = transposición
+        caracteres_c = _caracteres(consultas)
+        contiguos = (np.abs(pos_c - pos_i) == 1) & (pos_c >= 0) & (pos_i >= 0)
+        transpuesto = np.zeros(len(pares), dtype=bool)
+        transpuesto[contiguos] = (caracteres_c[id_c[contiguos], pos_c[contiguos]]
+                                  == self._caracteres[id_i[contiguos], pos_i[contiguos]])
+        distancia = np.select(
+            [(pos_c < 0) & (pos_i < 0), (pos_c < 0) | (pos_i < 0) | (pos_c == pos_i) | transpuesto],
+            [0, 1], default=2
+        )
+        largo = np.maximum(consultas.str.len().to_numpy()[id_c], self._largos[id_i])
+        candidatos = pd.DataFrame({'CONSULTA': id_c, 'CANDIDATA': id_i, 'DISTANCIA': distancia,
+                                   'SIMILITUD': 1 - distancia / largo})
+        misma_guia = np.zeros(len(candidatos), dtype=bool)
+        if llaves is not None and self._llaves is not None:
+            misma_guia = llaves.to_numpy()[id_c] == self._llaves[id_i]
+        candidatos = candidatos[~misma_guia & (candidatos['SIMILITUD'] >= similitud_minima)]
+
+        # La menor distancia de cada par, luego la mejor candidata de cada consulta
+        candidatos = (candidatos.sort_values(['CONSULTA', 'DISTANCIA', 'CANDIDATA'], kind='stable')
+                      .drop_duplicates(['CONSULTA', 'CANDIDATA']))
+        mejor_distancia = candidatos.groupby('CONSULTA')['DISTANCIA'].transform('min')
+        empatados = candidatos[candidatos['DISTANCIA'] == mejor_distancia]
+        mejores = empatados.drop_duplicates('CONSULTA').copy()
+        mejores['CANDIDATOS'] = empatados.groupby('CONSULTA').size().reindex(mejores['CONSULTA']).to_numpy()
+        return mejores[columnas].reset_index(drop=True)
+
+
+def proponer_coincidencias(df_final: pd.DataFrame, df_f: pd.DataFrame, col_guia_m: str, col_guia_f: str,
+                           transportista: Optional[str] = None,
+                           similitud_minima: float = SIMILITUD_MINIMA) -> pd.DataFrame:
+    """
+    Segunda pasada sobre lo que el cruce exacto no unió: para cada guía del manifiesto
+    sin factura, la guía de factura sin manifiesto más parecida y su puntaje.
+    CANDIDATOS > 1 indica que hubo otras facturas igual de parecidas y MISMA_FACTURA > 1
+    que otras guías del manifiesto proponen la misma factura (revisar a mano).
+    """
+    sin_factura = df_final.loc[(df_final['LINEAS_FACTURA'] == 0) & (df_final['GUIA_CLEAN'] != LLAVE_VACIA),
+                               [col_guia_m, 'GUIA_CLEAN']]
+    sin_factura = sin_factura.drop_duplicates('GUIA_CLEAN')
+
+    llaves_f = canonizar_guias(df_f[col_guia_f], transportista)
+    huerfanas = pd.DataFrame({'guia': df_f[col_guia_f].to_numpy(), 'llave': llaves_f.to_numpy()})
+    huerfanas = huerfanas[~huerfanas['llave'].isin(df_final['GUIA_CLEAN']) & (huerfanas['llave'] != LLAVE_VACIA)]
+    huerfanas = huerfanas.drop_duplicates('llave')
+
+    consultas = textos_comparables(sin_factura[col_guia_m], sin_factura['GUIA_CLEAN'])
+    candidatas = textos_comparables(huerfanas['guia'], huerfanas['llave'])
+    consultas = consultas[consultas.str.len() >= LARGO_MINIMO]
+    candidatas = candidatas[candidatas.str.len() >= LARGO_MINIMO]
+
+    indice = IndiceSimilitud(candidatas, huerfanas.loc[candidatas.index, 'llave'])
+    mejores = indice.buscar(consultas, similitud_minima, sin_factura.loc[consultas.index, 'GUIA_CLEAN'])
+    manifiesto = sin_factura.loc[consultas.index[mejores['CONSULTA']]]
+    coincidencias = pd.DataFrame({
+        'GUIA_CLEAN': manifiesto['GUIA_CLEAN'].to_numpy(),
+        'GUIA_MANIFIESTO': manifiesto[col_guia_m].astype(str).to_numpy(),
+        'GUIA_FACTURA': huerfanas.loc[candidatas.index[mejores['CANDIDATA']], 'guia'].astype(str).to_numpy(),
+        'DISTANCIA': mejores['DISTANCIA'].to_numpy(),
+        'SIMILITUD': mejores['SIMILITUD'].to_numpy(),
+        'CANDIDATOS': mejores['CANDIDATOS'].to_numpy(),
+    })
+    coincidencias['MISMA_FACTURA'] = coincidencias.groupby('GUIA_FACTURA')['GUIA_CLEAN'].transform('size')
+    logger.info(f"Coincidencias aproximadas: {len(coincidencias)} de {len(consultas)} guías sin factura "
+                f"({len(candidatas)} facturas sin manifiesto)")
+    return coincidencias.sort_values(['DISTANCIA', 'SIMILITUD'], ascending=[True, False], ignore_index=True)
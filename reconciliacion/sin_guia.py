@@ -0,0 +1,138 @@
+"""Cruce por monto de las líneas de factura sin guía: bloques por fecha y destinatario y merge_asof."""
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .guias import LLAVE_VACIA, canonizar_guias
+from .montos import parsear_montos_con_errores
+from .motor import SUFIJOS, _columna_fusionada
+from .normalizacion import normalizar_serie
+
+logger = logging.getLogger(__name__)
+
+# Diferencia máxima (en moneda) entre el monto facturado y el del manifiesto
+TOLERANCIA_MONTO = 0.50
+
+# Dos líneas que eligen la misma guía: la más cercana se queda con ella y la otra
+# vuelve a buscar entre las guías restantes, hasta este número de rondas
+RONDAS_CRUCE = 3
+
+CRUCE_GUIA = 'GUIA'
+CRUCE_MONTO = 'MONTO'
+
+# Llave ordenada = bloque * _ESCALA + centavos (montos hasta mil millones)
+_ESCALA = 100_000_000_000
+
+
+def _fechas(serie: pd.Series) -> pd.Series:
+    """Día de cada valor como texto AAAA-MM-DD ('' si no es una fecha); se interpreta cada valor distinto una vez"""
+    codigos, unicos = pd.factorize(serie)
+    unicos = pd.Series(unicos, dtype=object)
+    # ISO (AAAA-MM-DD) primero; el resto con el día antes del mes, como se escribe en Ecuador
+    fechas = pd.to_datetime(unicos, errors='coerce', format='ISO8601')
+    fechas = fechas.fillna(pd.to_datetime(unicos.where(fechas.isna()), errors='coerce', format='mixed', dayfirst=True))
+    dias = fechas.dt.strftime('%Y-%m-%d')
+    textos = np.append(dias.fillna('').to_numpy(dtype=object), '')
+    return pd.Series(textos[codigos], index=serie.index)
+
+
+def _bloques(destinos: pd.Series, fechas: Optional[pd.Series]) -> pd.Series:
+    """Bloque de búsqueda: destinatario normalizado y, si hay columna de fecha, el día"""
+    bloque = normalizar_serie(destinos)
+    if fechas is not None:
+        bloque = bloque + '|' + _fechas(fechas)
+    return bloque
+
+
+def _centavos(montos: np.ndarray) -> np.ndarray:
+    return np.round(montos * 100).astype(np.int64)
+
+
+def _candidatos_en_tolerancia(bloques_m: np.ndarray, centavos_m: np.ndarray, bloques_f: np.ndarray,
+                              centavos_f: np.ndarray, tolerancia: float) -> np.ndarray:
+    """Guías del manifiesto de su bloque a menos de la tolerancia de cada línea (búsqueda ordenada)"""
+    claves = np.sort(bloques_m * _ESCALA + centavos_m)
+    margen = int(round(tolerancia * 100))
+    consulta = bloques_f * _ESCALA + centavos_f
+    return (np.searchsorted(claves, consulta + margen, side='right')
+            - np.searchsorted(claves, consulta - margen, side='left'))
+
+
+def cruzar_sin_guia(df_final: pd.DataFrame, df_f: pd.DataFrame, col_guia_f: str, col_dest_f: str,
+                    col_valor_f: str, col_dest_m: str, col_fecha_m: Optional[str] = None,
+                    col_fecha_f: Optional[str] = None, tolerancia: float = TOLERANCIA_MONTO,
+                    separador_decimal: Optional[str] = None,
+                    transportista: Optional[str] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Asigna cada línea de factura sin guía a una guía del manifiesto sin factura del mismo
+    destinatario (y día, si hay fechas) cuyo monto esté dentro de la tolerancia.
+    Agrega CRUCE ('GUIA', 'MONTO' o '') y CONFIANZA_CRUCE (1 en el cruce por guía; en el
+    cruce por monto baja con la diferencia y con la cantidad de guías que también cabían).
+    """
+    df_final = df_final.copy()
+    con_guia = (df_final['LINEAS_FACTURA'] > 0).to_numpy()
+    df_final['CRUCE'] = np.where(con_guia, CRUCE_GUIA, '')
+    df_final['CONFIANZA_CRUCE'] = con_guia.astype(float)
+
+    sin_guia = (canonizar_guias(df_f[col_guia_f], transportista) == LLAVE_VACIA).to_numpy()
+    lineas = df_f[sin_guia]
+    montos_f, invalido_f = parsear_montos_con_errores(lineas[col_valor_f].reset_index(drop=True), separador_decimal)
+    validas = (~invalido_f & (montos_f > 0)).to_numpy()
+
+    pendientes_m = np.flatnonzero(~con_guia & (df_final['VALOR_MANIFIESTO'] > 0).to_numpy())
+    resumen = {'lineas_sin_guia': int(sin_guia.sum()), 'cruzadas': 0, 'monto_cruzado': 0.0}
+    if not validas.any() or not len(pendientes_m):
+        return df_final, resumen
+
+    # Bloques comunes a ambos lados como códigos enteros
+    col_fecha_final = _columna_fusionada(df_final, col_fecha_m, SUFIJOS[0]) if col_fecha_m else None
+    usar_fechas = col_fecha_final is not None and col_fecha_f is not None
+    bloques_m = _bloques(df_final[_columna_fusionada(df_final, col_dest_m, SUFIJOS[0])].iloc[pendientes_m],
+                         df_final[col_fecha_final].iloc[pendientes_m] if usar_fechas else None)
+    bloques_f = _bloques(lineas[col_dest_f].reset_index(drop=True)[validas],
+                         lineas[col_fecha_f].reset_index(drop=True)[validas] if usar_fechas else None)
+    codigos, _ = pd.factorize(pd.concat([bloques_m, bloques_f], ignore_index=True))
+    manifiesto = pd.DataFrame({'BLOQUE': codigos[:len(bloques_m)], 'FILA': pendientes_m,
+                               'MONTO_M': df_final['VALOR_MANIFIESTO'].to_numpy(float)[pendientes_m]})
+    facturas = pd.DataFrame({'BLOQUE': codigos[len(bloques_m):], 'LINEA': np.flatnonzero(validas),
+                             'MONTO_F': montos_f.to_numpy(float)[validas]})
+
+    # merge_asof: la guía de monto más cercano de su bloque, en una pasada ordenada
+    asignadas = []
+    for _ in range(RONDAS_CRUCE):
+        if facturas.empty or manifiesto.empty:
+            break
+        cruce = pd.merge_asof(facturas.sort_values('MONTO_F'), manifiesto.sort_values('MONTO_M'),
+                              left_on='MONTO_F', right_on='MONTO_M', by='BLOQUE',
+                              tolerance=tolerancia, direction='nearest').dropna(subset=['FILA'])
+        if cruce.empty:
+            break
+        cruce['DIFERENCIA'] = (cruce['MONTO_F'] - cruce['MONTO_M']).abs()
+        cruce = cruce.sort_values(['DIFERENCIA', 'LINEA'], kind='stable').drop_duplicates('FILA')
+        asignadas.append(cruce)
+        facturas = facturas[~facturas['LINEA'].isin(cruce['LINEA'])]
+        manifiesto = manifiesto[~manifiesto['FILA'].isin(cruce['FILA'])]
+
+    if not asignadas:
+        return df_final, resumen
+    cruce = pd.concat(asignadas, ignore_index=True)
+    filas = cruce['FILA'].to_numpy(dtype=np.int64)
+
+    candidatos = _candidatos_en_tolerancia(
+        codigos[:len(bloques_m)], _centavos(df_final['VALOR_MANIFIESTO'].to_numpy(float)[pendientes_m]),
+        cruce['BLOQUE'].to_numpy(), _centavos(cruce['MONTO_F'].to_numpy()), tolerancia
+    )
+    cercania = 1 - 0.5 * cruce['DIFERENCIA'].to_numpy() / tolerancia if tolerancia > 0 else 1.0
+    confianza = cercania / np.maximum(candidatos, 1)
+
+    posiciones = df_final.index[filas]
+    df_final.loc[posiciones, 'VALOR_REAL'] = cruce['MONTO_F'].to_numpy()
+    df_final.loc[posiciones, 'LINEAS_FACTURA'] = 1
+    df_final.loc[posiciones, 'CRUCE'] = CRUCE_MONTO
+    df_final.loc[posiciones, 'CONFIANZA_CRUCE'] = confianza
+
+    resumen.update(cruzadas=len(cruce), monto_cruzado=float(cruce['MONTO_F'].sum()))
+    logger.info(f"Cruce por monto: {resumen['cruzadas']} de {resumen['lineas_sin_guia']} líneas sin guía")
+    return df_final, resumen
@@ -0,0 +1,198 @@
+"""Motor de tarifas: costo esperado por guía según transportista, zona, tipo de tienda y piezas."""
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .memoria import rellenar
+from .motor import SUFIJOS, _columna_fusionada
+from .normalizacion import normalizar_textos
+from .reglas import TIPO_FISICA, TIPO_MAYORISTA, TIPO_WEB
+
+logger = logging.getLogger(__name__)
+
+RUTA_TARIFAS = "tarifas_transportistas.csv"
+
+COLUMNAS_TARIFA = ['TRANSPORTISTA', 'ZONA', 'TIPO_TIENDA', 'PIEZAS_DESDE', 'TARIFA_BASE', 'TARIFA_PIEZA']
+COMODIN = '*'
+
+# Sobrecobro = lo facturado supera al costo esperado en más de la tolerancia
+TOLERANCIA_PCT = 0.02
+TOLERANCIA_MINIMA = 0.10
+
+# Llave de búsqueda = grupo * _ESCALA + piezas (una sola búsqueda ordenada para todas las bandas)
+_ESCALA = 1_000_000_000
+
+# Tarifario inicial hasta que se cargue el de cada transportista
+TARIFAS_DEMO = pd.DataFrame([
+    ('GENERAL', COMODIN, TIPO_WEB, 1, 45.0, 12.0),
+    ('GENERAL', COMODIN, TIPO_FISICA, 1, 60.0, 15.0),
+    ('GENERAL', COMODIN, TIPO_FISICA, 10, 195.0, 10.0),
+    ('GENERAL', COMODIN, TIPO_MAYORISTA, 1, 80.0, 10.0),
+    ('GENERAL', COMODIN, COMODIN, 1, 50.0, 15.0),
+    ('GENERAL', 'GALAPAGOS', COMODIN, 1, 90.0, 25.0),
+], columns=COLUMNAS_TARIFA)
+
+
+def validar_tarifas(tabla: pd.DataFrame) -> pd.DataFrame:
+    """Tabla de tarifas limpia y ordenada; ValueError si le faltan columnas o tiene bandas inválidas"""
+    faltantes = [c for c in COLUMNAS_TARIFA if c not in tabla.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas en el tarifario: {', '.join(faltantes)}")
+
+    tabla = tabla[COLUMNAS_TARIFA].dropna(how='all').copy()
+    for columna in ('TRANSPORTISTA', 'ZONA', 'TIPO_TIENDA'):
+        tabla[columna] = tabla[columna].fillna(COMODIN).astype(str).str.strip().replace('', COMODIN)
+    tabla['TRANSPORTISTA'] = tabla['TRANSPORTISTA'].str.upper()
+    # Las zonas se comparan normalizadas (Quito = QUITO = quito)
+    es_comodin = tabla['ZONA'] == COMODIN
+    tabla['ZONA'] = tabla['ZONA'].where(es_comodin, normalizar_textos(tabla['ZONA']))
+
+    for columna in ('PIEZAS_DESDE', 'TARIFA_BASE', 'TARIFA_PIEZA'):
+        numeros = pd.to_numeric(tabla[columna], errors='coerce')
+        if numeros.isna().any():
+            raise ValueError(f"La columna {columna} tiene valores no numéricos o vacíos")
+        tabla[columna] = numeros
+    if (tabla['PIEZAS_DESDE'] < 0).any() or (tabla['PIEZAS_DESDE'] % 1 != 0).any():
+        raise ValueError("PIEZAS_DESDE debe ser un entero mayor o igual a 0")
+    tabla['PIEZAS_DESDE'] = tabla['PIEZAS_DESDE'].astype('int64')
+
+    duplicadas = tabla.duplicated(['TRANSPORTISTA', 'ZONA', 'TIPO_TIENDA', 'PIEZAS_DESDE'])
+    if duplicadas.any():
+        fila = tabla[duplicadas].iloc[0]
+        raise ValueError(f"Banda repetida: {fila['TRANSPORTISTA']} / {fila['ZONA']} / "
+                         f"{fila['TIPO_TIENDA']} desde {fila['PIEZAS_DESDE']} piezas")
+    return tabla.sort_values(['TRANSPORTISTA', 'ZONA', 'TIPO_TIENDA', 'PIEZAS_DESDE'], ignore_index=True)
+
+
+class Tarifario:
+    """Tarifas por transportista en un CSV editable, con las bandas compiladas en memoria"""
+
+    def __init__(self, ruta: str = RUTA_TARIFAS):
+        self.ruta = ruta
+        self._lock = threading.Lock()
+        self._tabla: Optional[pd.DataFrame] = None
+        self._compiladas: Dict[str, Dict[str, Any]] = {}
+
+    def _cargar(self) -> pd.DataFrame:
+        if self._tabla is None:
+            try:
+                self._tabla = validar_tarifas(pd.read_csv(self.ruta, dtype={'ZONA': str, 'TIPO_TIENDA': str}))
+            except FileNotFoundError:
+                self._tabla = validar_tarifas(TARIFAS_DEMO)
+            except (OSError, ValueError) as e:
+                logger.warning(f"No se pudo leer {self.ruta}, se usa el tarifario de demostración: {e}")
+                self._tabla = validar_tarifas(TARIFAS_DEMO)
+        return self._tabla
+
+    def tabla(self) -> pd.DataFrame:
+        with self._lock:
+            return self._cargar().copy()
+
+    def transportistas(self) -> List[str]:
+        with self._lock:
+            return sorted(self._cargar()['TRANSPORTISTA'].unique())
+
+    def guardar(self, tabla: pd.DataFrame) -> None:
+        """Valida y reemplaza el tarifario completo"""
+        tabla = validar_tarifas(tabla)
+        with self._lock:
+            directorio = os.path.dirname(os.path.abspath(self.ruta))
+            fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.csv')
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='') as archivo:
+                tabla.to_csv(archivo, index=False)
+            os.replace(temporal, self.ruta)
+            self._tabla = tabla
+            self._compiladas.clear()
+
+    def _compilar(self, transportista: str) -> Dict[str, Any]:
+        """Bandas de un transportista como arreglos ordenados por (grupo, piezas_desde)"""
+        with self._lock:
+            compilada = self._compiladas.get(transportista)
+            if compilada is None:
+                tabla = self._cargar()
+                tabla = tabla[tabla['TRANSPORTISTA'] == transportista]
+                if tabla.empty:
+                    raise ValueError(f"No hay tarifas para el transportista {transportista}")
+                grupos, combinaciones = pd.factorize(pd.MultiIndex.from_frame(tabla[['ZONA', 'TIPO_TIENDA']]))
+                claves = grupos.astype('int64') * _ESCALA + tabla['PIEZAS_DESDE'].to_numpy()
+                orden = np.argsort(claves, kind='stable')
+                compilada = {
+                    'grupos': {combinacion: i for i, combinacion in enumerate(combinaciones)},
+                    'claves': claves[orden],
+                    'grupo_banda': grupos[orden],
+                    'desde': tabla['PIEZAS_DESDE'].to_numpy()[orden],
+                    'base': tabla['TARIFA_BASE'].to_numpy(float)[orden],
+                    'pieza': tabla['TARIFA_PIEZA'].to_numpy(float)[orden],
+                }
+                self._compiladas[transportista] = compilada
+            return compilada
+
+    def costo_esperado(self, df_final: pd.DataFrame, transportista: str,
+                       col_zona: Optional[str] = None) -> pd.Series:
+        """
+        Costo esperado de cada guía: TARIFA_BASE + TARIFA_PIEZA * (piezas - PIEZAS_DESDE)
+        de la banda que corresponde a sus piezas. Una zona o tipo de tienda sin tarifa
+        propia usa la fila con comodín '*'; sin ninguna tarifa aplicable queda NaN.
+        """
+        bandas = self._compilar(transportista)
+
+        # Grupo de tarifa de cada combinación (zona, tipo) presente, no de cada fila
+        codigos_tipo, tipos = pd.factorize(df_final['TIPO_TIENDA'])
+        if col_zona is not None:
+            # Una guía sin zona usa la tarifa con comodín
+            zona_guia = rellenar(df_final[_columna_fusionada(df_final, col_zona, SUFIJOS[0])], '')
+            codigos_zona, zonas = pd.factorize(zona_guia)
+            zonas = normalizar_textos(pd.Series(zonas, dtype=object)).tolist()
+        else:
+            codigos_zona, zonas = np.zeros(len(df_final), dtype='int64'), [COMODIN]
+        grupo_combinacion = np.full(len(zonas) * len(tipos) + 1, -1, dtype='int64')
+        for z, zona in enumerate(zonas):
+            for t, tipo in enumerate(tipos):
+                for candidata in ((zona, tipo), (zona, COMODIN), (COMODIN, tipo), (COMODIN, COMODIN)):
+                    if candidata in bandas['grupos']:
+                        grupo_combinacion[z * len(tipos) + t] = bandas['grupos'][candidata]
+                        break
+        # Un tipo vacío (código -1) cae en la última posición: sin grupo
+        combinacion = np.where(codigos_tipo < 0, len(grupo_combinacion) - 1,
+                               codigos_zona * len(tipos) + codigos_tipo)
+        grupo = grupo_combinacion[combinacion]
+
+        piezas = df_final['PIEZAS_CALC'].to_numpy(float)
+        consulta = grupo * _ESCALA + np.clip(np.floor(piezas), 0, _ESCALA - 1).astype('int64')
+        banda = np.searchsorted(bandas['claves'], consulta, side='right') - 1
+        banda_segura = np.maximum(banda, 0)
+        aplica = (grupo >= 0) & (banda >= 0) & (bandas['grupo_banda'][banda_segura] == grupo)
+
+        costo = bandas['base'][banda_segura] + bandas['pieza'][banda_segura] * (piezas - bandas['desde'][banda_segura])
+        return pd.Series(np.where(aplica, costo, np.nan), index=df_final.index, name='COSTO_ESPERADO')
+
+
+# Tarifario compartido por todo el proceso
+TARIFARIO = Tarifario()
+
+
+def auditar_tarifas(df_final: pd.DataFrame, transportista: str, col_zona: Optional[str] = None,
+                    tolerancia_pct: float = TOLERANCIA_PCT, tolerancia_minima: float = TOLERANCIA_MINIMA,
+                    tarifario: Tarifario = TARIFARIO) -> pd.DataFrame:
+    """Agrega COSTO_ESPERADO, SOBRECOBRO y ALERTA_SOBRECOBRO a df_final"""
+    costo = tarifario.costo_esperado(df_final, transportista, col_zona)
+    sobrecobro = df_final['VALOR_REAL'] - costo
+    umbral = np.maximum(costo * tolerancia_pct, tolerancia_minima)
+    alerta = (df_final['VALOR_REAL'] > 0) & (sobrecobro > umbral)
+    return df_final.assign(COSTO_ESPERADO=costo, SOBRECOBRO=sobrecobro, ALERTA_SOBRECOBRO=alerta)
+
+
+def resumir_sobrecobros(df_auditado: pd.DataFrame) -> Dict[str, Any]:
+    """Métricas de la auditoría de tarifas"""
+    alerta = df_auditado['ALERTA_SOBRECOBRO']
+    return {
+        'con_tarifa': int(df_auditado['COSTO_ESPERADO'].notna().sum()),
+        'sin_tarifa': int(df_auditado['COSTO_ESPERADO'].isna().sum()),
+        'sobrecobros': int(alerta.sum()),
+        'monto_sobrecobrado': float(df_auditado.loc[alerta, 'SOBRECOBRO'].sum()),
+    }
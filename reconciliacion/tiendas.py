@@ -0,0 +1,175 @@
+"""Dimensión persistente de tiendas: destinatario normalizado -> tipo de tienda (SQLite)."""
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+from .clasificador import CLASIFICADOR_V8, ClasificadorTiendas
+from .reglas import (TIPO_DESCONOCIDO, TIPO_FISICA, TIPO_MAYORISTA, TIPO_WEB,
+                     normalizar_texto_wilo)
+
+logger = logging.getLogger(__name__)
+
+# Junto a la aplicación y no en el directorio de trabajo de cada proceso
+RUTA_TIENDAS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiendas.db")
+
+TIPOS_TIENDA = [TIPO_FISICA, TIPO_WEB, TIPO_MAYORISTA, TIPO_DESCONOCIDO]
+
+# Quién asignó el tipo: las reglas la primera vez que se vio el nombre o un administrador
+ORIGEN_REGLAS = "REGLAS"
+ORIGEN_MANUAL = "MANUAL"
+
+
+class DimensionTiendas:
+    """
+    Tabla tiendas con el destinatario normalizado como llave primaria (sin rowid: la
+    tabla es el índice). Un nombre se clasifica con las reglas una sola vez; después
+    su tipo sale de la tabla aunque las reglas cambien, y un administrador puede
+    sobrescribirlo. Cada reconciliación resuelve sus nombres distintos en un join.
+    Con solo_lectura (procesos del lote) los nombres nuevos se clasifican con las
+    reglas sin guardarse: solo el proceso de la aplicación escribe en la base.
+    """
+
+    def __init__(self, ruta: str = RUTA_TIENDAS, clasificador: ClasificadorTiendas = CLASIFICADOR_V8,
+                 solo_lectura: bool = False):
+        self.ruta = os.path.abspath(ruta)
+        self.clasificador = clasificador
+        self.solo_lectura = solo_lectura
+        self._tablas_creadas = False
+
+    @contextmanager
+    def _conexion(self):
+        if self.solo_lectura:
+            conn = sqlite3.connect(f"file:{quote(self.ruta)}?mode=ro", uri=True, timeout=30)
+            self._tablas_creadas = True
+        else:
+            conn = sqlite3.connect(self.ruta, timeout=30)
+        try:
+            if not self._tablas_creadas:
+                self._crear_tablas(conn)
+                self._tablas_creadas = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _crear_tablas(conn) -> None:
+        with conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS tiendas (
+                    destinatario TEXT PRIMARY KEY,
+                    tipo_tienda TEXT NOT NULL,
+                    origen TEXT NOT NULL,
+                    actualizado TEXT
+                ) WITHOUT ROWID
+            ''')
+            # version cambia con cada sobrescritura: invalida resultados en caché
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS estado (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute("INSERT OR IGNORE INTO estado (id) VALUES (1)")
+
+    def tipos(self, nombres: pd.Series) -> np.ndarray:
+        """
+        Tipo de cada nombre normalizado (distintos): join de los nombres contra la tabla;
+        los que faltan se clasifican con las reglas y se agregan (salvo en solo_lectura).
+        """
+        nombres = nombres.astype(object)
+        if self.solo_lectura and not os.path.exists(self.ruta):
+            return self.clasificador.clasificar_normalizados(nombres)
+        with self._conexion() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS consulta (destinatario TEXT PRIMARY KEY) WITHOUT ROWID")
+            conn.execute("DELETE FROM consulta")
+            conn.executemany("INSERT OR IGNORE INTO consulta VALUES (?)", zip(nombres.tolist()))
+            conocidos = dict(conn.execute(
+                "SELECT c.destinatario, t.tipo_tienda FROM consulta c "
+                "JOIN tiendas t ON t.destinatario = c.destinatario"
+            ))
+            conn.execute("DELETE FROM consulta")
+
+            tipos = np.array([conocidos.get(n) for n in nombres], dtype=object)
+            nuevos = pd.isna(tipos)
+            if nuevos.any():
+                tipos[nuevos] = self.clasificador.clasificar_normalizados(nombres[nuevos])
+                if not self.solo_lectura:
+                    ahora = datetime.now().isoformat(timespec='seconds')
+                    # OR IGNORE: otra sesión pudo agregar el mismo nombre entre la consulta y la escritura
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tiendas VALUES (?, ?, ?, ?)",
+                        ((n, t, ORIGEN_REGLAS, ahora) for n, t in zip(nombres[nuevos], tipos[nuevos]))
+                    )
+                    logger.info(f"Tiendas: {int(nuevos.sum())} destinatarios nuevos clasificados con reglas")
+        return tipos
+
+    def clasificar(self, serie: pd.Series) -> pd.Series:
+        """Como ClasificadorTiendas.clasificar, pero los tipos salen de la dimensión"""
+        return self.clasificador.clasificar(serie, resolver=self.tipos)
+
+    # --- Administración ------------------------------------------------------
+
+    def sobrescribir(self, destinatario: str, tipo: str) -> str:
+        """Fija el tipo de un destinatario (se normaliza); devuelve el nombre normalizado"""
+        if tipo not in TIPOS_TIENDA:
+            raise ValueError(f"Tipo de tienda desconocido: {tipo}")
+        nombre = normalizar_texto_wilo(destinatario)
+        if not nombre:
+            raise ValueError("El destinatario está vacío")
+        with self._conexion() as conn:
+            conn.execute(
+                "INSERT INTO tiendas VALUES (?, ?, ?, ?) ON CONFLICT (destinatario) DO UPDATE SET "
+                "tipo_tienda = excluded.tipo_tienda, origen = excluded.origen, actualizado = excluded.actualizado",
+                (nombre, tipo, ORIGEN_MANUAL, datetime.now().isoformat(timespec='seconds'))
+            )
+            conn.execute("UPDATE estado SET version = version + 1 WHERE id = 1")
+        return nombre
+
+    def restablecer(self, destinatario: str) -> bool:
+        """Quita el tipo guardado: la próxima vez que aparezca se clasifica con las reglas"""
+        with self._conexion() as conn:
+            borradas = conn.execute("DELETE FROM tiendas WHERE destinatario = ?",
+                                    (normalizar_texto_wilo(destinatario),)).rowcount
+            conn.execute("UPDATE estado SET version = version + 1 WHERE id = 1")
+        return borradas > 0
+
+    def reclasificar(self) -> int:
+        """Olvida los tipos asignados por reglas (se recalculan con las reglas actuales); conserva los manuales"""
+        with self._conexion() as conn:
+            borradas = conn.execute("DELETE FROM tiendas WHERE origen = ?", (ORIGEN_REGLAS,)).rowcount
+            conn.execute("UPDATE estado SET version = version + 1 WHERE id = 1")
+        return borradas
+
+    def tabla(self, filtro: str = '', limite: int = 1_000) -> pd.DataFrame:
+        """Destinatarios guardados (los que contienen filtro), los manuales primero"""
+        with self._conexion() as conn:
+            return pd.read_sql(
+                "SELECT destinatario AS DESTINATARIO, tipo_tienda AS TIPO_TIENDA, origen AS ORIGEN, "
+                "actualizado AS ACTUALIZADO FROM tiendas WHERE destinatario LIKE ? "
+                "ORDER BY origen = ?, destinatario LIMIT ?",
+                conn, params=(f"%{normalizar_texto_wilo(filtro)}%", ORIGEN_REGLAS, limite)
+            )
+
+    def version(self) -> int:
+        """Aumenta con cada cambio manual; forma parte de la llave de la caché de resultados"""
+        with self._conexion() as conn:
+            return conn.execute("SELECT version FROM estado WHERE id = 1").fetchone()[0]
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._conexion() as conn:
+            conteos = dict(conn.execute("SELECT origen, COUNT(*) FROM tiendas GROUP BY origen"))
+        return {
+            'destinatarios': sum(conteos.values()),
+            'manuales': conteos.get(ORIGEN_MANUAL, 0),
+            'reglas': conteos.get(ORIGEN_REGLAS, 0),
+        }
+
+
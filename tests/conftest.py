@@ -0,0 +1,8 @@
+import os
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# El paquete no se instala: las pruebas importan desde la raíz del repositorio
+# y los módulos del dashboard desde .devcontainer (así los importa dashboard_bodega.py)
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, '.devcontainer'))
@@ -0,0 +1,11 @@
+from reconciliacion.benchmark import generar_destinatarios
+from reconciliacion.clasificador import ClasificadorTiendas
+from reconciliacion.reglas import identificar_tipo_tienda_v8
+
+
+def test_compilado_igual_a_las_reglas_con_memoria_fria_y_caliente():
+    serie = generar_destinatarios(20_000)
+    esperado = serie.apply(identificar_tipo_tienda_v8).tolist()
+    clasificador = ClasificadorTiendas()
+    assert clasificador.clasificar(serie).tolist() == esperado
+    assert clasificador.clasificar(serie).tolist() == esperado
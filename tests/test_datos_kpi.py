@@ -0,0 +1,91 @@
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from benchmark_kpi import generar_dias, guardar_fila_a_fila
+from datos_kpi import (INDICES, ConexionesKPI, EscritorKPI, crear_esquema, escaneos_completos, guardar_kpis,
+                       leer_historico, nombres_historico, rango_fechas)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conexion = sqlite3.connect(tmp_path / 'kpi_data.db')
+    crear_esquema(conexion)
+    yield conexion
+    conexion.close()
+
+
+def test_esquema_sin_escaneos_completos(conn):
+    assert escaneos_completos(conn) == {}
+
+
+def test_sin_escaneos_completos_con_datos_y_estadisticas(conn):
+    with conn:
+        for fecha, datos in generar_dias(50, 40):
+            guardar_kpis(conn, fecha, datos)
+    conn.execute('ANALYZE')
+    assert escaneos_completos(conn) == {}
+
+
+def test_detecta_escaneos_sin_indices(conn):
+    for indice in INDICES:
+        conn.execute(f'DROP INDEX {indice}')
+    assert set(escaneos_completos(conn)) >= {'usuario_por_hash', 'trabajadores_activos'}
+
+
+def _contenido(conn):
+    return conn.execute(
+        "SELECT fecha, nombre, actividad, cantidad, meta, eficiencia, productividad, comentario, "
+        "meta_mensual, horas_trabajo, equipo FROM daily_kpis ORDER BY fecha, nombre"
+    ).fetchall()
+
+
+def test_guardado_en_lote_igual_al_bucle(tmp_path, conn):
+    bucle = sqlite3.connect(tmp_path / 'bucle.db')
+    crear_esquema(bucle)
+    dias = generar_dias(30, 5)
+    # Dos pasadas: la segunda son todo actualizaciones
+    for _ in range(2):
+        for fecha, datos in dias:
+            with conn:
+                guardar_kpis(conn, fecha, datos)
+            guardar_fila_a_fila(bucle, fecha, datos)
+        assert _contenido(conn) == _contenido(bucle)
+    bucle.close()
+
+
+def test_escritor_en_grupo_aplica_todas_las_sesiones(tmp_path):
+    conexiones = ConexionesKPI(str(tmp_path / 'grupo.db'))
+    with conexiones.escritura() as escritura:
+        crear_esquema(escritura)
+    escritor = EscritorKPI(conexiones)
+    dias = generar_dias(20, 10)
+    with ThreadPoolExecutor(max_workers=8) as sesiones:
+        list(sesiones.map(lambda dia: escritor.escribir(lambda c: guardar_kpis(c, *dia)), dias))
+    assert escritor.operaciones == len(dias)
+    with conexiones.lectura() as lectura:
+        assert lectura.execute("SELECT COUNT(*) FROM daily_kpis").fetchone()[0] == 20 * 10
+    conexiones.cerrar()
+
+
+@pytest.mark.parametrize('desde, hasta, trabajador', [
+    ('2024-01-20', '2024-02-09', None),
+    (None, None, 'Trabajador 0007'),
+    ('2024-01-20', '2024-02-09', 'Trabajador 0007'),
+])
+def test_historico_filtrado_en_la_consulta(conn, desde, hasta, trabajador):
+    with conn:
+        for fecha, datos in generar_dias(15, 40):
+            guardar_kpis(conn, fecha, datos)
+    todo = leer_historico(conn)
+    filtro = pd.Series(True, index=todo.index)
+    if desde:
+        filtro &= (todo['fecha'] >= desde) & (todo['fecha'] <= hasta)
+    if trabajador:
+        filtro &= todo['nombre'] == trabajador
+    esperado = todo[filtro].reset_index(drop=True)
+    assert leer_historico(conn, desde, hasta, trabajador).equals(esperado)
+    assert rango_fechas(conn) == (str(todo['fecha'].min().date()), str(todo['fecha'].max().date()))
+    assert nombres_historico(conn) == sorted(todo['nombre'].unique())
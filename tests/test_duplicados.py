@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.duplicados import (DUPLICADO_CERCANO, DUPLICADO_EXACTO, TOLERANCIA_CERCANO,
+                                       agrupar_facturas, marcar_duplicados)
+from reconciliacion.montos import parsear_montos_con_errores
+from reconciliacion.motor import reconciliar
+
+
+def _marcar(guias, montos, **opciones):
+    return marcar_duplicados(pd.Series(guias), pd.Series(montos, dtype=float), **opciones).tolist()
+
+
+def test_exacto_frente_a_cercano():
+    tipos = _marcar(['A', 'A', 'B', 'B', 'C', 'C', 'C'], [100.0, 100.0, 100.0, 101.5, 50.0, 50.0, 50.0])
+    # La primera línea de cada guía es el cobro legítimo; las copias al centavo son exactas
+    assert tipos == ['', DUPLICADO_EXACTO, '', DUPLICADO_CERCANO, '', DUPLICADO_EXACTO, DUPLICADO_EXACTO]
+
+
+@pytest.mark.parametrize('otro, esperado', [
+    (100.0 * (1 - TOLERANCIA_CERCANO), DUPLICADO_CERCANO),   # justo en la tolerancia
+    (102.0, DUPLICADO_CERCANO),                               # la escala es el mayor de los dos
+    (97.9, ''),                                               # apenas fuera
+    (100.004, DUPLICADO_EXACTO),                              # mismo monto al centavo
+    (100.01, DUPLICADO_CERCANO),
+])
+def test_bordes_de_la_tolerancia(otro, esperado):
+    # Entre dos cobros cercanos se marca el de mayor monto
+    assert sorted(_marcar(['A', 'A'], [100.0, otro])) == sorted(['', esperado])
+
+
+def test_misma_guia_con_otro_monto_no_es_duplicado():
+    assert _marcar(['A', 'A', 'B'], [100.0, 250.0, 100.0]) == ['', '', '']
+    # Sin tolerancia solo cuentan los exactos
+    assert _marcar(['A', 'A', 'A'], [100.0, 100.5, 100.0], tolerancia=0) == ['', '', DUPLICADO_EXACTO]
+
+
+def test_agrupar_suma_lineas_y_separa_el_monto_en_riesgo():
+    guias = pd.Series(['A', 'A', 'A', 'B', 'B', 'C'])
+    montos = pd.Series([100.0, 100.0, 101.0, 40.0, 90.0, 10.0])
+    agrupadas = agrupar_facturas(guias, montos, pd.Series([False] * 5 + [True])).set_index('GUIA_CLEAN')
+    assert agrupadas['VALOR_REAL'].tolist() == [301.0, 130.0, 10.0]
+    assert agrupadas['LINEAS_FACTURA'].tolist() == [3, 2, 1]
+    assert agrupadas['DUPLICADOS_EXACTOS'].tolist() == [1, 0, 0]
+    assert agrupadas['DUPLICADOS_CERCANOS'].tolist() == [1, 0, 0]
+    assert agrupadas['MONTO_EN_RIESGO'].tolist() == [201.0, 0.0, 0.0]
+    assert agrupadas['FACTURA_INVALIDA'].tolist() == [False, False, True]
+
+
+def test_copias_y_cobros_cercanos_sin_inflar_el_cruce():
+    df_m, df_f = generar_datos_demo(5_000)
+    rng = np.random.default_rng(11)
+    k = 40
+    # k copias exactas y k cobros cercanos (+0.5%) de guías distintas
+    filas = rng.choice(len(df_f), 2 * k, replace=False)
+    exactas = df_f.iloc[filas[:k]]
+    montos = parsear_montos_con_errores(df_f['VALOR_COBRADO'].iloc[filas[k:]])[0]
+    cercanas = df_f.iloc[filas[k:]].assign(VALOR_COBRADO=(montos * 1.005).round(2).astype(str).to_numpy())
+    facturas = pd.concat([df_f, exactas, cercanas], ignore_index=True)
+
+    montos_f = parsear_montos_con_errores(facturas['VALOR_COBRADO'])[0]
+    tipo = marcar_duplicados(facturas['GUIA_FACTURA'].str.strip().str.upper(), montos_f)
+    assert (tipo == DUPLICADO_EXACTO).sum() == k
+    assert (tipo == DUPLICADO_CERCANO).sum() == k
+
+    df_final = reconciliar(df_m, facturas, **COLUMNAS_DEMO)
+    assert len(df_final) == len(df_m)
+    assert math.isclose(df_final['VALOR_REAL'].sum(), montos_f.sum(), rel_tol=1e-9)
@@ -0,0 +1,23 @@
+import re
+import zipfile
+
+from reconciliacion import exportacion
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.motor import reconciliar, resumir_reconciliacion
+
+
+def _filas_hoja(ruta: str, hoja: int) -> int:
+    """Filas de datos de una hoja según su rango declarado (sin cargar el libro)"""
+    with zipfile.ZipFile(ruta) as libro, libro.open(f'xl/worksheets/sheet{hoja}.xml') as xml:
+        rango = re.search(rb'<dimension ref="[A-Z]+\d+:[A-Z]+(\d+)"', xml.read(4096))
+    return int(rango.group(1)) - 1
+
+
+def test_detalle_repartido_en_hojas_sin_perder_filas(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacion, 'FILAS_POR_HOJA', 1_000)
+    df_m, df_f = generar_datos_demo(2_500)
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    ruta = str(tmp_path / 'resultado.xlsx')
+    exportacion.exportar_excel(df_final, resumir_reconciliacion(df_final), ruta, filas_por_bloque=300)
+    # Hojas: Resumen, Por tipo de tienda y Detalle en tres partes
+    assert [_filas_hoja(ruta, hoja) for hoja in (3, 4, 5)] == [1_000, 1_000, 500]
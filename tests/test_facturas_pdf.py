@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip('pdfplumber')
+pytest.importorskip('reportlab')
+
+from reconciliacion import facturas_pdf  # noqa: E402
+from reconciliacion.benchmark import generar_factura_pdf  # noqa: E402
+
+
+@pytest.mark.parametrize('procesos', [1, 2])
+def test_extrae_las_lineas_escritas(tmp_path, monkeypatch, procesos):
+    # Umbrales chicos: un PDF de pocas páginas ya se reparte entre procesos
+    monkeypatch.setattr(facturas_pdf, 'PAGINAS_MINIMAS_PARALELO', 2)
+    monkeypatch.setattr(facturas_pdf, 'PAGINAS_POR_TAREA', 2)
+    ruta = str(tmp_path / 'factura.pdf')
+    esperado = generar_factura_pdf(ruta, paginas=6)
+    tabla = facturas_pdf.extraer_tabla_pdf(ruta, procesos)
+    assert list(tabla.columns) == list(esperado.columns)
+    assert tabla.reset_index(drop=True).equals(esperado.astype(tabla.dtypes.to_dict()))
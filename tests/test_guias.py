@@ -0,0 +1,102 @@
+import pandas as pd
+import pytest
+
+from reconciliacion.benchmark import TRANSPORTISTA_PRUEBA, generar_guias_variantes
+from reconciliacion.guias import LLAVE_VACIA, BibliotecaPatrones, canonizar_guias
+from reconciliacion.similitud import textos_comparables
+
+TIPOS = ['str', object]
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_series_distintas_no_chocan(tipo):
+    llaves = canonizar_guias(pd.Series(['A-100', 'B-100', '100'], dtype=tipo))
+    assert llaves.nunique() == 3
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_variantes_de_la_misma_guia(tipo):
+    llaves = canonizar_guias(pd.Series(['GUA-0001', 'gua 0001', ' GUA_1 ', 'GUA1'], dtype=tipo))
+    assert llaves.nunique() == 1
+    sin_serie = canonizar_guias(pd.Series(['0001', '1.0', '1'], dtype=tipo))
+    assert sin_serie.tolist() == [1, 1, 1]
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_serie_con_numero_largo_usa_hash(tipo):
+    llaves = canonizar_guias(pd.Series(['AB-012345678901', 'ab12345678901', 'AC-012345678901'], dtype=tipo))
+    assert llaves[0] == llaves[1] != llaves[2]
+    assert (llaves < 0).all() and (llaves != LLAVE_VACIA).all()
+
+
+def test_columna_numerica_coincide_con_texto():
+    assert canonizar_guias(pd.Series([100, 7])).tolist() == canonizar_guias(pd.Series(['0100', '7.0'])).tolist()
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_prefijo_declarado_como_ruido(tipo):
+    biblioteca = BibliotecaPatrones(ruta=None)
+    biblioteca.registrar('RUIDO_PRUEBA', [r'^(?:GUA)?[\s\-]*0*(?P<numero>\d{1,18})$'])
+    llaves = canonizar_guias(pd.Series(['GUA-0001', '0001', 'A-0001'], dtype=tipo), 'RUIDO_PRUEBA', biblioteca)
+    assert llaves[0] == llaves[1] == 1
+    # Lo que el patrón del transportista no reconoce sigue con las reglas generales
+    assert llaves[2] != 1
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_serie_capturada_por_transportista(tipo):
+    biblioteca = BibliotecaPatrones(ruta=None)
+    biblioteca.registrar('SERIE_PRUEBA', [r'^(?P<serie>[A-Z]{2})/0*(?P<numero>\d+)$'])
+    llaves = canonizar_guias(pd.Series(['QA/0100', 'QB/0100', 'QA/100'], dtype=tipo), 'SERIE_PRUEBA', biblioteca)
+    assert llaves[0] == llaves[2] != llaves[1]
+
+
+def test_similitud_compara_el_numero():
+    guias = pd.Series(['GUA-1830', '1830', 'GUA-1830X'])
+    textos = textos_comparables(guias, canonizar_guias(guias))
+    assert textos.tolist() == ['1830', '1830', '1830X']
+
+
+@pytest.mark.parametrize('tipo', TIPOS)
+def test_numero_sin_serie_toma_la_del_transportista(tipo):
+    biblioteca = BibliotecaPatrones(ruta=None)
+    # Ceros a la izquierda, serie escrita o no, y el texto que deja Excel
+    guias = pd.Series(['GUA-0001', 'gua 0001', '0001', '1', '1.0', ' GUA_1 ', 'A-0001'], dtype=tipo)
+    llaves = canonizar_guias(guias, 'GENERAL', biblioteca)
+    assert llaves[:6].nunique() == 1 and llaves[6] != llaves[0]
+    excel = canonizar_guias(pd.Series(['GUA-1001', '1001.0', '0001001'], dtype=tipo), 'GENERAL', biblioteca)
+    assert excel.nunique() == 1
+    # Sin transportista conocido la serie sigue distinguiendo
+    assert canonizar_guias(guias, 'OTRO', biblioteca)[0] != canonizar_guias(guias, 'OTRO', biblioteca)[2]
+
+
+def test_columna_numerica_de_excel_toma_la_serie():
+    biblioteca = BibliotecaPatrones(ruta=None)
+    numeros = canonizar_guias(pd.Series([1001.0, 1002.0]), 'GENERAL', biblioteca)
+    textos = canonizar_guias(pd.Series(['GUA-1001', 'GUA-1002']), 'GENERAL', biblioteca)
+    assert numeros.tolist() == textos.tolist()
+
+
+def test_biblioteca_se_guarda_y_se_lee(tmp_path):
+    ruta = str(tmp_path / 'patrones.json')
+    biblioteca = BibliotecaPatrones(ruta)
+    assert biblioteca.transportistas() == ['GENERAL']
+    biblioteca.registrar('rapido', [r'^R(?P<numero>\d+)$'], serie='rx')
+    with pytest.raises(ValueError):
+        biblioteca.registrar('MALO', [r'^(\d+)$'])
+
+    releida = BibliotecaPatrones(ruta)
+    assert releida.definicion('RAPIDO') == {'serie': 'RX', 'patrones': [r'^R(?P<numero>\d+)$']}
+    llaves = canonizar_guias(pd.Series(['R0100', 'RX-100', '100']), 'RAPIDO', releida)
+    assert llaves.nunique() == 1
+
+    releida.guardar(releida.tabla().iloc[1:])
+    assert BibliotecaPatrones(ruta).transportistas() == ['RAPIDO']
+
+
+def test_variantes_de_los_transportistas_cruzan_todas():
+    biblioteca = BibliotecaPatrones(ruta=None)
+    manifiesto = pd.Series([f'GUA-{i:04d}' for i in range(1001, 6001)], dtype='str')
+    llaves_m = canonizar_guias(manifiesto, TRANSPORTISTA_PRUEBA, biblioteca)
+    llaves_f = canonizar_guias(generar_guias_variantes(5_000), TRANSPORTISTA_PRUEBA, biblioteca)
+    assert llaves_f.isin(llaves_m).all()
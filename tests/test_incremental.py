@@ -0,0 +1,139 @@
+import math
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.incremental import HistorialReconciliacion
+from reconciliacion.motor import reconciliar, resumir_reconciliacion
+
+
+def _iguales_a_reconciliar_todo(totales, df_m, df_f):
+    esperado = resumir_reconciliacion(reconciliar(df_m, df_f, **COLUMNAS_DEMO))
+    for campo in ('guias', 'con_factura', 'sin_factura', 'montos_invalidos', 'duplicados_exactos'):
+        assert totales[campo] == esperado[campo], campo
+    for campo in ('total_facturado', 'total_manifiesto', 'total_piezas'):
+        assert math.isclose(totales[campo], esperado[campo], rel_tol=1e-9), campo
+
+
+def test_historial_esquema_1_se_aparta(tmp_path):
+    ruta = str(tmp_path / 'historial.db')
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE guias (guia INTEGER PRIMARY KEY, huella INTEGER NOT NULL)")
+    conn.execute("INSERT INTO guias VALUES (100, 1)")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+    historial = HistorialReconciliacion(ruta)
+    assert historial.resumen()['guias'] == 0
+    assert os.path.exists(f"{ruta}.v1")
+
+
+def test_historial_esquema_2_conserva_guias(tmp_path):
+    ruta = str(tmp_path / 'historial.db')
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE guias (guia INTEGER PRIMARY KEY, huella INTEGER NOT NULL, "
+                 "tipo_tienda TEXT, estado TEXT, actualizado TEXT)")
+    conn.execute("INSERT INTO guias VALUES (100, 1, 'OTRO', 'PENDIENTE', NULL)")
+    conn.execute("PRAGMA user_version = 2")
+    conn.commit()
+    conn.close()
+    (tmp_path / 'historial_huellas.npz').write_bytes(b'')
+
+    historial = HistorialReconciliacion(ruta)
+    assert historial.estadisticas()['guias'] == 1
+    with sqlite3.connect(ruta) as conn:
+        assert 'huella' not in {fila[1] for fila in conn.execute("PRAGMA table_info(guias)")}
+    assert not os.path.exists(tmp_path / 'historial_huellas.npz')
+
+
+def test_delta_coincide_con_reconciliar_todo(tmp_path):
+    df_m, df_f = generar_datos_demo(3_000)
+    # La guía 20 trae una segunda línea de factura que luego se quita
+    df_f = pd.concat([df_f, df_f.iloc[[20]]], ignore_index=True)
+    historial = HistorialReconciliacion(str(tmp_path / 'historial.db'))
+    _, _, conteos = historial.reconciliar(df_m.iloc[:2_000], df_f, **COLUMNAS_DEMO)
+    assert conteos['nuevas'] == 2_000
+
+    # Valor corregido, fila repetida, línea de factura quitada y guías nuevas al final
+    df_m = df_m.copy()
+    df_m.loc[5, 'VALOR_DECLARADO'] += 1
+    df_m = pd.concat([df_m, df_m.iloc[[10]]], ignore_index=True)
+    df_f = df_f.iloc[:-1]
+    df_final, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+
+    assert conteos == {'recibidas': 3_000, 'nuevas': 1_000, 'modificadas': 3, 'sin_cambios': 1_997}
+    assert df_final['GUIA_CLEAN'].nunique() == 1_003
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+
+def test_misma_carga_no_cruza_nada(tmp_path):
+    df_m, df_f = generar_datos_demo(1_000)
+    historial = HistorialReconciliacion(str(tmp_path / 'historial.db'))
+    historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    df_final, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert len(df_final) == 0 and conteos['sin_cambios'] == conteos['recibidas'] == 1_000
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+
+def test_filas_movidas_no_cuentan_como_cambio(tmp_path):
+    df_m, df_f = generar_datos_demo(1_000)
+    historial = HistorialReconciliacion(str(tmp_path / 'historial.db'))
+    historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+
+    # Una fila movida a la mitad desplaza a las siguientes, pero solo cambia la guía editada
+    orden = np.r_[0:500, 999, 500:999]
+    df_m = df_m.iloc[orden].copy()
+    df_m.iloc[0, df_m.columns.get_loc('PIEZAS')] += 1
+    df_final, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert conteos['modificadas'] == 1 and len(df_final) == 1
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+    # Reordenar todo el archivo tampoco cambia ninguna guía
+    df_m, df_f = df_m.sample(frac=1, random_state=3), df_f.sample(frac=1, random_state=4)
+    _, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert conteos['sin_cambios'] == conteos['recibidas'] == 1_000
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+
+def test_delta_en_archivo_reordenado(tmp_path):
+    df_m, df_f = generar_datos_demo(3_000)
+    historial = HistorialReconciliacion(str(tmp_path / 'historial.db'))
+    historial.reconciliar(df_m.iloc[:2_000], df_f, **COLUMNAS_DEMO)
+
+    df_m = df_m.copy()
+    df_m.iloc[:200, df_m.columns.get_loc('VALOR_DECLARADO')] += 1
+    df_m = df_m.sample(frac=1, random_state=7)
+    _, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert conteos['nuevas'] == 1_000 and conteos['modificadas'] == 200
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+
+def test_ultima_carga_perdida_reconcilia_todo(tmp_path):
+    df_m, df_f = generar_datos_demo(1_000)
+    historial = HistorialReconciliacion(str(tmp_path / 'historial.db'))
+    historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    os.remove(historial.ruta_carga)
+    df_m = df_m.copy()
+    df_m.iloc[1, df_m.columns.get_loc('PIEZAS')] += 1
+    _, totales, conteos = historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert conteos['modificadas'] == 1_000
+    _iguales_a_reconciliar_todo(totales, df_m, df_f)
+
+
+def test_sesiones_concurrentes_no_duplican_el_delta(tmp_path):
+    df_m, df_f = generar_datos_demo(2_000)
+    ruta = str(tmp_path / 'historial.db')
+    historial = HistorialReconciliacion(ruta)
+    historial.reconciliar(df_m.iloc[:1_000], df_f, **COLUMNAS_DEMO)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        resultados = list(pool.map(lambda _: historial.reconciliar(df_m, df_f, **COLUMNAS_DEMO), range(4)))
+    # Una sola sesión aplica las 1.000 guías nuevas; las demás ya las encuentran en el historial
+    assert sorted(r[2]['nuevas'] for r in resultados) == [0, 0, 0, 1_000]
+    _iguales_a_reconciliar_todo(historial.resumen(), df_m, df_f)
+    assert historial.recalcular_totales()['guias'] == 2_000
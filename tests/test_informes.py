@@ -0,0 +1,53 @@
+import os
+import time
+
+from reconciliacion import informes
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.informes import GeneradorInformes
+from reconciliacion.motor import reconciliar, resumir_reconciliacion
+
+
+def _esperar(generador, llave):
+    while generador.estado(llave)['estado'] == 'generando':
+        time.sleep(0.02)
+    return generador.estado(llave)
+
+
+def test_trabajos_terminados_no_se_acumulan(tmp_path):
+    df_m, df_f = generar_datos_demo(200)
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    resumen = resumir_reconciliacion(df_final)
+    generador = GeneradorInformes(str(tmp_path))
+    for llave in ('a', 'b', 'c'):
+        generador.solicitar(llave, df_final, resumen, col_guia=COLUMNAS_DEMO['col_guia_m'])
+        assert _esperar(generador, llave)['estado'] == 'listo'
+    assert not generador._trabajos
+    assert not generador._progreso
+
+
+def test_fallidos_acotados(tmp_path, monkeypatch):
+    monkeypatch.setattr(informes, 'MAX_TRABAJOS_FALLIDOS', 2)
+    generador = GeneradorInformes(str(tmp_path))
+    for llave in ('a', 'b', 'c', 'd'):
+        generador.solicitar(llave, None, {})
+        estado = _esperar(generador, llave)
+        assert estado['estado'] == 'error' and estado['error']
+    # La poda corre al encolar: quedan los fallidos recordados más el último trabajo
+    assert list(generador._trabajos) == ['b', 'c', 'd']
+    assert not generador._progreso
+
+
+def test_solicitud_repetida_sirve_el_pdf_generado(tmp_path):
+    df_m, df_f = generar_datos_demo(200)
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    resumen = resumir_reconciliacion(df_final)
+    generador = GeneradorInformes(str(tmp_path))
+    generador.solicitar('informe', df_final, resumen, col_guia=COLUMNAS_DEMO['col_guia_m'])
+    estado = _esperar(generador, 'informe')
+    assert estado['estado'] == 'listo', estado['error']
+    inodo = os.stat(estado['ruta']).st_ino
+
+    # Sin datos: si volviera a generarlo fallaría
+    generador.solicitar('informe', None, {})
+    assert generador.estado('informe')['estado'] == 'listo'
+    assert os.stat(estado['ruta']).st_ino == inodo
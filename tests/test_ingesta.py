@@ -0,0 +1,32 @@
+import pytest
+
+from reconciliacion import ingesta
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+
+PROYECCION = [COLUMNAS_DEMO[c] for c in ('col_guia_m', 'col_dest_m', 'col_valor_m', 'col_piezas_m')]
+
+
+@pytest.fixture
+def manifiesto_ancho():
+    df_m, _ = generar_datos_demo(2_000)
+    for i in range(5):
+        df_m[f'EXTRA_{i}'] = float(i)
+    return df_m
+
+
+@pytest.mark.parametrize('calamine', [True, False])
+def test_proyeccion_xlsx_igual_a_lectura_completa(tmp_path, monkeypatch, manifiesto_ancho, calamine):
+    if calamine and not ingesta.CALAMINE_DISPONIBLE:
+        pytest.skip('python-calamine no está instalado')
+    monkeypatch.setattr(ingesta, 'CALAMINE_DISPONIBLE', calamine)
+    ruta = str(tmp_path / 'manifiesto.xlsx')
+    manifiesto_ancho.to_excel(ruta, index=False)
+    completo = ingesta.leer_tabla(ruta, ['GUIA'])
+    assert ingesta.leer_tabla(ruta, ['GUIA'], PROYECCION).equals(completo[PROYECCION])
+
+
+def test_proyeccion_csv_igual_a_lectura_completa(tmp_path, manifiesto_ancho):
+    ruta = str(tmp_path / 'manifiesto.csv')
+    manifiesto_ancho.to_csv(ruta, sep=';', index=False)
+    completo = ingesta.leer_tabla(ruta, ['GUIA'])
+    assert ingesta.leer_tabla(ruta, ['GUIA'], PROYECCION).equals(completo[PROYECCION])
@@ -0,0 +1,44 @@
+import math
+
+import pandas as pd
+
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.lotes import emparejar_archivos, listar_directorio, reconciliar_lote
+from reconciliacion.motor import combinar_resumenes, reconciliar, resumir_reconciliacion
+
+
+def test_totales_del_lote_suman_los_pares(tmp_path):
+    resumenes = []
+    for i in range(3):
+        df_m, df_f = generar_datos_demo(2_000, seed=i)
+        df_m.to_csv(tmp_path / f'TRANSPORTISTA{i}_2024-0{i + 1}_MANIFIESTO.csv', index=False)
+        df_f.to_csv(tmp_path / f'facturas transportista{i} 2024-0{i + 1}.csv', index=False)
+        resumenes.append(resumir_reconciliacion(reconciliar(df_m, df_f, **COLUMNAS_DEMO)))
+    esperado = combinar_resumenes(resumenes)
+
+    emparejados, sin_pareja = emparejar_archivos(listar_directorio(str(tmp_path)))
+    assert len(emparejados) == 3 and not sin_pareja
+    df_consolidado, resumen, _ = reconciliar_lote(emparejados, columnas=COLUMNAS_DEMO, procesos=2)
+    assert len(df_consolidado) == esperado['guias']
+    for campo in ('guias', 'con_factura', 'total_piezas', 'montos_invalidos'):
+        assert resumen[campo] == esperado[campo], campo
+    for campo in ('total_facturado', 'total_manifiesto'):
+        assert math.isclose(resumen[campo], esperado[campo], rel_tol=1e-9), campo
+
+
+def test_par_con_archivo_ilegible_tambien_avisa(tmp_path, monkeypatch):
+    # Sin mapeos recordados: cada par infiere sus columnas
+    monkeypatch.chdir(tmp_path)
+    df_m, df_f = generar_datos_demo(500)
+    df_m.to_csv(tmp_path / 'TRANSPORTISTA0_2024-01_MANIFIESTO.csv', index=False)
+    df_f.to_csv(tmp_path / 'facturas transportista0 2024-01.csv', index=False)
+    df_m.to_csv(tmp_path / 'TRANSPORTISTA1_2024-02_MANIFIESTO.csv', index=False)
+    pd.DataFrame({'NOTA': ['sin datos'] * 5}).to_csv(tmp_path / 'facturas transportista1 2024-02.csv', index=False)
+
+    emparejados, _ = emparejar_archivos(listar_directorio(str(tmp_path)))
+    terminados = []
+    _, resumen, resumen_pares = reconciliar_lote(emparejados, procesos=1, al_terminar=terminados.append)
+    assert sorted(fila['par'] for fila in terminados) == sorted(resumen_pares['par'])
+    errores = resumen_pares.set_index('par')['error']
+    assert errores.notna().sum() == 1 and 'no se identificó la columna' in errores.dropna().iloc[0]
+    assert resumen['guias'] == 500
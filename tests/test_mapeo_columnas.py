@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+from reconciliacion.benchmark import generar_datos_demo
+from reconciliacion.mapeo_columnas import ROLES_FACTURAS, ROLES_MANIFIESTO, inferir_mapeo
+
+
+def test_inferencia_con_columnas_adicionales():
+    df_m, df_f = generar_datos_demo(1_000)
+    rng = np.random.default_rng(5)
+    df_m.insert(0, 'FECHA', pd.Timestamp('2024-01-01').strftime('%Y-%m-%d'))
+    df_m['CIUDAD'] = rng.choice(['QUITO', 'GUAYAQUIL', 'CUENCA'], len(df_m))
+    df_m['PESO'] = rng.uniform(0.5, 30, len(df_m)).round(1)
+
+    assert inferir_mapeo(df_m.head(200).astype(str), ROLES_MANIFIESTO) == {
+        'guia': 'GUIA', 'destinatario': 'DESTINATARIO', 'valor': 'VALOR_DECLARADO', 'piezas': 'PIEZAS'}
+    assert inferir_mapeo(df_f.head(200).astype(str), ROLES_FACTURAS) == {
+        'guia': 'GUIA_FACTURA', 'valor': 'VALOR_COBRADO'}
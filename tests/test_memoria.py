@@ -0,0 +1,20 @@
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.memoria import medir_bytes, reporte_memoria
+from reconciliacion.motor import reconciliar, resumir_reconciliacion
+
+
+def test_reporte_compara_mediciones_reales():
+    df_m, df_f = generar_datos_demo(5_000)
+    completo = reconciliar(df_m, df_f, **COLUMNAS_DEMO, compactar=False)
+    compacto = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    reporte = reporte_memoria(compacto)
+    assert reporte['bytes_fila_antes'] * len(compacto) == medir_bytes(completo)
+    assert reporte['bytes_fila_despues'] * len(compacto) == medir_bytes(compacto)
+    assert reporte['reduccion'] == medir_bytes(completo) / medir_bytes(compacto)
+    assert resumir_reconciliacion(compacto) == resumir_reconciliacion(completo)
+
+
+def test_sin_medicion_previa():
+    df_m, df_f = generar_datos_demo(100)
+    reporte = reporte_memoria(reconciliar(df_m, df_f, **COLUMNAS_DEMO, compactar=False))
+    assert reporte['bytes_fila_antes'] is None and reporte['reduccion'] is None
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliacion.benchmark import generar_montos
+from reconciliacion.montos import parsear_montos, parsear_montos_con_errores
+from reconciliacion.reglas import procesar_subtotal_wilo
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('1.234,56', 1234.56),
+    ('1,234.56', 1234.56),
+    ('1.234.567,89', 1234567.89),
+    ('1,234,567.89', 1234567.89),
+    ('12,5', 12.5),
+    ('1234', 1234.0),
+    ('.5', 0.5),
+    ('5.', 5.0),
+    ('$ 1,234.56', 1234.56),
+    ('USD 99.90', 99.9),
+    ('€12,30', 12.3),
+    ('-45.10', -45.1),
+    ('-1.234,56', -1234.56),
+    ('  7,25  ', 7.25),
+])
+def test_formatos_validos(valor, esperado):
+    valores, fallidos = parsear_montos_con_errores(pd.Series([valor], dtype=object))
+    assert valores.iloc[0] == pytest.approx(esperado)
+    assert valores.iloc[0] == procesar_subtotal_wilo(valor)
+    assert not fallidos.iloc[0]
+
+
+@pytest.mark.parametrize('valor', ['', '   ', None, np.nan])
+def test_vacios_valen_cero_sin_error(valor):
+    valores, fallidos = parsear_montos_con_errores(pd.Series(['10', valor], dtype=object))
+    assert valores.iloc[1] == 0.0
+    assert not fallidos.iloc[1]
+
+
+@pytest.mark.parametrize('valor', ['N/D', 'abc', '1.2.3', '1,2,3', '--5', '1-2', '-'])
+def test_basura_queda_marcada(valor):
+    valores, fallidos = parsear_montos_con_errores(pd.Series(['10', valor], dtype=object))
+    assert valores.iloc[1] == procesar_subtotal_wilo(valor) == 0.0
+    assert fallidos.tolist() == [False, True]
+
+
+@pytest.mark.parametrize('separador, valor, esperado', [
+    (',', '1.234', 1234.0),
+    (',', '1.234,5', 1234.5),
+    ('.', '1,234', 1234.0),
+    ('.', '1,234.5', 1234.5),
+])
+def test_separador_forzado(separador, valor, esperado):
+    assert parsear_montos(pd.Series([valor]), separador).iloc[0] == pytest.approx(esperado)
+
+
+def test_columnas_numericas_y_mixtas():
+    numeros = pd.Series([1, 2.5, np.nan])
+    assert parsear_montos(numeros).tolist() == [1.0, 2.5, 0.0]
+    mixta = pd.Series([5, '1,5', None, 2.25], dtype=object)
+    assert parsear_montos(mixta).tolist() == [procesar_subtotal_wilo(v) for v in mixta]
+
+
+def test_equivale_a_procesar_subtotal_wilo():
+    serie = generar_montos(20_000)
+    valores, fallidos = parsear_montos_con_errores(serie)
+    esperado = serie.map(procesar_subtotal_wilo).to_numpy()
+    np.testing.assert_array_equal(valores.to_numpy(), esperado)
+    assert fallidos.sum() == (serie == 'N/D').sum()
@@ -0,0 +1,10 @@
+from reconciliacion.benchmark import COLUMNAS_DEMO, _reconciliar_fila_a_fila, generar_datos_demo
+from reconciliacion.motor import reconciliar
+
+
+def test_vectorizado_igual_a_fila_a_fila():
+    df_m, df_f = generar_datos_demo(5_000)
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    referencia = _reconciliar_fila_a_fila(df_m, df_f)
+    for columna in ('TIPO_TIENDA', 'PIEZAS_CALC', 'VALOR_REAL', 'VALOR_MANIFIESTO'):
+        assert df_final[columna].tolist() == referencia[columna].tolist(), columna
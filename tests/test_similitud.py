@@ -0,0 +1,37 @@
+import pandas as pd
+
+from reconciliacion.benchmark import COLUMNAS_DEMO
+from reconciliacion.motor import reconciliar
+from reconciliacion.similitud import IndiceSimilitud, proponer_coincidencias
+
+
+def _manifiesto(guias):
+    return pd.DataFrame({'GUIA': guias, 'DESTINATARIO': 'CARLOS PEREZ', 'PIEZAS': 1, 'VALOR_DECLARADO': 10.0})
+
+
+def test_mismo_numero_con_otra_serie_va_primero():
+    df_m = _manifiesto(['GUA-1001', 'GUA-1002', 'GUA-1003'])
+    df_f = pd.DataFrame({'GUIA_FACTURA': ['1001.0', '1002.0', '1003.0'], 'VALOR_COBRADO': '10.00'})
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert (df_final['LINEAS_FACTURA'] == 0).all()
+
+    propuestas = proponer_coincidencias(df_final, df_f, 'GUIA', 'GUIA_FACTURA')
+    pares = dict(zip(propuestas['GUIA_MANIFIESTO'], propuestas['GUIA_FACTURA']))
+    assert pares == {'GUA-1001': '1001.0', 'GUA-1002': '1002.0', 'GUA-1003': '1003.0'}
+    assert (propuestas['DISTANCIA'] == 0).all() and (propuestas['MISMA_FACTURA'] == 1).all()
+
+
+def test_error_de_tipeo_se_propone():
+    df_m = _manifiesto(['GUA-18305', 'GUA-27771'])
+    df_f = pd.DataFrame({'GUIA_FACTURA': ['GUA-18350', 'GUA-27771'], 'VALOR_COBRADO': '10.00'})
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    propuestas = proponer_coincidencias(df_final, df_f, 'GUIA', 'GUIA_FACTURA')
+    assert propuestas[['GUIA_MANIFIESTO', 'GUIA_FACTURA', 'DISTANCIA']].values.tolist() == [
+        ['GUA-18305', 'GUA-18350', 1]]
+
+
+def test_indice_descarta_solo_la_misma_llave():
+    indice = IndiceSimilitud(pd.Series(['1001', '1002']), pd.Series([7, 8]))
+    mejores = indice.buscar(pd.Series(['1001', '1001']), llaves=pd.Series([7, 9]))
+    # La consulta con la misma llave toma la otra candidata; la de otra llave, la idéntica
+    assert mejores[['CONSULTA', 'CANDIDATA', 'DISTANCIA']].values.tolist() == [[0, 1, 1], [1, 0, 0]]
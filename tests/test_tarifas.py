@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo
+from reconciliacion.motor import reconciliar
+from reconciliacion.reglas import TIPO_FISICA, TIPO_WEB, normalizar_texto_wilo
+from reconciliacion.tarifas import (COLUMNAS_TARIFA, COMODIN, TARIFAS_DEMO, Tarifario, auditar_tarifas,
+                                    validar_tarifas)
+
+
+@pytest.fixture
+def tarifario(tmp_path):
+    return Tarifario(str(tmp_path / 'tarifas.csv'))
+
+
+def _guias(tipos, piezas, zonas=None) -> pd.DataFrame:
+    df = pd.DataFrame({'TIPO_TIENDA': tipos, 'PIEZAS_CALC': piezas, 'VALOR_REAL': 0.0})
+    if zonas is not None:
+        df['CIUDAD'] = pd.Series(zonas, dtype=object)
+    return df
+
+
+def _costo_fila_a_fila(tabla: pd.DataFrame, zona, tipo: str, piezas: float) -> float:
+    """Referencia escalar: filtra las bandas aplicables y toma la mayor PIEZAS_DESDE <= piezas"""
+    zona = normalizar_texto_wilo(zona) if isinstance(zona, str) else ''
+    for z, t in ((zona, tipo), (zona, COMODIN), (COMODIN, tipo), (COMODIN, COMODIN)):
+        bandas = tabla[(tabla['ZONA'] == z) & (tabla['TIPO_TIENDA'] == t)]
+        if not bandas.empty:
+            bandas = bandas[bandas['PIEZAS_DESDE'] <= piezas]
+            if bandas.empty:
+                return np.nan
+            banda = bandas.loc[bandas['PIEZAS_DESDE'].idxmax()]
+            return banda['TARIFA_BASE'] + banda['TARIFA_PIEZA'] * (piezas - banda['PIEZAS_DESDE'])
+    return np.nan
+
+
+def test_costo_esperado_igual_a_la_busqueda_por_bandas(tmp_path):
+    df_m, df_f = generar_datos_demo(1_000)
+    df_m['CIUDAD'] = np.random.default_rng(9).choice(['Quito', 'Galápagos', 'GUAYAQUIL', None], len(df_m))
+    df_final = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    tarifario = Tarifario(str(tmp_path / 'tarifas.csv'))
+    auditado = auditar_tarifas(df_final, 'GENERAL', 'CIUDAD', 0.02, 0.10, tarifario)
+
+    tabla = validar_tarifas(TARIFAS_DEMO)
+    referencia = [_costo_fila_a_fila(tabla, z, t, p) for z, t, p in
+                  zip(auditado['CIUDAD'], auditado['TIPO_TIENDA'], auditado['PIEZAS_CALC'])]
+    assert np.allclose(auditado['COSTO_ESPERADO'], referencia, equal_nan=True)
+
+
+def test_limites_de_las_bandas_de_piezas(tarifario):
+    # FISICA: banda desde 1 (60 + 15 por pieza extra) y desde 10 (195 + 10 por pieza extra)
+    df = _guias([TIPO_FISICA] * 6, [0, 1, 9, 9.5, 10, 11])
+    costo = tarifario.costo_esperado(df, 'GENERAL')
+    assert np.isnan(costo.iloc[0])
+    assert costo.iloc[1:].tolist() == [60.0, 180.0, 187.5, 195.0, 205.0]
+
+
+def test_zona_sin_tarifa_usa_el_comodin(tarifario):
+    df = _guias([TIPO_WEB] * 4, [2] * 4, ['Galápagos', 'galapagos', 'Cuenca', None])
+    costo = tarifario.costo_esperado(df, 'GENERAL', 'CIUDAD')
+    # GALAPAGOS tiene tarifa propia para cualquier tipo; Cuenca y la guía sin zona usan la de WEB
+    assert costo.tolist() == [115.0, 115.0, 57.0, 57.0]
+
+
+def test_zona_sin_tarifa_ni_comodin_queda_sin_costo(tarifario):
+    tarifario.guardar(pd.DataFrame([('SERVIENTREGA', 'QUITO', COMODIN, 1, 30.0, 5.0)], columns=COLUMNAS_TARIFA))
+    df = _guias([TIPO_WEB, TIPO_WEB], [3, 3], ['quito', 'Cuenca'])
+    auditado = auditar_tarifas(df.assign(VALOR_REAL=100.0), 'SERVIENTREGA', 'CIUDAD', tarifario=tarifario)
+    assert auditado['COSTO_ESPERADO'].iloc[0] == 40.0
+    assert np.isnan(auditado['COSTO_ESPERADO'].iloc[1])
+    assert auditado['ALERTA_SOBRECOBRO'].tolist() == [True, False]
+
+
+def test_transportista_sin_tarifas(tarifario):
+    with pytest.raises(ValueError, match="No hay tarifas para el transportista"):
+        tarifario.costo_esperado(_guias([TIPO_WEB], [1]), 'DESCONOCIDO')
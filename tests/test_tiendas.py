@@ -0,0 +1,65 @@
+import os
+
+from reconciliacion.benchmark import COLUMNAS_DEMO, generar_datos_demo, generar_destinatarios
+from reconciliacion.clasificador import ClasificadorTiendas
+from reconciliacion.motor import reconciliar
+from reconciliacion.normalizacion import normalizar_serie
+from reconciliacion.tiendas import RUTA_TIENDAS, DimensionTiendas
+
+
+def test_reconciliar_sin_dimension_no_escribe(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    existia = os.path.exists(RUTA_TIENDAS)
+    df_m, df_f = generar_datos_demo(500)
+    reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    assert os.listdir(tmp_path) == []
+    assert os.path.exists(RUTA_TIENDAS) == existia
+    assert os.path.isabs(RUTA_TIENDAS)
+
+
+def test_dimension_da_los_mismos_tipos(tmp_path):
+    df_m, df_f = generar_datos_demo(500)
+    reglas = reconciliar(df_m, df_f, **COLUMNAS_DEMO)
+    tiendas = DimensionTiendas(str(tmp_path / 'tiendas.db'))
+    con_dimension = reconciliar(df_m, df_f, tiendas=tiendas, **COLUMNAS_DEMO)
+    assert con_dimension['TIPO_TIENDA'].tolist() == reglas['TIPO_TIENDA'].tolist()
+    assert tiendas.estadisticas()['destinatarios'] > 0
+
+
+def test_solo_lectura_respeta_cambios_manuales_sin_escribir(tmp_path):
+    ruta = str(tmp_path / 'tiendas.db')
+    df_m, df_f = generar_datos_demo(500)
+    lectura = DimensionTiendas(ruta, solo_lectura=True)
+    # Sin base todavía: las reglas, sin crear el archivo
+    reglas = reconciliar(df_m, df_f, tiendas=lectura, **COLUMNAS_DEMO)
+    assert not os.path.exists(ruta)
+
+    escritura = DimensionTiendas(ruta)
+    escritura.sobrescribir('CARLOS PEREZ', 'VENTAS AL POR MAYOR')
+    resultado = reconciliar(df_m, df_f, tiendas=lectura, **COLUMNAS_DEMO)
+    carlos = (resultado['DESTINATARIO'] == 'CARLOS PEREZ').to_numpy()
+    assert carlos.any() and (resultado.loc[carlos, 'TIPO_TIENDA'] == 'VENTAS AL POR MAYOR').all()
+    assert resultado.loc[~carlos, 'TIPO_TIENDA'].tolist() == reglas.loc[~carlos, 'TIPO_TIENDA'].tolist()
+    assert escritura.estadisticas()['destinatarios'] == 1
+
+
+def test_tipos_guardados_estables_y_sobrescritos(tmp_path):
+    ruta = str(tmp_path / 'tiendas.db')
+    serie = generar_destinatarios(20_000, 500)
+    esperado = ClasificadorTiendas().clasificar(serie)
+    assert DimensionTiendas(ruta, ClasificadorTiendas()).clasificar(serie).tolist() == esperado.tolist()
+    # Clasificador nuevo (sin memoria): todos los tipos salen de la tabla
+    assert DimensionTiendas(ruta, ClasificadorTiendas()).clasificar(serie).tolist() == esperado.tolist()
+
+    # Reglas distintas (solo web con 1 palabra): los nombres ya guardados conservan su tipo
+    cambiadas = ClasificadorTiendas(max_palabras_web=1)
+    assert cambiadas.clasificar(serie).tolist() != esperado.tolist()
+    assert DimensionTiendas(ruta, cambiadas).clasificar(serie).tolist() == esperado.tolist()
+
+    dimension = DimensionTiendas(ruta, ClasificadorTiendas())
+    nombre = dimension.tabla(limite=1)['DESTINATARIO'].iloc[0]
+    dimension.sobrescribir(nombre, 'VENTAS AL POR MAYOR')
+    corregido = dimension.clasificar(serie)
+    afectadas = (normalizar_serie(serie) == nombre).to_numpy()
+    assert afectadas.any() and (corregido[afectadas] == 'VENTAS AL POR MAYOR').all()
+    assert corregido[~afectadas].tolist() == esperado[~afectadas].tolist()